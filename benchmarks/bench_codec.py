@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the time and peak memory needed to parse a large ``subscription``
+page, comparing the old decode-then-``json.loads`` path against each
+available codec.
+
+    python -m benchmarks.bench_codec [--items N] [--repeat N]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from signupto.codec import available_codecs
+from signupto.testing import envelope
+
+
+def make_subscription_page(items):
+    return json.dumps(envelope([
+        {'id': 36154421 + i,
+         'list_id': 7890,
+         'subscriber_id': 9180894 + i,
+         'cdate': 1374769049,
+         'mdate': 1374769049 + i,
+         'confirmed': True,
+         'confirmationredirect': '',
+         'source': 'import'}
+        for i in range(items)], next=items)).encode('utf-8')
+
+
+def old_loads(content):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return json.loads(content)
+
+
+def measure(loads, content, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        loads(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = loads(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = make_subscription_page(args.items)
+    print("Page of %d subscriptions, %.1f MB" %
+          (args.items, len(content) / 1e6))
+    candidates = [('json (decode to str first)', old_loads)]
+    candidates.extend((codec.name, codec.loads)
+                      for codec in available_codecs())
+    for name, loads in candidates:
+        best, peak = measure(loads, content, args.repeat)
+        print("%-30s %8.1f ms/page  %8.1f MB peak" %
+              (name, best * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
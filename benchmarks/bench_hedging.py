@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares GET latency percentiles with and without hedged requests, against
+a local stub server where a few requests are much slower than the rest.
+
+    python -m benchmarks.bench_hedging [--requests N] [--slow-rate R]
+
+Each request takes 'fast' seconds, or 'slow' seconds with probability
+'slow-rate', independently of the others - a hedged copy of a slow request
+is usually fast.
+"""
+
+import argparse
+import random
+import time
+
+from signupto import Client
+from signupto.hedging import HedgePolicy
+from signupto.testing import StubServer, envelope
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--slow-rate', type=float, default=0.03)
+    parser.add_argument('--fast', type=float, default=0.005)
+    parser.add_argument('--slow', type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    def app(request):
+        time.sleep(args.slow if rng.random() < args.slow_rate else args.fast)
+        return 200, envelope([{'id': 1}])
+
+    print("%d requests, %.0f%% taking %.0f ms, the rest %.0f ms" % (
+        args.requests, args.slow_rate * 100, args.slow * 1000,
+        args.fast * 1000))
+    for name, hedge in [('no hedging', None),
+                        ('HedgePolicy()', HedgePolicy())]:
+        with StubServer(app=app) as server, Client(base_url=server.url,
+                                                   hedge=hedge) as c:
+            latencies = []
+            for i in range(args.requests):
+                start = time.perf_counter()
+                c.subscription.get()
+                latencies.append(time.perf_counter() - start)
+            sent = len(server.requests)
+        print(
+            "%-16s p50 %6.1f ms  p95 %6.1f ms  p99 %6.1f ms  max %6.1f ms  "
+            "%5.1f%% extra requests" % (
+                name, percentile(latencies, 50) * 1000,
+                percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000, max(latencies) * 1000,
+                100.0 * (sent - args.requests) / args.requests))
+        if hedge is not None:
+            hedge.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares the HTTP/1.1 connection pool with HTTP/2 multiplexing, for many
+concurrent requests with some server latency: wall time, and the number of
+connections the server saw. Requires ``httpx[http2]``.
+
+    python -m benchmarks.bench_http2 [--requests N] [--workers N] [--latency S]
+
+The two use different stub servers, so per-request overhead isn't directly
+comparable - the connection counts are the main point.
+"""
+
+import argparse
+import time
+
+from signupto import Client, HashAuthorization
+from signupto.testing import H2StubServer, StubAPI, StubServer
+from signupto.transport import (HTTP2Transport, RequestsTransport,
+                                Urllib3Transport)
+
+AUTH = HashAuthorization(company_id=1234, user_id=4567,
+                         api_key='e4cf7fe3b764a18c04f6792c09e3325d')
+
+
+def run(server_class, make_transport, args):
+    app = StubAPI(credentials=AUTH, latency=args.latency)
+    with server_class(app=app) as server:
+        with Client(auth=AUTH, base_url=server.url,
+                    transport=make_transport(args)) as c:
+            keys = [str(i) for i in range(args.requests)]
+            c.list.get_many(keys[:args.workers],
+                            max_workers=args.workers)  # warm up
+            start = time.perf_counter()
+            c.list.get_many(keys, max_workers=args.workers)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(server.connections)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--max-streams', type=int, default=100)
+    args = parser.parse_args()
+
+    candidates = [
+        ('HTTP/1.1 requests', StubServer,
+         lambda args: RequestsTransport(pool_maxsize=args.workers)),
+        ('HTTP/1.1 urllib3', StubServer,
+         lambda args: Urllib3Transport(pool_maxsize=args.workers)),
+        ('HTTP/2', H2StubServer,
+         lambda args: HTTP2Transport(
+             max_streams=args.max_streams, prior_knowledge=True)),
+    ]
+    print("%d requests, %d workers, %.0f ms latency" %
+          (args.requests, args.workers, args.latency * 1000))
+    print("%-20s %10s %10s %12s" %
+          ("transport", "seconds", "req/sec", "connections"))
+    for name, server_class, make_transport in candidates:
+        elapsed, connections = run(server_class, make_transport, args)
+        print("%-20s %10.2f %10.1f %12d" %
+              (name, elapsed, args.requests / elapsed, connections))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the CPU cost of preparing and signing a request, before any I/O
+happens, comparing the original implementation with the current one.
+
+    python -m benchmarks.bench_prepare [--number N]
+"""
+
+import argparse
+from datetime import datetime
+import hashlib
+import json
+import random
+import string
+from time import mktime
+import timeit
+from urllib import parse as urllib_parse
+from wsgiref.handlers import format_date_time
+
+from signupto import Client, HashAuthorization
+from signupto.client import Endpoint
+
+
+class NullTransport(object):
+    def request(self, method, url, data=None, params=None, headers=None):
+        return None
+
+    def close(self):
+        pass
+
+
+# The original implementation, for comparison
+
+def original_signature(method, url, date_string, company_id, user_id, nonce,
+                       api_key):
+    s = ("%(method)s %(path)s\r\n"
+         "Date: %(date_string)s\r\n"
+         "X-SuT-CID: %(company_id)s\r\n"
+         "X-SuT-UID: %(user_id)s\r\n"
+         "X-SuT-Nonce: %(nonce)s\r\n"
+         "%(api_key)s"
+
+         % dict(method=method,
+                path=urllib_parse.urlparse(url).path.rstrip('/'),
+                date_string=date_string,
+                company_id=company_id,
+                user_id=user_id,
+                nonce=nonce,
+                api_key=api_key)
+         )
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+class OriginalHashAuthorization(HashAuthorization):
+    def make_nonce(self):
+        chars = string.ascii_lowercase + string.digits
+        return ''.join(random.choice(chars) for x in range(40))
+
+    def make_authorized_request(self, handler, method, url, data=None,
+                                params=None, headers=None):
+        if headers is None:
+            headers = {}
+        nonce = self.make_nonce()
+        headers['X-SuT-Nonce'] = nonce
+        headers['X-SuT-CID'] = str(self.company_id)
+        headers['X-SuT-UID'] = str(self.user_id)
+        date_string = format_date_time(mktime(datetime.now().timetuple()))
+        headers['Date'] = date_string
+
+        signature = original_signature(method, url, date_string,
+                                       self.company_id, self.user_id, nonce,
+                                       self.api_key)
+        headers['Authorization'] = 'SuTHash signature="%s"' % signature
+        return handler(method, url, data=data, params=params, headers=headers)
+
+
+class OriginalClient(Client):
+    @property
+    def list(self):
+        return Endpoint(self, 'list')
+
+    def send_request(self, method, resource_name, data=None, params=None,
+                     headers=None):
+        url = self._baseurl + resource_name
+        if headers is None:
+            headers = {}
+        h2 = {}
+        h2.update(self.extra_headers)
+        h2.update(headers)
+        return self._auth.make_authorized_request(self.make_request_raw,
+                                                  method,
+                                                  url,
+                                                  data=json.dumps(data),
+                                                  params=params,
+                                                  headers=h2)
+
+
+def make_client(client_class, auth_class):
+    auth = auth_class(company_id=1234, user_id=4567,
+                      api_key='e4cf7fe3b764a18c04f6792c09e3325d')
+    return client_class(auth=auth, transport=NullTransport())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=50000)
+    args = parser.parse_args()
+
+    original = make_client(OriginalClient, OriginalHashAuthorization)
+    current = make_client(Client, HashAuthorization)
+    # Check signatures are identical
+    auth = current._auth
+    url = 'https://api.sign-up.to/v0/list/'
+    for method in ['GET', 'POST']:
+        assert (original_signature(method, url, 'date', auth.company_id,
+                                   auth.user_id, 'nonce', auth.api_key) ==
+                auth.sign(method, url, 'date', 'nonce'))
+
+    def prepare(c):
+        return lambda: c.send_request('GET', c.list.resource_name,
+                                      params={'id': 1})
+
+    cases = [
+        ('nonce', lambda a: a._auth.make_nonce),
+        ('signature', lambda a: lambda: a._auth.make_authorized_request(
+            lambda *args, **kwargs: None, 'GET',
+            'https://api.sign-up.to/v0/list', headers={})),
+        ('full request preparation', prepare),
+    ]
+    for name, make_func in cases:
+        before = min(timeit.repeat(make_func(original), number=args.number,
+                                   repeat=3))
+        after = min(timeit.repeat(make_func(current), number=args.number,
+                                  repeat=3))
+        print("%-26s %8.2f us -> %6.2f us  (%.1fx)" % (
+            name, before / args.number * 1e6, after / args.number * 1e6,
+            before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the memory needed to hold a large ``subscription`` result as
+dictionaries, as record objects and as a ColumnarResult, and the time taken to
+build each from the decoded JSON.
+
+    python -m benchmarks.bench_records [--items N]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from signupto.records import RecordDecoder
+
+from .bench_codec import make_subscription_page
+
+
+def measure(build, content):
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(content)['response']['data']
+    start = time.perf_counter()
+    result = build(data)
+    elapsed = time.perf_counter() - start
+    del data
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200000)
+    args = parser.parse_args()
+
+    content = make_subscription_page(args.items)
+    print("%d subscriptions" % args.items)
+    candidates = [('dicts', lambda data: data),
+                  ('records', RecordDecoder(mode='records').decode),
+                  ('columnar', RecordDecoder(mode='columnar').decode)]
+    for name, decode in candidates:
+        if name == 'dicts':
+            build = decode
+        else:
+            def build(data, decode=decode):
+                return decode('subscription', data)
+        elapsed, retained = measure(build, content)
+        print("%-10s %8.1f ms to build  %8.1f MB retained" %
+              (name, elapsed * 1000, retained / 1e6))
+
+
+if __name__ == '__main__':
+    main()
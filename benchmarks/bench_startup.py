@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the cold start cost of each transport, as paid by short-lived
+scripts: the time to import signupto, and the time to create a Client and
+make the first request (including importing the transport's library), each
+in a fresh interpreter.
+
+    python -m benchmarks.bench_startup [--runs N] [--json FILE]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from signupto.testing import StubServer
+from signupto.transport import TRANSPORTS
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import signupto
+imported = time.perf_counter()
+c = signupto.Client(base_url=%(url)r, transport=%(transport)r)
+c.list.get(id=1)
+finished = time.perf_counter()
+print(json.dumps({'import': imported - start,
+                  'first_request': finished - imported}))
+"""
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure(url, transport, runs):
+    results = []
+    for i in range(runs):
+        script = CHILD % {'url': url, 'transport': transport}
+        output = subprocess.check_output([sys.executable, '-c', script])
+        results.append(json.loads(output.decode('utf-8')))
+    return {'import_ms': median([r['import'] for r in results]) * 1000,
+            'first_request_ms':
+                median([r['first_request'] for r in results]) * 1000,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', help="Save results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print("%-10s %12s %18s" % ("transport", "import ms", "first request ms"))
+    with StubServer() as server:
+        for transport in sorted(TRANSPORTS):
+            result = results[transport] = measure(server.url, transport,
+                                                  args.runs)
+            print("%-10s %12.1f %18.1f" %
+                  (transport, result['import_ms'], result['first_request_ms']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
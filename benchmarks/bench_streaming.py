@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares iterating over one large ``subscription`` page with iter_all and
+with iter_all(stream=True): peak memory, time to the first item, and total
+time.
+
+    python -m benchmarks.bench_streaming [--items N]
+
+The page is served from memory in 64KB chunks, as a transport would read it,
+so only the client's own memory use is measured.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from signupto import Client
+from signupto.transport import Request, Response, StreamedResponse
+
+from .bench_codec import make_subscription_page
+
+
+class MemoryTransport(object):
+    def __init__(self, content, chunk_size=65536):
+        self.content = content
+        self.chunk_size = chunk_size
+
+    def request(self, method, url, data=None, params=None, headers=None):
+        return Response(200, {}, b''.join(self._chunks()),
+                        Request(method, url), {})
+
+    def stream(self, method, url, data=None, params=None, headers=None):
+        return StreamedResponse(200, {}, Request(method, url), {},
+                                self._chunks(), lambda: None)
+
+    def _chunks(self):
+        for i in range(0, len(self.content), self.chunk_size):
+            yield self.content[i:i + self.chunk_size]
+
+    def close(self):
+        pass
+
+
+def measure(client, stream):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for item in client.subscription.iter_all(prefetch=0, stream=stream):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, first, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+
+    content = make_subscription_page(args.items)
+    # One page, with no next page
+    content = content.replace(b'"next": %d' % args.items, b'"next": null')
+    client = Client(transport=MemoryTransport(content))
+    print("%d subscriptions, %.1f MB page" % (args.items, len(content) / 1e6))
+    for name, stream in [('iter_all', False), ('iter_all(stream=True)', True)]:
+        count, first, elapsed, peak = measure(client, stream)
+        assert count == args.items
+        print("%-24s %8.1f ms to first item  %8.1f ms total  %8.1f MB peak" % (
+            name, first * 1000, elapsed * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
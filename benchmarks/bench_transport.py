@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares one-shot ``requests.request`` calls (the old behaviour) against the
+pooled keep-alive transport, using a local stub server.
+
+    python -m benchmarks.bench_transport [--requests N] [--threads N]
+
+Note that the stub server uses plain HTTP, so this only measures the TCP
+connection overhead - against the real API, which uses TLS, the difference is
+larger.
+"""
+
+import argparse
+import threading
+import time
+
+import requests
+
+from signupto import Client
+from signupto.testing import StubServer
+from signupto.transport import RequestsTransport
+
+
+class OneShotTransport(object):
+    def request(self, method, url, data=None, params=None, headers=None):
+        return requests.request(method, url, data=data, params=params,
+                                headers=headers)
+
+    def close(self):
+        pass
+
+
+def run(client, total, threads):
+    per_thread = total // threads
+
+    def worker():
+        for i in range(per_thread):
+            client.list.get(id=i)
+
+    workers = [threading.Thread(target=worker) for i in range(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return (per_thread * threads) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        transports = [
+            ('one-shot requests.request', OneShotTransport()),
+            ('pooled RequestsTransport',
+             RequestsTransport(pool_maxsize=args.threads)),
+        ]
+        for name, transport in transports:
+            with Client(base_url=server.url, transport=transport) as client:
+                rate = run(client, args.requests, args.threads)
+            print("%-30s %8.0f requests/sec" % (name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark suite, run against a local stub of the sign-up.to API.
+
+    python -m benchmarks.suite [--scenario NAME ...] [--json FILE]
+
+For each scenario, reports operations per second, p50/p99 latency per
+operation, and the peak memory allocated during a single operation. Use
+--json to save the results, and --compare to show the change from a saved
+baseline.
+"""
+
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+
+from signupto import Client, HashAuthorization
+from signupto.ratelimit import RateLimiter
+from signupto.retry import RetryPolicy
+from signupto.testing import StubAPI, StubServer, envelope, make_subscription
+
+AUTH = HashAuthorization(company_id=1234, user_id=4567,
+                         api_key='e4cf7fe3b764a18c04f6792c09e3325d')
+
+
+class Scenario(object):
+    """
+    A benchmark. 'make_app' returns the StubAPI to run (or None if no server
+    is needed), 'make_client' the Client, and 'operation' is the thing that is
+    timed, called with the client. 'server_kwargs' are passed to StubServer.
+    """
+    def __init__(self, name, operation, number=200, threads=1,
+                 make_app=lambda: StubAPI(credentials=AUTH),
+                 client_kwargs=None, server_kwargs=None):
+        self.name = name
+        self.operation = operation
+        self.number = number
+        self.threads = threads
+        self.make_app = make_app
+        self.client_kwargs = client_kwargs or {}
+        self.server_kwargs = server_kwargs or {}
+
+    def run(self):
+        app = self.make_app()
+        server = None
+        if app is not None:
+            server = StubServer(app=app, **self.server_kwargs).start()
+        base_url = server.url if server is not None else 'http://localhost'
+        try:
+            with Client(auth=AUTH, base_url=base_url,
+                        **self.client_kwargs) as client:
+                # Warm up, and measure memory
+                self.operation(client)
+                tracemalloc.start()
+                self.operation(client)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                latencies = []
+                lock = threading.Lock()
+                per_thread = self.number // self.threads
+
+                def worker():
+                    timings = []
+                    for i in range(per_thread):
+                        start = time.perf_counter()
+                        self.operation(client)
+                        timings.append(time.perf_counter() - start)
+                    with lock:
+                        latencies.extend(timings)
+
+                workers = [threading.Thread(target=worker)
+                           for i in range(self.threads)]
+                start = time.perf_counter()
+                if server is not None:
+                    server.bytes_sent = 0
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+                elapsed = time.perf_counter() - start
+                bytes_sent = server.bytes_sent if server is not None else 0
+        finally:
+            if server is not None:
+                server.stop()
+
+        latencies.sort()
+        return {'ops_per_sec': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'peak_memory_kb': peak / 1024.0,
+                'response_kb_per_op': bytes_sent / 1024.0 / len(latencies),
+                }
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1,
+                int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class CannedResponse(object):
+    class request(object):
+        method = 'GET'
+        url = 'http://localhost/v0/subscription'
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+
+def make_deserialize(items):
+    response = CannedResponse(
+        json.dumps(envelope([make_subscription(i) for i in range(items)],
+                            next=items)).encode('utf-8'))
+    return lambda c: c.deserialize(response)
+
+
+def sign(c):
+    c._auth.make_authorized_request(lambda *args, **kwargs: None,
+                                    'GET', 'https://api.sign-up.to/v0/list',
+                                    headers={})
+
+
+SCENARIOS = [
+    Scenario('get', lambda c: c.list.get(id=1), number=1000),
+    Scenario('get urllib3 transport', lambda c: c.list.get(id=1), number=1000,
+             client_kwargs={'transport': 'urllib3'}),
+    Scenario('get stdlib transport', lambda c: c.list.get(id=1), number=1000,
+             client_kwargs={'transport': 'stdlib'}),
+    Scenario('get 8 threads', lambda c: c.list.get(id=1), number=2000,
+             threads=8),
+    Scenario('get 5ms latency', lambda c: c.list.get(id=1), number=200,
+             make_app=lambda: StubAPI(credentials=AUTH, latency=0.005)),
+    Scenario('get_all 20x500', lambda c: c.subscription.get_all(), number=10,
+             make_app=lambda: StubAPI(credentials=AUTH, items=10000,
+                                      page_size=500)),
+    Scenario('get_all 20x500 gzip', lambda c: c.subscription.get_all(),
+             number=10,
+             make_app=lambda: StubAPI(credentials=AUTH, items=10000,
+                                      page_size=500),
+             server_kwargs={'compression': True}),
+    Scenario('get_all 20x500 gzip stdlib transport',
+             lambda c: c.subscription.get_all(), number=10,
+             make_app=lambda: StubAPI(credentials=AUTH, items=10000,
+                                      page_size=500),
+             server_kwargs={'compression': True},
+             client_kwargs={'transport': 'stdlib'}),
+    Scenario('iter_all 20x500 streamed',
+             lambda c: sum(1 for i in c.subscription.iter_all(stream=True)),
+             number=10,
+             make_app=lambda: StubAPI(credentials=AUTH, items=10000,
+                                      page_size=500)),
+    Scenario('iter_all 20x500 5ms latency',
+             lambda c: sum(1 for i in c.subscription.iter_all()), number=10,
+             make_app=lambda: StubAPI(credentials=AUTH, items=10000,
+                                      page_size=500, latency=0.005)),
+    Scenario('get_all 10 lists 5ms latency',
+             lambda c: [c.subscription.get_all(list_id=i) for i in range(10)],
+             number=3,
+             make_app=lambda: StubAPI(credentials=AUTH, items=1000,
+                                      page_size=100, latency=0.005)),
+    Scenario('get_all_partitioned 10 lists 5ms latency',
+             lambda c: c.subscription.get_all_partitioned(
+                 [{'list_id': i} for i in range(10)]),
+             number=3,
+             make_app=lambda: StubAPI(credentials=AUTH, items=1000,
+                                      page_size=100, latency=0.005)),
+    Scenario('get_all 404 end of list',
+             lambda c: c.subscription.get_all(start=100), number=500),
+    Scenario('get 5% 5xx with retries', lambda c: c.list.get(id=1), number=500,
+             make_app=lambda: StubAPI(credentials=AUTH, error_rate=0.05,
+                                      seed=0),
+             client_kwargs={'retry': RetryPolicy(max_retries=5,
+                                                 backoff=0.001)}),
+    Scenario('get rate limited 500/s', lambda c: c.list.get(id=1),
+             number=1000, threads=4,
+             make_app=lambda: StubAPI(credentials=AUTH, rate_limit=500),
+             client_kwargs={'rate_limiter': RateLimiter(rate=450)}),
+    Scenario('sign', sign, number=20000, make_app=lambda: None),
+    Scenario('deserialize 500 items', make_deserialize(500), number=500,
+             make_app=lambda: None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', action='append',
+                        help="Run only the named scenario(s)")
+    parser.add_argument('--json', help="Save results to this file")
+    parser.add_argument('--compare',
+                        help="Compare with results saved in this file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print("%-42s %12s %10s %10s %12s %12s" % (
+        "scenario", "ops/sec", "p50 ms", "p99 ms", "peak KB", "KB recv/op"))
+    for scenario in SCENARIOS:
+        if args.scenario and scenario.name not in args.scenario:
+            continue
+        result = results[scenario.name] = scenario.run()
+        line = "%-42s %12.1f %10.3f %10.3f %12.1f %12.1f" % (
+            scenario.name, result['ops_per_sec'], result['p50_ms'],
+            result['p99_ms'], result['peak_memory_kb'],
+            result['response_kb_per_op'])
+        if scenario.name in baseline:
+            ratio = (result['ops_per_sec'] /
+                     baseline[scenario.name]['ops_per_sec'])
+            line += "  (%+.0f%% ops/sec)" % ((ratio - 1) * 100)
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
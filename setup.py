@@ -32,8 +32,19 @@ setup(
     include_package_data=True,
     install_requires=[
         "requests >= 2.0",
-        "six >= 1.4",
     ],
+    python_requires=">=3.7",
+    extras_require={
+        'async': ["httpx"],
+        'fast': ["orjson"],
+        'http2': ["httpx[http2]"],
+    },
+    entry_points={
+        'console_scripts': [
+            'signupto-export = signupto.export:main',
+            'signupto-import = signupto.importer:main',
+        ],
+    },
     license="BSD",
     zip_safe=False,
     keywords='signupto',
@@ -42,10 +53,14 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
-        "Programming Language :: Python :: 2",
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
     test_suite='tests',
 )
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
-from __future__ import absolute_import
 
 __author__ = 'Luke Plant'
 __email__ = 'L.Plant.98@cantab.net'
 __version__ = '0.1'
 
-from .client import Client, HashAuthorization, TokenAuthorization, ClientError, ObjectNotFound
+from .client import (Client, HashAuthorization, TokenAuthorization,
+                     ServerError, CircuitOpen, ClientError, ObjectNotFound,
+                     RateLimited)
+from .deadline import DeadlineExceeded
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio version of the client. Requires Python 3 and the ``httpx`` library.
+
+>>> async with AsyncClient(auth=HashAuthorization(...)) as c:
+...     r = await c.list.get(id="mylist")
+"""
+import asyncio
+import functools
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .client import (Client, ClientError, DEFAULT_BASE_URL, Endpoint,
+                     NoAuthorization, ObjectNotFound)
+from .codec import get_codec
+from .compression import Compression, httpx_encodings
+from .deadline import Deadline, DeadlineExceeded
+from .transport import DEFAULT_TIMEOUT, httpx_timeout
+
+# Errors from a request timing out
+TIMEOUT_ERRORS = (IOError,)
+if httpx is not None:
+    TIMEOUT_ERRORS += (httpx.TimeoutException,)
+
+
+class HttpxAsyncTransport(object):
+    """
+    Sends requests using a shared ``httpx.AsyncClient``, which keeps a pool of
+    up to ``max_connections`` connections open to the API.
+
+    With ``http2=True`` (which needs ``pip install signupto[http2]``),
+    concurrent requests are multiplexed over HTTP/2 connections, with at
+    most ``max_streams`` requests in flight at once. See
+    signupto.transport.HTTP2Transport for ``prior_knowledge``, and
+    signupto.transport.RequestsTransport for ``timeout``.
+    """
+    def __init__(self, max_connections=10, max_keepalive_connections=10,
+                 keepalive_expiry=5.0, http2=False, max_streams=100,
+                 prior_knowledge=False, timeout=DEFAULT_TIMEOUT):
+        if httpx is None:
+            raise ImportError("HttpxAsyncTransport requires the 'httpx' "
+                              "library")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry)
+        self.http2 = http2
+        self.max_streams = max_streams
+        self.prior_knowledge = prior_knowledge
+        self.timeout = timeout
+        self._client = None
+        self._streams = None
+
+    def make_client(self):
+        timeout = httpx_timeout(self.timeout)
+        if self.http2:
+            return httpx.AsyncClient(limits=self.limits, timeout=timeout,
+                                     http2=True,
+                                     http1=not self.prior_knowledge)
+        return httpx.AsyncClient(limits=self.limits, timeout=timeout)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.make_client()
+        return self._client
+
+    async def request(self, method, url, data=None, params=None, headers=None,
+                      timeout=None):
+        extra = {}
+        if timeout is not None:
+            extra['timeout'] = httpx_timeout(timeout)
+        if not self.http2:
+            return await self.client.request(method, url, content=data,
+                                             params=params, headers=headers,
+                                             **extra)
+        if self._streams is None:
+            self._streams = asyncio.Semaphore(self.max_streams)
+        async with self._streams:
+            return await self.client.request(method, url, content=data,
+                                             params=params, headers=headers,
+                                             **extra)
+
+    def content_encodings(self):
+        return httpx_encodings()
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+class AsyncClient(Client):
+    """
+    Like Client, but the endpoint methods are coroutines:
+
+    >>> c = AsyncClient(auth=HashAuthorization(...))
+    >>> (await c.list.get(id="mylist")).data
+
+    At most 'max_concurrency' requests will be in flight at once. Identical
+    concurrent GET requests can be shared by passing 'single_flight' (see
+    signupto.coalesce.SingleFlight). 'timeout' and deadlines are as for
+    Client. The client should be closed with 'await c.close()', or used as
+    an async context manager.
+
+    Rate limiters, retries, circuit breakers, caches, hooks and hedging
+    aren't supported.
+    """
+    def __init__(self, version="0", auth=None, transport=None,
+                 base_url=DEFAULT_BASE_URL, max_concurrency=10, codec=None,
+                 single_flight=None, compression=None, timeout=None):
+        self._version = version
+        self._base_url = base_url
+        self._baseurl = '%s/v%s/' % (base_url.rstrip('/'), version)
+        if auth is None:
+            auth = NoAuthorization()
+        self._auth = auth
+        if transport is None:
+            transport = HttpxAsyncTransport(max_connections=max_concurrency)
+        self._transport = transport
+        if codec is None:
+            codec = get_codec()
+        self._codec = codec
+        self._endpoints = {}
+        self._record_decoder = None
+        self._single_flight = single_flight
+        if compression is None:
+            compression = Compression()
+        self._compression = compression
+        self._accept_encoding = None
+        self._timeout = timeout
+        # Client features that AsyncClient doesn't support
+        self._rate_limiter = None
+        self._retry = None
+        self._circuit_breaker = None
+        self._cache = None
+        self._hooks = []
+        self._hedge = None
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._init_lock = None
+
+    async def close(self):
+        await self._transport.close()
+        close = getattr(self._auth, 'close', None)
+        if close is not None:
+            close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def initialize_auth(self):
+        # TokenAuthorization needs a login request first. This happens once, so
+        # we just run the blocking version in a thread.
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if not getattr(self._auth, 'initialized', False):
+                loop = asyncio.get_running_loop()
+                initialize = functools.partial(self._auth.initialize,
+                                               version=self._version,
+                                               base_url=self._base_url)
+                await loop.run_in_executor(None, initialize)
+
+    async def make_request_raw(self, method, url, data='', params=None,
+                               headers=None, timeout=None):
+        if timeout is None:
+            return await self._transport.request(method, url, data=data,
+                                                 params=params,
+                                                 headers=headers)
+        return await self._transport.request(method, url, data=data,
+                                             params=params, headers=headers,
+                                             timeout=timeout)
+
+    async def make_request(self, method, resource_name, data=None, params=None,
+                           headers=None, timeout=None, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        call = functools.partial(self._make_request, method, resource_name,
+                                 data=data, params=params, headers=headers,
+                                 timeout=timeout, deadline=deadline)
+        single_flight = self._single_flight
+        if single_flight is None or method not in single_flight.methods:
+            return await self._wait(call(), deadline)
+        key = single_flight.make_key(method, resource_name, params, headers)
+        while True:
+            try:
+                shared = single_flight.call_async(resource_name, key, call)
+                return await self._wait(shared, deadline)
+            except DeadlineExceeded as e:
+                # If another caller's request ran out of time, and ours
+                # hasn't, try again.
+                if not single_flight.is_others_deadline(e, deadline):
+                    raise
+
+    async def _wait(self, result, deadline):
+        if deadline is None:
+            return await result
+        deadline.check()
+        try:
+            # Also covers waiting for the auth and a free slot.
+            return await asyncio.wait_for(result, deadline.remaining())
+        except asyncio.TimeoutError:
+            raise deadline.exceeded()
+
+    async def _make_request(self, method, resource_name, data=None,
+                            params=None, headers=None, timeout=None,
+                            deadline=None):
+        if (hasattr(self._auth, 'initialize') and
+                not getattr(self._auth, 'initialized', False)):
+            await self.initialize_auth()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if timeout is None:
+            timeout = self._timeout
+        async with self._semaphore:
+            handler = self.make_request_raw
+            if deadline is not None:
+                if timeout is None:
+                    timeout = getattr(self._transport, 'timeout', None)
+                timeout = deadline.limit(timeout)
+            if timeout is not None:
+                handler = functools.partial(self.make_request_raw,
+                                            timeout=timeout)
+            # Signing happens synchronously; make_request_raw returns a
+            # coroutine, which make_authorized_request passes back to us.
+            try:
+                response = await self.send_request(method, resource_name,
+                                                   data=data, params=params,
+                                                   headers=headers,
+                                                   handler=handler)
+            except TIMEOUT_ERRORS:
+                if deadline is not None and deadline.expired:
+                    raise deadline.exceeded()
+                raise
+        return self.handle_response(response)
+
+
+class AsyncEndpoint(Endpoint):
+    """
+    Endpoint for AsyncClient. get/post/put/delete/head, get_all, get_list,
+    delete_any and get_many/head_many/delete_many return coroutines, and
+    iter_pages and iter_all are async iterators:
+
+    >>> async for item in c.subscription.iter_all(list_id=1):
+    ...     print(item)
+
+    Streaming and the partitioned methods aren't supported: stream=True, or
+    'partitions', raises TypeError.
+    """
+    @staticmethod
+    def _check_unsupported(stream, kwargs):
+        # Rather than sending them to the API as parameters.
+        if stream:
+            raise TypeError("AsyncClient doesn't support stream=True")
+        if 'partitions' in kwargs:
+            raise TypeError("AsyncClient doesn't support 'partitions' - use "
+                            "asyncio.gather with get_all")
+
+    def iter_pages(self, prefetch=1, stream=False, timeout=None, deadline=None,
+                   **kwargs):
+        """
+        Like Endpoint.iter_pages, but the next page is fetched in a task of
+        its own, if 'prefetch' is not 0.
+        """
+        self._check_unsupported(stream, kwargs)
+        return self._iter_pages(kwargs, prefetch, timeout,
+                                Deadline.coerce(deadline))
+
+    async def _iter_pages(self, kwargs, prefetch, timeout, deadline):
+        kwargs = kwargs.copy()
+
+        async def fetch(start):
+            if start is not None:
+                kwargs['start'] = start
+            try:
+                return await self.get(timeout=timeout, deadline=deadline,
+                                      **kwargs)
+            except ObjectNotFound:
+                # No more
+                return None
+            except Exception as e:
+                # Allow the caller to carry on from here.
+                e.resume_start = start
+                raise
+
+        response = await fetch(None)
+        while response is not None:
+            start = response.next
+            if start is None:
+                yield response
+                return
+            if not prefetch:
+                yield response
+                response = await fetch(start)
+                continue
+            following = asyncio.ensure_future(fetch(start))
+            try:
+                yield response
+            except BaseException:
+                following.cancel()
+                raise
+            response = await following
+
+    async def iter_all(self, prefetch=1, stream=False, timeout=None,
+                       deadline=None, **kwargs):
+        """
+        Like iter_pages, but yields the individual items from each page.
+        """
+        async for response in self.iter_pages(prefetch=prefetch, stream=stream,
+                                              timeout=timeout,
+                                              deadline=deadline, **kwargs):
+            for item in response.data:
+                yield item
+
+    def stream(self, timeout=None, deadline=None, **kwargs):
+        raise NotImplementedError("AsyncClient doesn't support streaming")
+
+    def iter_pages_partitioned(self, partitions, **kwargs):
+        raise NotImplementedError("AsyncClient doesn't support partitioned "
+                                  "scans - use asyncio.gather with get_all")
+
+    iter_all_partitioned = get_all_partitioned = iter_pages_partitioned
+
+    async def _call_many(self, method, keys, param, max_workers, kwargs):
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def call(key):
+            params = kwargs.copy()
+            params[param] = key
+            async with semaphore:
+                try:
+                    return await method(**params)
+                except ClientError as e:
+                    return e
+        return list(await asyncio.gather(*[call(key) for key in keys]))
+
+    async def get_all(self, stream=False, timeout=None, deadline=None,
+                      **kwargs):
+        """
+        Like Endpoint.get_all, including the 'partial_results' and
+        'resume_start' attributes of errors.
+        """
+        pages = self.iter_pages(prefetch=0, stream=stream, timeout=timeout,
+                                deadline=deadline, **kwargs)
+        retval = None
+        try:
+            async for response in pages:
+                if retval is None:
+                    # An empty container of the same type - usually a list,
+                    # but see signupto.records
+                    retval = response.data[:0]
+                retval.extend(response.data)
+        except Exception as e:
+            e.partial_results = retval if retval is not None else []
+            raise
+        return retval if retval is not None else []
+
+    async def get_list(self, **kwargs):
+        try:
+            return (await self.get(**kwargs)).data
+        except ObjectNotFound:
+            return []
+
+    async def delete_any(self, **kwargs):
+        try:
+            return (await self.delete(**kwargs)).data
+        except ObjectNotFound:
+            return []
+
+    def __repr__(self):
+        return "AsyncEndpoint(%r)" % self.resource_name
+
+
+AsyncClient.endpoint_class = AsyncEndpoint
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+In-process caching of GET and HEAD responses.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+monotonic = time.monotonic
+
+MISSING = object()
+
+CACHEABLE_METHODS = frozenset(['GET', 'HEAD'])
+
+
+def normalize_params(params):
+    """
+    Returns a hashable version of request parameters, such that parameters
+    that produce the same query string produce the same value.
+    """
+    if not params:
+        return ()
+    items = []
+    for k, v in params.items():
+        if v is None:
+            continue
+        if isinstance(v, (list, tuple)):
+            v = tuple(str(x) for x in v)
+        else:
+            v = str(v)
+        items.append((str(k), v))
+    return tuple(sorted(items))
+
+
+class ResponseCache(object):
+    """
+    A size bounded LRU cache of responses.
+
+    Entries expire after 'ttl' seconds, or the value given for the endpoint in
+    'endpoint_ttls' (a dictionary of {resource_name: ttl}). A ttl of 0 (or
+    None) means responses for that endpoint are not cached.
+
+    Any POST, PUT or DELETE request to an endpoint removes the cached entries
+    for that endpoint.
+
+    Cached SignuptoResponse objects are shared between callers, so they should
+    not be modified.
+    """
+    def __init__(self, max_size=1000, ttl=60, endpoint_ttls=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.endpoint_ttls = endpoint_ttls or {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get_ttl(self, resource_name):
+        return self.endpoint_ttls.get(resource_name, self.ttl)
+
+    def make_key(self, method, resource_name, params):
+        return (method, resource_name, normalize_params(params))
+
+    def generation(self, resource_name):
+        """
+        Returns a value that changes whenever 'resource_name' is invalidated.
+        """
+        return self._generations.get(resource_name, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                expires, value = entry
+                if expires > monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, generation=None):
+        """
+        Stores a value. If 'generation' is passed, the value is only stored if
+        the endpoint has not been invalidated since 'generation' was retrieved,
+        to avoid caching responses that were in flight during a write.
+        """
+        resource_name = key[1]
+        ttl = self.get_ttl(resource_name)
+        if not ttl:
+            return
+        with self._lock:
+            if (generation is not None and
+                    generation != self.generation(resource_name)):
+                return
+            self._entries[key] = (monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, resource_name):
+        with self._lock:
+            generation = self.generation(resource_name)
+            self._generations[resource_name] = generation + 1
+            for key in [k for k in self._entries if k[1] == resource_name]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'size': len(self._entries),
+                    }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the command line tools, signupto-export and
+signupto-import.
+"""
+
+import os
+import sys
+import time
+from urllib import parse as urllib_parse
+
+from .client import (DEFAULT_BASE_URL, Client, HashAuthorization, ServerError,
+                     TokenAuthorization)
+from .retry import RetryPolicy
+from .transport import TRANSPORTS
+
+
+def add_client_arguments(parser):
+    auth = parser.add_argument_group(
+        'authorization',
+        "Either a company id, user id and API key, or a username and "
+        "password. Each defaults to an environment variable, e.g. "
+        "SIGNUPTO_API_KEY.")
+    for name in ['company-id', 'user-id', 'api-key', 'username', 'password']:
+        env_name = 'SIGNUPTO_' + name.upper().replace('-', '_')
+        auth.add_argument('--' + name, default=os.environ.get(env_name))
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--api-version', default="0")
+    parser.add_argument('--transport', choices=sorted(TRANSPORTS))
+    parser.add_argument('--retries', type=int, default=3,
+                        help="Times to retry a failed request (default: 3)")
+    parser.add_argument('--timeout', type=float,
+                        help="Timeout for each request, in seconds (default: "
+                             "10 to connect, 60 between reads)")
+
+
+def make_auth(args):
+    """
+    Returns the authorization given by the arguments, or None.
+    """
+    if args.company_id and args.user_id and args.api_key:
+        return HashAuthorization(company_id=args.company_id,
+                                 user_id=args.user_id, api_key=args.api_key)
+    if args.username and args.password:
+        return TokenAuthorization(username=args.username,
+                                  password=args.password)
+    return None
+
+
+def check_auth(parser, args):
+    auth = make_auth(args)
+    if auth is None:
+        parser.error("credentials are required - either --company-id, "
+                     "--user-id and --api-key, or --username and --password")
+    return auth
+
+
+def make_client(args, auth):
+    return Client(auth=auth, base_url=args.base_url, version=args.api_version,
+                  transport=args.transport,
+                  retry=RetryPolicy(max_retries=args.retries),
+                  timeout=args.timeout)
+
+
+def describe_error(e):
+    if isinstance(e, ServerError) and e.status_code is not None:
+        message = "HTTP %s from the server" % e.status_code
+    elif str(e):
+        message = "%s: %s" % (e.__class__.__name__, e)
+    else:
+        message = e.__class__.__name__
+    if getattr(e, 'resume_partitions', None):
+        message += " (for %s)" % ', '.join(
+            urllib_parse.urlencode(sorted(params.items()))
+            for params in e.resume_partitions)
+    return message
+
+
+def print_error(prog, e, checkpoint_path):
+    print("\n%s: error: %s" % (prog, describe_error(e)), file=sys.stderr)
+    if os.path.exists(checkpoint_path):
+        print("Progress has been saved to %s - run the same command again to "
+              "carry on." % checkpoint_path, file=sys.stderr)
+
+
+class ProgressDisplay(object):
+    """
+    Shows progress on one line of 'stream', updated at most every 'interval'
+    seconds. It is called with a dictionary of statistics, which
+    'format_line' turns into the line to show, and which has a 'finished'
+    key that is True for the last call.
+    """
+    def __init__(self, format_line, stream=None, interval=0.5):
+        self.format_line = format_line
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        self._last = 0
+        self._width = 0
+
+    def __call__(self, stats):
+        now = time.time()
+        if not stats['finished'] and now - self._last < self.interval:
+            return
+        self._last = now
+        line = self.format_line(stats)
+        self.stream.write('\r' + line.ljust(self._width))
+        self._width = len(line)
+        if stats['finished']:
+            self.stream.write('\n')
+            self._width = 0
+        self.stream.flush()
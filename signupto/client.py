@@ -2,21 +2,26 @@
 # -*- coding: utf-8 -*-
 
 
-from collections import namedtuple
-from datetime import datetime
-from time import mktime
+from collections import deque, namedtuple
+import binascii
+import copy
+import functools
+from hashlib import sha1
+import os
+import time
+from urllib import parse as urllib_parse
 from wsgiref.handlers import format_date_time
-import json
-import random
-import string
 
-try:
-    from sha import new as sha1
-except ImportError:
-    from hashlib import sha1
-from six.moves.urllib import parse as urllib_parse
+from . import concurrency
+from .cache import CACHEABLE_METHODS, MISSING
+from .codec import get_codec
+from .compression import Compression
+from .deadline import Deadline
+from .instrumentation import RequestEvent, perf_counter
+from .streaming import JSONStream
+from .transport import RequestsTransport, get_transport
 
-import requests
+DEFAULT_BASE_URL = 'https://api.sign-up.to'
 
 # By explicitly listing endpoints, we can get tab completion and help etc. when
 # using Client interactively or in an IDE.
@@ -57,6 +62,132 @@ ENDPOINTS = [
 SignuptoResponse = namedtuple('SignuptoResponse', 'data next count')
 
 
+class StreamingResponse(object):
+    """
+    A response whose items are parsed from the body as it arrives, returned
+    by Client.stream_request. 'data' is an iterator over the items (or over
+    the single object, for endpoints that don't return lists).
+
+    'next' and 'count' are read from the body when they arrive. If the
+    server sends them after the data, asking for them before iterating over
+    'data' parses the remaining items into memory.
+
+    The connection is released once the whole body has been read. To give up
+    part way through, call close(), or use the response as a context manager.
+    Errors reading the body, including invalid JSON (ValueError), are raised
+    while iterating.
+    """
+    def __init__(self, client, response):
+        self.response = response
+        self.start = None  # The 'start' parameter of the request, if paging
+        self._client = client
+        self._event = getattr(response, 'signupto_event', None)
+        self._body_start = perf_counter()
+        if getattr(response, 'signupto_streamed', False):
+            chunks = response.iter_content()
+        else:
+            chunks = [response.content]
+        self._stream = JSONStream(chunks, client._codec.loads)
+        self._fields = {}
+        self._buffer = deque()
+        self._items = self._parse()
+        self._finished = False
+        self.data = self._iter_data()
+
+    def _parse(self):
+        stream = self._stream
+        url = self.response.request.url
+        decoder = self._client._record_decoder
+        resource_name = url_path(url).rsplit('/', 1)[-1]
+        error = None
+        try:
+            status = None
+            for key in stream.members():
+                if key == 'status':
+                    status = stream.value().lower()
+                elif (key == 'response' and status in (None, 'ok') and
+                      stream.peek() == '{'):
+                    for name in stream.members():
+                        if name != 'data':
+                            self._fields[name] = stream.value()
+                        elif stream.peek() == '[':
+                            for item in stream.elements():
+                                if decoder is not None:
+                                    item = decoder.decode_item(resource_name,
+                                                               item)
+                                yield item
+                        else:
+                            item = stream.value()
+                            if item is not None:
+                                yield item
+                elif key == 'response':
+                    self._fields = stream.value()
+                else:
+                    stream.value()
+            stream.end()
+            assert status is not None, ("Server response did not contain "
+                                        "'status' key, aborting")
+            if status != 'ok':
+                raise ClientError("URL: %s %r" % (url, self._fields),
+                                  self._fields, self.response.status_code)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(error)
+
+    def _iter_data(self):
+        while True:
+            if self._buffer:
+                yield self._buffer.popleft()
+                continue
+            try:
+                item = next(self._items)
+            except StopIteration:
+                return
+            yield item
+
+    def _field(self, name):
+        while name not in self._fields and not self._finished:
+            try:
+                self._buffer.append(next(self._items))
+            except StopIteration:
+                break
+        return self._fields.get(name)
+
+    @property
+    def next(self):
+        return self._field('next')
+
+    @property
+    def count(self):
+        return self._field('count')
+
+    def _finish(self, error):
+        if self._finished:
+            return
+        self._finished = True
+        close = getattr(self.response, 'close', None)
+        if close is not None:
+            close()
+        if self._event is not None:
+            self._client._finish_streamed_event(self._event, self._body_start,
+                                                self._stream.bytes_read, error)
+
+    def close(self):
+        self._items.close()
+        self._finish(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "<StreamingResponse %s>" % self.response.request.url
+
+
 class ServerError(ValueError):
     """
     Indicates HTTP error code.
@@ -66,6 +197,15 @@ class ServerError(ValueError):
         self.status_code = status_code
 
 
+class CircuitOpen(ServerError):
+    """
+    The request was not made, because recent requests to the same endpoint
+    have been failing.
+    """
+    def __init__(self, message):
+        super(CircuitOpen, self).__init__(message, None)
+
+
 class ClientError(ValueError):
     """
     Indicates error made by programmer using this library.
@@ -81,27 +221,55 @@ class ObjectNotFound(ClientError):
     pass
 
 
+class RateLimited(ClientError):
+    """
+    The server returned 429 Too Many Requests.
+    """
+    pass
+
+
 class NoAuthorization(object):
     def make_authorized_request(self, handler, method, url, data=None, params=None, headers=None):
         return handler(method, url, data=data, params=params, headers=headers)
 
 
+_url_paths = {}
+
+
+def url_path(url):
+    """
+    Returns the path of 'url' as used for signing, caching the result.
+    """
+    try:
+        return _url_paths[url]
+    except KeyError:
+        path = urllib_parse.urlparse(url).path.rstrip('/')
+        if len(_url_paths) < 1000:
+            _url_paths[url] = path
+        return path
+
+
+_date_cache = (None, None)
+
+
+def http_date():
+    """
+    Returns the current time formatted for a Date header, which only changes
+    once per second.
+    """
+    global _date_cache
+    now = int(time.time())
+    second, date_string = _date_cache
+    if second != now:
+        date_string = format_date_time(now)
+        _date_cache = (now, date_string)
+    return date_string
+
+
 def make_hash_authorization_signature(method, url, date_string, company_id, user_id, nonce, api_key):
-    s = ("%(method)s %(path)s\r\n"
-         "Date: %(date_string)s\r\n"
-         "X-SuT-CID: %(company_id)s\r\n"
-         "X-SuT-UID: %(user_id)s\r\n"
-         "X-SuT-Nonce: %(nonce)s\r\n"
-         "%(api_key)s"
-
-         % dict(method=method,
-                path=urllib_parse.urlparse(url).path.rstrip('/'),
-                date_string=date_string,
-                company_id=company_id,
-                user_id=user_id,
-                nonce=nonce,
-                api_key=api_key)
-         )
+    s = ("%s %s\r\nDate: %s\r\nX-SuT-CID: %s\r\nX-SuT-UID: %s\r\n"
+         "X-SuT-Nonce: %s\r\n%s" % (method, url_path(url), date_string,
+                                    company_id, user_id, nonce, api_key))
     return sha1(s.encode('utf-8')).hexdigest()
 
 
@@ -110,21 +278,52 @@ class HashAuthorization(object):
         self.company_id = company_id
         self.user_id = user_id
         self.api_key = api_key
+        self._signing_cache = None
 
     def make_nonce(self):
-        return ''.join(random.choice(string.ascii_lowercase + string.digits) for x in range(40))
+        # 40 characters from [a-z0-9], as required by the API.
+        return binascii.hexlify(os.urandom(20)).decode('ascii')
+
+    def sign(self, method, url, date_string, nonce):
+        """
+        Equivalent to make_hash_authorization_signature for this instance's
+        credentials, but faster.
+        """
+        # The signed string is:
+        #   METHOD PATH, Date, CID, UID, Nonce, api_key
+        # separated by CRLF. Everything apart from the date and nonce is fixed
+        # for a given method and URL, so we hash the start once and copy the
+        # hash object for each request.
+        credentials = (self.company_id, self.user_id, self.api_key)
+        cache = self._signing_cache
+        if cache is None or cache[0] != credentials:
+            cache = (credentials,
+                     ("\r\nX-SuT-CID: %s\r\nX-SuT-UID: %s\r\nX-SuT-Nonce: " %
+                      (self.company_id, self.user_id)).encode('utf-8'),
+                     ("\r\n%s" % self.api_key).encode('utf-8'),
+                     {})
+            self._signing_cache = cache
+        credentials, middle, suffix, prefix_hashes = cache
+        try:
+            prefix_hash = prefix_hashes[method, url]
+        except KeyError:
+            prefix_hash = prefix_hashes[method, url] = sha1(
+                ("%s %s\r\nDate: " % (method, url_path(url))).encode('utf-8'))
+        h = prefix_hash.copy()
+        h.update(date_string.encode('ascii') + middle + nonce.encode('ascii') +
+                 suffix)
+        return h.hexdigest()
 
     def make_authorized_request(self, handler, method, url, data=None, params=None, headers=None):
         if headers is None:
             headers = {}
         nonce = self.make_nonce()
+        date_string = http_date()
         headers['X-SuT-Nonce'] = nonce
         headers['X-SuT-CID'] = str(self.company_id)
         headers['X-SuT-UID'] = str(self.user_id)
-        date_string = format_date_time(mktime(datetime.now().timetuple()))
         headers['Date'] = date_string
-
-        signature = make_hash_authorization_signature(method, url, date_string, self.company_id, self.user_id, nonce, self.api_key)
+        signature = self.sign(method, url, date_string, nonce)
         headers['Authorization'] = 'SuTHash signature="%s"' % signature
         return handler(method, url, data=data, params=params, headers=headers)
 
@@ -136,20 +335,33 @@ class TokenAuthorization(object):
         self.password = password
         self.initialized = False
 
-    def initialize(self, version=None):
+    def login(self, version=None, base_url=DEFAULT_BASE_URL, client=None):
+        """
+        Gets a new token, returning a (token, expiry) tuple. If 'client' is
+        given, the request is sent through it, so that its transport, timeout,
+        retries and hooks are used.
+        """
         # We have to do an unauthenticated request to initialize
-        temp_client = Client(version=version,
-                             auth=None)
-        r = temp_client.token.post(username=self.username, password=self.password)
-        self.token = r.data['token']
-        self.expiry = r.data['expiry']
+        if client is not None:
+            r = client._unauthenticated().token.post(username=self.username,
+                                                     password=self.password)
+        else:
+            with Client(version=version, auth=None,
+                        base_url=base_url) as temp_client:
+                r = temp_client.token.post(username=self.username,
+                                           password=self.password)
+        return r.data['token'], r.data['expiry']
+
+    def initialize(self, version=None, base_url=DEFAULT_BASE_URL, client=None):
+        self.token, self.expiry = self.login(version=version,
+                                             base_url=base_url, client=client)
         self.initialized = True
 
     def make_authorized_request(self, handler, method, url, data=None, params=None, headers=None):
         if headers is None:
             headers = {}
         headers['Authorization'] = "SuTToken %s" % self.token
-        return handler(method, url, params=params, headers=headers)
+        return handler(method, url, data=data, params=params, headers=headers)
 
 
 class Client(object):
@@ -165,37 +377,380 @@ class Client(object):
 
     >>> c = Client(auth=HashAuthorization(...))
     >>> c.list.get(id="mylist").data
+
+    To limit the rate of requests, and retry requests that hit the server's
+    rate limits, pass a 'rate_limiter' (see signupto.ratelimit.RateLimiter).
+    To retry failed requests, and fail fast while the API is down, pass 'retry'
+    and 'circuit_breaker' (see signupto.retry). To cache GET responses, pass
+    'cache' (see signupto.cache.ResponseCache). JSON is handled by 'codec',
+    which defaults to the fastest available library (see signupto.codec). To
+    observe requests, for example to collect metrics, pass a list of 'hooks'
+    (see signupto.instrumentation). To store large results compactly, pass a
+    'record_decoder' (see signupto.records). To share identical concurrent GET
+    requests, pass 'single_flight' (see signupto.coalesce.SingleFlight).
+    Responses are compressed if possible; pass a 'compression' to also
+    compress large request bodies, or False to turn it off (see
+    signupto.compression). To process large pages as they arrive, see
+    stream_request.
+
+    'timeout' is the default timeout for each request, in seconds, or a
+    (connect, read) pair; by default the transport's is used (see
+    signupto.transport.DEFAULT_TIMEOUT). Endpoint methods also take
+    'timeout', and a 'deadline' for the whole call, including retries and,
+    for get_all, every page (see signupto.deadline). To send a second copy
+    of slow GET requests, pass 'hedge' (see signupto.hedging.HedgePolicy).
+
+    HTTP connections are pooled and kept alive between calls. Pass a
+    'transport' (e.g. a RequestsTransport with a different pool size, or the
+    name of another backend, such as 'stdlib') to control this. A Client can
+    be shared between threads, and should be closed with close() when
+    finished with, or used as a context manager. This also closes 'auth', if
+    it has a close() method (e.g. signupto.tokens.ManagedTokenAuthorization).
     """
     extra_headers = {'Accept': 'application/json',
                      'Content-Type': 'application/json',
                      }
 
 
-    def __init__(self, version="0", auth=None):
-        if hasattr(auth, 'initialize') and not getattr(auth, 'initialized', False):
-            auth.initialize(version=version)
-        self._baseurl = 'https://api.sign-up.to/v%s/' % version
+    def __init__(self, version="0", auth=None, transport=None,
+                 base_url=DEFAULT_BASE_URL, rate_limiter=None, retry=None,
+                 circuit_breaker=None, cache=None, codec=None, hooks=None,
+                 record_decoder=None, single_flight=None, compression=None,
+                 timeout=None, hedge=None):
+        self._baseurl = '%s/v%s/' % (base_url.rstrip('/'), version)
         if auth is None:
             auth = NoAuthorization()
         self._auth = auth
+        if transport is None:
+            transport = RequestsTransport()
+        elif isinstance(transport, str):
+            transport = get_transport(transport)
+        self._transport = transport
+        self._rate_limiter = rate_limiter
+        self._retry = retry
+        self._circuit_breaker = circuit_breaker
+        self._cache = cache
+        if codec is None:
+            codec = get_codec()
+        self._codec = codec
+        self._endpoints = {}
+        self._hooks = list(hooks or [])
+        self._record_decoder = record_decoder
+        self._single_flight = single_flight
+        if compression is None:
+            compression = Compression()
+        self._compression = compression
+        self._accept_encoding = None
+        self._timeout = timeout
+        self._hedge = hedge
+        if hasattr(auth, 'initialize') and not getattr(auth, 'initialized', False):
+            auth.initialize(version=version, base_url=base_url, client=self)
+
+    def close(self):
+        self._transport.close()
+        close = getattr(self._auth, 'close', None)
+        if close is not None:
+            close()
+
+    def _unauthenticated(self):
+        # A copy of this client, sharing its transport and settings, that
+        # sends requests without authorization (for logging in).
+        client = copy.copy(self)
+        client._auth = NoAuthorization()
+        client._endpoints = {}
+        return client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def make_request_raw(self, method, url, data='', params=None, headers=None):
-        return requests.request(method, url, data=data, params=params, headers=headers)
+    def make_request_raw(self, method, url, data='', params=None, headers=None,
+                         timeout=None):
+        if timeout is None:
+            return self._transport.request(method, url, data=data,
+                                           params=params, headers=headers)
+        return self._transport.request(method, url, data=data, params=params,
+                                       headers=headers, timeout=timeout)
+
+    def make_request_streamed(self, method, url, data=None, params=None,
+                              headers=None, timeout=None):
+        """
+        Like make_request_raw, but returns successful responses before their
+        body has been read, if the transport has a stream() method.
+        """
+        stream = getattr(self._transport, 'stream', None)
+        if stream is None:
+            return self.make_request_raw(method, url, data=data, params=params,
+                                         headers=headers, timeout=timeout)
+        if timeout is None:
+            response = stream(method, url, data=data, params=params,
+                              headers=headers)
+        else:
+            response = stream(method, url, data=data, params=params,
+                              headers=headers, timeout=timeout)
+        if 200 <= response.status_code < 300:
+            response.signupto_streamed = True
+        else:
+            # Errors are small, and are handled as usual.
+            response.content
+        return response
 
-    def make_request(self, method, resource_name, data=None, params=None, headers=None):
+    def send_request(self, method, resource_name, data=None, params=None,
+                     headers=None, handler=None):
+        """
+        Builds and signs a request, and returns the result of 'handler', which
+        defaults to make_request_raw.
+        """
         url = self._baseurl + resource_name
-        if headers is None:
-            headers = {}
-        h2 = {}
-        h2.update(self.extra_headers)
-        h2.update(headers)
-        response = self._auth.make_authorized_request(self.make_request_raw,
-                                                      method,
-                                                      url,
-                                                      data=json.dumps(data),
-                                                      params=params,
-                                                      headers=h2)
-        return self.handle_response(response)
+        h2 = self.extra_headers.copy()
+        body = self._codec.dumps(data) if data is not None else None
+        compression = self._compression
+        if compression:
+            accept_encoding = self._accept_encoding
+            if accept_encoding is None:
+                # Only what the transport decodes
+                accept_encoding = compression.accept_encoding(self._transport)
+                self._accept_encoding = accept_encoding
+            h2['Accept-Encoding'] = accept_encoding
+            body = compression.compress_request(body, h2)
+        if headers:
+            h2.update(headers)
+        if handler is None:
+            handler = self.make_request_raw
+        return self._auth.make_authorized_request(handler,
+                                                  method,
+                                                  url,
+                                                  data=body,
+                                                  params=params,
+                                                  headers=h2)
+
+    def make_request(self, method, resource_name, data=None, params=None,
+                     headers=None, timeout=None, deadline=None):
+        """
+        Makes a request to an endpoint, and returns the SignuptoResponse.
+
+        'timeout' overrides the client's for this request. 'deadline' (in
+        seconds, or a signupto.deadline.Deadline) limits the time taken by
+        the call including any retries, after which DeadlineExceeded is
+        raised.
+        """
+        deadline = Deadline.coerce(deadline)
+        cache = self._cache
+        if cache is None:
+            return self._make_shared_request(method, resource_name, data,
+                                             params, headers, timeout,
+                                             deadline)
+
+        if method in CACHEABLE_METHODS:
+            key = cache.make_key(method, resource_name, params)
+            result = cache.get(key)
+            if result is MISSING:
+                generation = cache.generation(resource_name)
+                result = self._make_shared_request(method, resource_name, data,
+                                                   params, headers, timeout,
+                                                   deadline)
+                cache.set(key, result, generation=generation)
+            return result
+        else:
+            try:
+                return self._make_request(method, resource_name, data=data,
+                                          params=params, headers=headers,
+                                          timeout=timeout, deadline=deadline)
+            finally:
+                cache.invalidate(resource_name)
+
+    def _make_shared_request(self, method, resource_name, data, params,
+                             headers, timeout=None, deadline=None):
+        single_flight = self._single_flight
+        if single_flight is None or method not in single_flight.methods:
+            return self._make_request(method, resource_name, data=data,
+                                      params=params, headers=headers,
+                                      timeout=timeout, deadline=deadline)
+        key = single_flight.make_key(method, resource_name, params, headers)
+        call = functools.partial(self._make_request, method, resource_name,
+                                 data=data, params=params, headers=headers,
+                                 timeout=timeout, deadline=deadline)
+        return single_flight.call(resource_name, key, call, deadline=deadline)
+
+    def stream_request(self, method, resource_name, data=None, params=None,
+                       headers=None, timeout=None, deadline=None):
+        """
+        Like make_request, but returns a StreamingResponse as soon as the
+        response headers have arrived, whose items are parsed from the body as
+        they are iterated over, so that a large page never has to be held in
+        memory all at once.
+
+        Rate limiting, retries, the circuit breaker and hooks apply as usual,
+        but only up to the response headers - errors reading the body aren't
+        retried. Streamed responses are never cached or shared, or hedged. A
+        'timeout' or 'deadline' applies until the response headers arrive,
+        and then the read timeout applies to each read of the body.
+        """
+        return self._make_request(method, resource_name, data=data,
+                                  params=params, headers=headers, stream=True,
+                                  timeout=timeout, deadline=deadline)
+
+    def _make_request(self, method, resource_name, data=None, params=None,
+                      headers=None, stream=False, timeout=None, deadline=None):
+        hooks = self._hooks
+        if stream:
+            raw_handler = self.make_request_streamed
+        else:
+            raw_handler = self.make_request_raw
+        deadline = Deadline.coerce(deadline)
+        if timeout is None:
+            timeout = self._timeout
+
+        def send():
+            handler = raw_handler
+            request_timeout = timeout
+            if deadline is not None:
+                if request_timeout is None:
+                    request_timeout = getattr(self._transport, 'timeout', None)
+                request_timeout = deadline.limit(request_timeout)
+            if request_timeout is not None:
+                handler = functools.partial(raw_handler,
+                                            timeout=request_timeout)
+            try:
+                if hooks:
+                    return self._send_instrumented(method, resource_name, data,
+                                                   params, headers, handler)
+                return self.send_request(method, resource_name, data=data,
+                                         params=params, headers=headers,
+                                         handler=handler)
+            except IOError:
+                if deadline is not None and deadline.expired:
+                    # The timeout was cut short by the deadline.
+                    raise deadline.exceeded()
+                raise
+
+        def attempt():
+            if self._rate_limiter is None:
+                response = send()
+            else:
+                response = self._send_limited(resource_name, send, deadline)
+            if (stream and 200 <= response.status_code < 300 and
+                    method != 'HEAD'):
+                return StreamingResponse(self, response)
+            if hooks:
+                return self._handle_instrumented_response(response)
+            return self.handle_response(response)
+
+        hedge = self._hedge
+        if hedge is not None and not stream and method in hedge.methods:
+            attempt = functools.partial(hedge.call, resource_name, attempt)
+        if self._circuit_breaker is not None:
+            attempt = functools.partial(self._circuit_breaker.call,
+                                        resource_name, attempt)
+        if deadline is not None:
+            deadline.check()
+        if self._retry is not None:
+            return self._retry.call(method, attempt, deadline=deadline)
+        return attempt()
+
+    def _send_limited(self, resource_name, send, deadline):
+        kwargs = {} if deadline is None else {'deadline': deadline}
+        if not self._hooks:
+            return self._rate_limiter.call(resource_name, send, **kwargs)
+        # The rate limiter retries 429 responses, which are then never
+        # handled, so their events are finished here.
+        sent = []
+
+        def send_and_report():
+            if sent:
+                self._report_retried(sent.pop())
+            response = send()
+            sent.append(response)
+            return response
+        response = None
+        try:
+            response = self._rate_limiter.call(resource_name, send_and_report,
+                                               **kwargs)
+        finally:
+            if sent and sent[-1] is not response:
+                self._report_retried(sent.pop())
+        return response
+
+    def _report_retried(self, response):
+        event = getattr(response, 'signupto_event', None)
+        if event is None:
+            return
+        if 'total' not in event.timings:
+            event.finish()
+        for hook in self._hooks:
+            hook.after_response(event)
+
+    def _send_instrumented(self, method, resource_name, data, params, headers,
+                           raw_handler):
+        event = RequestEvent(resource_name, method)
+        for hook in self._hooks:
+            hook.before_request(event)
+
+        def handler(method, url, data=None, params=None, headers=None):
+            event.timings['sign'] = perf_counter() - event.start
+            event.url = url
+            event.request_size = len(data) if data else 0
+            return raw_handler(method, url, data=data, params=params,
+                               headers=headers)
+
+        try:
+            response = self.send_request(method, resource_name, data=data,
+                                         params=params, headers=headers,
+                                         handler=handler)
+        except Exception as e:
+            event.finish()
+            for hook in self._hooks:
+                hook.on_error(event, e)
+            raise
+        event.status_code = response.status_code
+        if not getattr(response, 'signupto_streamed', False):
+            event.response_size = len(response.content or b'')
+        event.timings.update(getattr(response, 'timings', {}))
+        if response.status_code == 429:
+            # Likely to be retried, so it ends here rather than when handled.
+            event.finish()
+        response.signupto_event = event
+        return response
+
+    def _handle_instrumented_response(self, response):
+        event = response.signupto_event
+        start = perf_counter()
+        try:
+            result = self.handle_response(response)
+        except ObjectNotFound:
+            self._finish_event(event, start)
+            for hook in self._hooks:
+                hook.after_response(event)
+            raise
+        except Exception as e:
+            self._finish_event(event, start)
+            for hook in self._hooks:
+                hook.on_error(event, e)
+            raise
+        self._finish_event(event, start)
+        for hook in self._hooks:
+            hook.after_response(event)
+        return result
+
+    def _finish_event(self, event, decode_start):
+        if event.status_code < 500:
+            event.timings['decode'] = perf_counter() - decode_start
+        event.finish()
+
+    def _finish_streamed_event(self, event, body_start, response_size,
+                               error=None):
+        # Reading and decoding a streamed body happen together, so are both
+        # counted as 'body'.
+        event.response_size = response_size
+        event.timings['body'] = perf_counter() - body_start
+        event.finish()
+        for hook in self._hooks:
+            if error is None:
+                hook.after_response(event)
+            else:
+                hook.on_error(event, error)
 
     def handle_response(self, response):
         code = response.status_code
@@ -210,6 +765,8 @@ class Client(object):
         if 400 <= response.status_code < 500:
             if response.status_code == 404:
                 error_cls = ObjectNotFound
+            elif response.status_code == 429:
+                error_cls = RateLimited
             else:
                 error_cls = ClientError
 
@@ -222,10 +779,9 @@ class Client(object):
                 return None
 
         content = response.content
-        if type(content) == bytes: # Python 3 fix
-            content = content.decode('utf-8')
-        d = json.loads(content)
-        assert "status" in d, "Server response (%s) did not contain 'status' key, aborting" % serialized_data
+        d = self._codec.loads(content)
+        assert "status" in d, ("Server response (%r) did not contain 'status' "
+                               "key, aborting" % content)
 
         status = d["status"].lower()
         if status != "ok":
@@ -235,7 +791,40 @@ class Client(object):
             raise error_cls("URL: %s %r" % (response.request.url, response_dict),
                             response_dict, response.status_code)
         r = d['response']
-        return SignuptoResponse(r['data'], r['next'], r['count'])
+        data = r['data']
+        if self._record_decoder is not None:
+            resource_name = url_path(response.request.url).rsplit('/', 1)[-1]
+            data = self._record_decoder.decode(resource_name, data)
+        return SignuptoResponse(data, r['next'], r['count'])
+
+
+class Partition(object):
+    """
+    One set of parameters in a partitioned scan (see
+    Endpoint.iter_pages_partitioned), and its progress so far.
+
+    'start' is the cursor for the next page to fetch, so resume_params() can
+    be passed to carry on from where the partition got to.
+    """
+    def __init__(self, index, params):
+        self.index = index
+        self.params = dict(params)
+        self.start = self.params.pop('start', None)
+        self.pages = 0
+        self.items = 0
+        self.resumes = 0
+        self.done = False
+        self.error = None
+
+    def resume_params(self):
+        params = dict(self.params)
+        if self.start is not None:
+            params['start'] = self.start
+        return params
+
+    def __repr__(self):
+        return "Partition(%r, pages=%d, items=%d, done=%r)" % (
+            self.params, self.pages, self.items, self.done)
 
 
 class Endpoint(object):
@@ -244,52 +833,291 @@ class Endpoint(object):
         self.client = client
         self.resource_name = resource_name
 
-    def get(self, **kwargs):
+    # Each method takes the endpoint's parameters as keyword arguments, and
+    # optionally a 'timeout' and 'deadline' (see Client.make_request).
+
+    def get(self, timeout=None, deadline=None, **kwargs):
         return self.client.make_request('GET', self.resource_name,
-                                        params=kwargs)
+                                        params=kwargs, timeout=timeout,
+                                        deadline=deadline)
 
-    def post(self, **kwargs):
+    def post(self, timeout=None, deadline=None, **kwargs):
         return self.client.make_request('POST', self.resource_name,
-                                        data=kwargs)
+                                        data=kwargs, timeout=timeout,
+                                        deadline=deadline)
 
-    def put(self, **kwargs):
+    def put(self, timeout=None, deadline=None, **kwargs):
         return self.client.make_request('PUT', self.resource_name,
-                                        data=kwargs)
+                                        data=kwargs, timeout=timeout,
+                                        deadline=deadline)
 
-    def delete(self, **kwargs):
+    def delete(self, timeout=None, deadline=None, **kwargs):
         return self.client.make_request('DELETE', self.resource_name,
-                                        params=kwargs)
+                                        params=kwargs, timeout=timeout,
+                                        deadline=deadline)
 
-    def head(self, **kwargs):
+    def head(self, timeout=None, deadline=None, **kwargs):
         return self.client.make_request('HEAD', self.resource_name,
-                                        params=kwargs)
+                                        params=kwargs, timeout=timeout,
+                                        deadline=deadline)
+
+    def stream(self, timeout=None, deadline=None, **kwargs):
+        """
+        Like get, but returns a StreamingResponse, whose items are parsed as
+        the body arrives (see Client.stream_request).
+        """
+        return self.client.stream_request('GET', self.resource_name,
+                                          params=kwargs, timeout=timeout,
+                                          deadline=deadline)
 
     # Convenience method
 
-    def get_all(self, **kwargs):
+    def iter_pages(self, prefetch=1, stream=False, timeout=None, deadline=None,
+                   **kwargs):
         """
         For requests that return lists in the 'data' attribute, and apply
-        paging, this method will repeatedly follow the 'next' attribute to build
-        up a full list, which is returned.
+        paging, this generator will repeatedly follow the 'next' attribute,
+        yielding the SignuptoResponse for each page.
 
-        404's are converted to empty lists.
+        Up to 'prefetch' pages are fetched in a background thread while the
+        caller is working on the current page. Use prefetch=0 to fetch each
+        page only when it is needed.
+
+        With stream=True, StreamingResponses are yielded instead (see
+        Client.stream_request), and 'prefetch' is ignored. Iterate over each
+        page's data before moving on to the next.
+
+        A 404 ends the iteration. A 'deadline' applies to all the pages
+        together, and 'timeout' to each request.
         """
-        retval = []
+        deadline = Deadline.coerce(deadline)
+        if stream:
+            return self._iter_pages(kwargs, stream=True, timeout=timeout,
+                                    deadline=deadline)
+        pages = self._iter_pages(kwargs, timeout=timeout, deadline=deadline)
+        return concurrency.prefetch(pages, depth=prefetch)
+
+    def _iter_pages(self, kwargs, stream=False, timeout=None, deadline=None):
         start = None
         kwargs = kwargs.copy()
         while True:
             if start is not None:
                 kwargs['start'] = start
             try:
-                response = self.get(**kwargs)
+                if stream:
+                    response = self.stream(timeout=timeout, deadline=deadline,
+                                           **kwargs)
+                    response.start = start
+                else:
+                    response = self.get(timeout=timeout, deadline=deadline,
+                                        **kwargs)
             except ObjectNotFound:
                 # No more
-                return retval
-            retval.extend(response.data)
-            if response.next is None:
-                return retval
+                return
+            except Exception as e:
+                # Allow the caller to carry on from here.
+                e.resume_start = start
+                raise
+            if stream:
+                with response:
+                    yield response
+                    next_start = response.next
+            else:
+                yield response
+                next_start = response.next
+            if next_start is None:
+                return
             else:
-                start = response.next
+                start = next_start
+
+    def iter_all(self, prefetch=1, stream=False, timeout=None, deadline=None,
+                 **kwargs):
+        """
+        Like iter_pages, but yields the individual items from each page.
+
+        With stream=True, items are yielded as each page's body is parsed, so
+        memory use stays flat however large the pages are.
+        """
+        for response in self.iter_pages(prefetch=prefetch, stream=stream,
+                                        timeout=timeout, deadline=deadline,
+                                        **kwargs):
+            for item in response.data:
+                yield item
+
+    def get_all(self, stream=False, timeout=None, deadline=None, **kwargs):
+        """
+        For requests that return lists in the 'data' attribute, and apply
+        paging, this method will repeatedly follow the 'next' attribute to build
+        up a full list, which is returned.
+
+        404's are converted to empty lists.
+
+        If a page fails, the exception raised has a 'partial_results' attribute
+        containing the items fetched so far, and a 'resume_start' attribute,
+        which can be passed as 'start' to carry on from the failed page.
+
+        With stream=True, each page is parsed as it arrives, rather than being
+        held in memory in full first (see Client.stream_request).
+
+        A 'deadline' limits the time taken to fetch every page, including
+        retries, after which DeadlineExceeded is raised, with the attributes
+        above. 'timeout' applies to each request.
+        """
+        retval = None
+        response = None
+        page_start = 0
+        try:
+            for response in self.iter_pages(prefetch=0, stream=stream,
+                                            timeout=timeout, deadline=deadline,
+                                            **kwargs):
+                if retval is None:
+                    # An empty container of the same type - usually a list,
+                    # but see signupto.records
+                    retval = [] if stream else response.data[:0]
+                page_start = len(retval)
+                retval.extend(response.data)
+        except Exception as e:
+            if retval is None:
+                retval = []
+            if (stream and response is not None and
+                    not hasattr(e, 'resume_start')):
+                # The page failed part way through - carry on from its start.
+                e.resume_start = response.start
+                del retval[page_start:]
+            e.partial_results = retval
+            raise
+        return retval if retval is not None else []
+
+    def iter_pages_partitioned(self, partitions, max_workers=10, ordered=False,
+                               progress=None, resumes=2):
+        """
+        Like iter_pages, but for several sets of parameters at once, e.g.
+        partitions=[{'list_id': 1}, {'list_id': 2}], walking up to
+        'max_workers' of them concurrently. Yields (partition, response)
+        pairs, where partition is a Partition.
+
+        If 'ordered' is True, the pages of each partition are yielded in turn,
+        in the order given. Otherwise pages are yielded as they arrive.
+
+        If 'progress' is given, it is called with the Partition after each
+        page, and when the partition is done or fails, from the worker thread.
+
+        If a page fails, the partition carries on from that page, up to
+        'resumes' times. After that the other partitions carry on, and at the
+        end the error is raised, with a 'resume_partitions' attribute, a list
+        of the parameters to carry on from for each failed partition.
+        """
+        partitions = [p if isinstance(p, Partition) else Partition(i, p)
+                      for i, p in enumerate(partitions)]
+
+        def walk(partition):
+            def pages():
+                while True:
+                    try:
+                        params = partition.resume_params()
+                        for response in self._iter_pages(params):
+                            partition.pages += 1
+                            partition.items += len(response.data)
+                            partition.start = response.next
+                            if progress is not None:
+                                progress(partition)
+                            yield response
+                        partition.done = True
+                        if progress is not None:
+                            progress(partition)
+                        return
+                    except Exception as e:
+                        if partition.resumes >= resumes:
+                            partition.error = e
+                            if progress is not None:
+                                progress(partition)
+                            raise
+                        partition.resumes += 1
+            return pages
+
+        errors = []
+
+        def on_error(index, exc_info):
+            errors.append(exc_info[1])
+
+        for index, response in concurrency.merge([walk(p) for p in partitions],
+                                                 max_workers=max_workers,
+                                                 ordered=ordered,
+                                                 on_error=on_error):
+            yield partitions[index], response
+        if errors:
+            e = errors[0]
+            e.resume_partitions = [p.resume_params() for p in partitions
+                                   if p.error is not None]
+            raise e
+
+    def iter_all_partitioned(self, partitions, **kwargs):
+        """
+        Like iter_pages_partitioned, but yields the individual items.
+        """
+        pages = self.iter_pages_partitioned(partitions, **kwargs)
+        for partition, response in pages:
+            for item in response.data:
+                yield item
+
+    def get_all_partitioned(self, partitions, max_workers=10, ordered=True,
+                            **kwargs):
+        """
+        Like get_all, but for several sets of parameters, using
+        iter_pages_partitioned (which describes the arguments). Returns a
+        single list of all the items.
+
+        If a partition fails, the exception raised has 'partial_results' and
+        'resume_partitions' attributes.
+        """
+        retval = None
+        try:
+            pages = self.iter_pages_partitioned(partitions,
+                                                max_workers=max_workers,
+                                                ordered=ordered, **kwargs)
+            for partition, response in pages:
+                if retval is None:
+                    retval = response.data[:0]
+                retval.extend(response.data)
+        except Exception as e:
+            e.partial_results = retval if retval is not None else []
+            raise
+        return retval if retval is not None else []
+
+    def get_many(self, keys, param='id', max_workers=10, **kwargs):
+        """
+        Calls 'get' once for each key in 'keys', passing the key as parameter
+        'param', along with any other keyword arguments. Up to 'max_workers'
+        requests are made at once.
+
+        Returns a list of results in the same order as 'keys'. If an individual
+        request fails with ClientError (e.g. ObjectNotFound), the exception is
+        returned in that position, rather than raised.
+        """
+        return self._call_many(self.get, keys, param, max_workers, kwargs)
+
+    def head_many(self, keys, param='id', max_workers=10, **kwargs):
+        """
+        Like get_many, but for 'head'.
+        """
+        return self._call_many(self.head, keys, param, max_workers, kwargs)
+
+    def delete_many(self, keys, param='id', max_workers=10, **kwargs):
+        """
+        Like get_many, but for 'delete'.
+        """
+        return self._call_many(self.delete, keys, param, max_workers, kwargs)
+
+    def _call_many(self, method, keys, param, max_workers, kwargs):
+        def call(key):
+            params = kwargs.copy()
+            params[param] = key
+            try:
+                return method(**params)
+            except ClientError as e:
+                return e
+        return concurrency.map_concurrently(call, keys,
+                                            max_workers=max_workers)
 
     def get_list(self, **kwargs):
         """
@@ -311,12 +1139,28 @@ class Endpoint(object):
         return "Endpoint(%r)" % self.resource_name
 
 
-for resource_name in ENDPOINTS:
-    # Add the endpoints to Client as properties
+Client.endpoint_class = Endpoint
 
-    def a_property(self, resource_name=resource_name):
-        return Endpoint(self, resource_name)
-    a_property.__name__ = resource_name
 
-    setattr(Client, resource_name, property(a_property,
-                                            doc="Access /%s endpoint" % resource_name))
+class EndpointProperty(object):
+    """
+    Provides access to an endpoint as an attribute of Client. Endpoints have
+    no state of their own, so are created once per Client.
+    """
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+        self.__doc__ = "Access /%s endpoint" % resource_name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        try:
+            return client._endpoints[self.resource_name]
+        except KeyError:
+            endpoint = client.endpoint_class(client, self.resource_name)
+            client._endpoints[self.resource_name] = endpoint
+            return endpoint
+
+
+for resource_name in ENDPOINTS:
+    setattr(Client, resource_name, EndpointProperty(resource_name))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Coalescing of identical concurrent GET and HEAD requests ("single-flight").
+
+>>> c = Client(auth=..., single_flight=SingleFlight())
+
+If several threads (or asyncio tasks) request the same endpoint with the same
+parameters while a request is already in flight, they wait for that request
+and all get its result (or its exception) instead of sending their own.
+Each caller waits only until its own deadline, and if the request fails
+because the deadline of the caller that sent it ran out, the others try
+again.
+"""
+
+import sys
+import threading
+
+from .cache import CACHEABLE_METHODS, normalize_params
+from .deadline import DeadlineExceeded
+
+
+class _Call(object):
+    __slots__ = ('event', 'finished', 'result', 'exc_info')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.finished = False  # True if func() returned or raised an Exception
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """
+    Shares in-flight GET and HEAD requests between callers. Can be used by
+    both Client and AsyncClient, and shared between several clients.
+
+    Counts are kept of the calls made ('calls'), the requests actually sent
+    ('executed') and the calls that shared another call's request
+    ('coalesced'), in total and per endpoint.
+    """
+    methods = CACHEABLE_METHODS
+
+    def __init__(self):
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.coalesced_by_endpoint = {}
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._async_in_flight = {}
+
+    def make_key(self, method, resource_name, params, headers=None):
+        return (method, resource_name, normalize_params(params),
+                normalize_params(headers))
+
+    def _count(self, resource_name, coalesced, retry=False):
+        # Called with self._lock held
+        if retry:
+            # Only count the request, if a new one is sent.
+            if not coalesced:
+                self.executed += 1
+            return
+        self.calls += 1
+        if coalesced:
+            self.coalesced += 1
+            by_endpoint = self.coalesced_by_endpoint
+            by_endpoint[resource_name] = by_endpoint.get(resource_name, 0) + 1
+        else:
+            self.executed += 1
+
+    def call(self, resource_name, key, func, deadline=None):
+        """
+        Returns the result of func(), or of the call to func() already in
+        progress for the same key. 'deadline' is the signupto.deadline.Deadline
+        for this call, or None.
+        """
+        retry = False
+        while True:
+            with self._lock:
+                call = self._in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._in_flight[key] = _Call()
+                self._count(resource_name, not leader, retry)
+            if leader:
+                break
+            if deadline is None:
+                call.event.wait()
+            elif not call.event.wait(deadline.remaining()):
+                raise deadline.exceeded()
+            if not call.finished:
+                # The leader was interrupted (e.g. by KeyboardInterrupt, or
+                # a gevent Timeout), which isn't ours to raise, so try again.
+                retry = True
+                continue
+            if call.exc_info is None:
+                return call.result
+            if not self.is_others_deadline(call.exc_info[1], deadline):
+                raise call.exc_info[1]
+            # Our deadline hasn't run out, so try again.
+            retry = True
+
+        try:
+            call.result = func()
+            call.finished = True
+        except Exception:
+            call.exc_info = sys.exc_info()
+            call.finished = True
+            raise
+        finally:
+            # Remove before waking the waiters, so that calls from now on
+            # send a new request.
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+        return call.result
+
+    @staticmethod
+    def is_others_deadline(exception, deadline):
+        """
+        Returns True if 'exception' is the DeadlineExceeded of a caller whose
+        deadline isn't 'deadline'.
+        """
+        return (isinstance(exception, DeadlineExceeded) and
+                exception.deadline is not None and
+                exception.deadline is not deadline)
+
+    def call_async(self, resource_name, key, func):
+        """
+        asyncio version of call(). 'func' returns a coroutine, and the return
+        value should be awaited.
+
+        The request runs in its own task, so cancelling one of the callers
+        doesn't cancel it for the others.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # Futures belong to a loop, so requests are only shared within one.
+        loop_key = (id(loop), key)
+        with self._lock:
+            task = self._async_in_flight.get(loop_key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(func())
+                self._async_in_flight[loop_key] = task
+
+                def done(task):
+                    with self._lock:
+                        del self._async_in_flight[loop_key]
+                    if not task.cancelled():
+                        # Mark the exception as retrieved, in case every
+                        # caller was cancelled.
+                        task.exception()
+                task.add_done_callback(done)
+            self._count(resource_name, not leader)
+        return asyncio.shield(task)
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight) + len(self._async_in_flight)
+            return {'calls': self.calls,
+                    'executed': self.executed,
+                    'coalesced': self.coalesced,
+                    'in_flight': in_flight,
+                    }
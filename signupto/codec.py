@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+JSON encoding and decoding of request and response bodies.
+
+The fastest available library is used by default - orjson, then ujson, then
+the standard library json module. The libraries are only imported when a
+codec is first asked for, so importing signupto doesn't pay for them.
+"""
+
+import json
+
+
+class StdlibCodec(object):
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, content):
+        # json.loads accepts UTF-8 bytes directly, avoiding a decoded copy.
+        return json.loads(content)
+
+
+class OrjsonCodec(object):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj)
+
+    def loads(self, content):
+        return self._orjson.loads(content)
+
+
+class UjsonCodec(object):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, content):
+        return self._ujson.loads(content)
+
+
+CODECS = [OrjsonCodec, UjsonCodec, StdlibCodec]
+
+_default_codec = None
+
+
+def available_codecs():
+    codecs = []
+    for codec_class in CODECS:
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            pass
+    return codecs
+
+
+def get_codec(name=None):
+    """
+    Returns the codec called 'name' ('orjson', 'ujson' or 'json'), or by
+    default the fastest one available. Raises ImportError if the library
+    for the named codec isn't installed.
+    """
+    global _default_codec
+    if name is not None:
+        for codec_class in CODECS:
+            if codec_class.name == name:
+                return codec_class()
+        raise ValueError("Unknown codec %r" % (name,))
+    if _default_codec is None:
+        for codec_class in CODECS:
+            try:
+                _default_codec = codec_class()
+                break
+            except ImportError:
+                pass
+    return _default_codec
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Compression of response and request bodies.
+
+Responses are compressed with gzip, or brotli or zstd if the transport can
+decode them (see Transport.content_encodings). Request bodies are only
+compressed if a 'request_threshold' is set, since the server must accept gzip
+bodies.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Encodings that every HTTP library here can decode
+BASIC_ENCODINGS = ['gzip', 'deflate']
+
+_PREFERENCE = ['zstd', 'br', 'gzip', 'deflate']
+
+
+def best_first(encodings):
+    """
+    Returns the known encodings among 'encodings', best first.
+    """
+    return [encoding for encoding in _PREFERENCE if encoding in encodings]
+
+
+def available_encodings():
+    """
+    Returns the content encodings that get_decompressor can decode, best
+    first.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.extend(BASIC_ENCODINGS)
+    return encodings
+
+
+def urllib3_encodings():
+    """
+    Returns the content encodings that urllib3 (and so requests) decodes,
+    best first. That depends on its version as well as what is installed.
+    """
+    from urllib3.util.request import ACCEPT_ENCODING
+    return best_first([encoding.strip()
+                       for encoding in ACCEPT_ENCODING.split(',')])
+
+
+def httpx_encodings():
+    """
+    Returns the content encodings that httpx decodes, best first.
+    """
+    try:
+        from httpx._decoders import SUPPORTED_DECODERS
+    except ImportError:
+        return list(BASIC_ENCODINGS)
+    return best_first(SUPPORTED_DECODERS)
+
+
+class _ZlibDecompressor(object):
+    def __init__(self, wbits):
+        self._obj = zlib.decompressobj(wbits)
+
+    def decompress(self, data):
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class _DeflateDecompressor(object):
+    # 'deflate' should be zlib wrapped, but some servers send raw deflate
+    # data, so fall back to that if the start isn't a zlib header.
+    def __init__(self):
+        self._obj = None
+        self._start = b''
+
+    def decompress(self, data):
+        if self._obj is None:
+            self._start += data
+            if len(self._start) < 2:
+                return b''
+            data, self._start = self._start, b''
+            first, second = bytearray(data[:2])
+            if first & 0x0f == 8 and (first * 256 + second) % 31 == 0:
+                self._obj = zlib.decompressobj(zlib.MAX_WBITS)
+            else:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        if self._obj is None:
+            # Fewer than 2 bytes, so not valid either way
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._obj.decompress(self._start) + self._obj.flush()
+        return self._obj.flush()
+
+
+class _BrotliDecompressor(object):
+    def __init__(self):
+        self._obj = brotli.Decompressor()
+
+    def decompress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return b''
+
+
+class _ZstdDecompressor(object):
+    def __init__(self):
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return b''
+
+
+def get_decompressor(encoding):
+    """
+    Returns an object with decompress(chunk) and flush() methods, for
+    decoding a body with the given Content-Encoding a chunk at a time, or None
+    if it isn't compressed or can't be decoded.
+    """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecompressor(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return _DeflateDecompressor()
+    if encoding == 'br' and brotli is not None:
+        return _BrotliDecompressor()
+    if encoding == 'zstd' and zstandard is not None:
+        return _ZstdDecompressor()
+    return None
+
+
+def gzip_compress(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class Compression(object):
+    """
+    Compression settings for Client.
+
+    - 'encodings' are the response encodings to ask for, defaulting to all
+      those the client's transport can decode. Ones it can't are never
+      asked for.
+    - Request bodies of at least 'request_threshold' bytes are gzipped, at
+      compression 'level'. None (the default) means never.
+    """
+    def __init__(self, encodings=None, request_threshold=None, level=6):
+        self.encodings = None if encodings is None else list(encodings)
+        self.request_threshold = request_threshold
+        self.level = level
+
+    def accept_encoding(self, transport=None):
+        """
+        Returns the Accept-Encoding header for requests sent by 'transport'.
+        Transports without a content_encodings() method are assumed to
+        decode gzip and deflate, as requests does.
+        """
+        content_encodings = getattr(transport, 'content_encodings', None)
+        if content_encodings is None:
+            decodable = BASIC_ENCODINGS
+        else:
+            decodable = content_encodings()
+        if self.encodings is None:
+            encodings = decodable
+        else:
+            encodings = [encoding for encoding in self.encodings
+                         if encoding in decodable]
+        return ', '.join(encodings) if encodings else 'identity'
+
+    def compress_request(self, body, headers):
+        """
+        Returns the body to send, compressing it and setting the
+        Content-Encoding header if it is large enough.
+        """
+        if (self.request_threshold is not None and body is not None and
+                len(body) >= self.request_threshold):
+            headers['Content-Encoding'] = 'gzip'
+            return gzip_compress(body, self.level)
+        return body
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for running API calls in background threads.
+"""
+
+import queue
+import sys
+import threading
+
+_DONE = object()
+
+
+def prefetch(iterable, depth=1):
+    """
+    Iterates over 'iterable' in a background thread, keeping up to 'depth'
+    items ready ahead of the consumer. Exceptions raised by the iterable are
+    re-raised in the consumer. If depth is 0, no thread is used.
+    """
+    if depth <= 0:
+        for item in iterable:
+            yield item
+        return
+
+    q = queue.Queue()
+    slots = threading.Semaphore(depth)
+    stop = threading.Event()
+
+    def producer():
+        iterator = iter(iterable)
+        while True:
+            # Wait for the consumer to take an item before fetching more, but
+            # give up if the consumer has gone away, so the thread can finish.
+            while not slots.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                return
+            try:
+                item = next(iterator)
+            except StopIteration:
+                q.put((None, _DONE))
+                return
+            except Exception:
+                q.put((sys.exc_info(), None))
+                return
+            q.put((None, item))
+
+    thread = threading.Thread(target=producer)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            exc_info, item = q.get()
+            slots.release()
+            if exc_info is not None:
+                raise exc_info[1]
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def map_concurrently(func, items, max_workers=10):
+    """
+    Calls func(item) for each item, using up to 'max_workers' threads, and
+    returns the results in the same order as 'items'. If any call raises an
+    exception, calls that have not yet started are cancelled and the exception
+    is re-raised.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    max_workers = min(max_workers, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        try:
+            return [f.result() for f in futures]
+        finally:
+            for f in futures:
+                f.cancel()
+
+
+def merge(funcs, max_workers=10, ordered=False, on_error=None):
+    """
+    Iterates over several iterables at once, using up to 'max_workers'
+    threads. 'funcs' is a list of functions that return the iterables, which
+    are called in the worker threads.
+
+    Yields (index, item) pairs, where index is the position in 'funcs' of the
+    function whose iterable produced the item. If 'ordered' is True, all the
+    items of the first iterable are yielded before those of the second and so
+    on (later iterables are buffered in memory meanwhile). Otherwise items are
+    yielded as they arrive.
+
+    If an iterable raises an exception, it is re-raised in the consumer, or,
+    if 'on_error' is given, on_error(index, exc_info) is called and the other
+    iterables carry on.
+    """
+    count = len(funcs)
+    if count == 0:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue() for i in range(count)]
+    else:
+        queues = [queue.Queue(maxsize=max(max_workers, 1) * 2)] * count
+
+    def put(q, entry):
+        while True:
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                if stop.is_set():
+                    return False
+
+    def run(index):
+        q = queues[index]
+        try:
+            for item in funcs[index]():
+                if stop.is_set() or not put(q, (index, None, item)):
+                    return
+        except Exception:
+            put(q, (index, sys.exc_info(), _DONE))
+            return
+        put(q, (index, None, _DONE))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, count)))
+    futures = [executor.submit(run, i) for i in range(count)]
+    try:
+        remaining = count
+        current = 0
+        while remaining:
+            index, exc_info, item = queues[current].get()
+            if item is _DONE:
+                remaining -= 1
+                if ordered:
+                    current += 1
+                if exc_info is not None:
+                    if on_error is None:
+                        raise exc_info[1]
+                    on_error(index, exc_info)
+                continue
+            yield index, item
+    finally:
+        stop.set()
+        for f in futures:
+            f.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Deadlines, which limit the total time taken by a call, across all its pages
+and retries:
+
+>>> c.subscription.get_all(list_id=1, deadline=30)
+"""
+
+import time
+
+monotonic = time.monotonic
+
+
+class DeadlineExceeded(IOError):
+    """
+    The deadline for a call ran out before it finished. 'deadline' is the
+    Deadline that ran out.
+    """
+    deadline = None
+
+
+def split_timeout(timeout):
+    """
+    Returns a timeout given as seconds, a (connect, read) pair, or None, as a
+    (connect, read) pair.
+    """
+    if timeout is None:
+        return None, None
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return connect, read
+    return timeout, timeout
+
+
+class Deadline(object):
+    """
+    A point 'seconds' from now, by which a call must have finished.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = monotonic() + seconds
+
+    @classmethod
+    def coerce(cls, deadline):
+        """
+        Returns a Deadline for 'deadline' given as seconds, or as a Deadline
+        (which is returned as is, so that it can be shared by several calls),
+        or None.
+        """
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - monotonic())
+
+    @property
+    def expired(self):
+        return monotonic() >= self.expires_at
+
+    def exceeded(self):
+        e = DeadlineExceeded("Deadline of %gs exceeded" % self.seconds)
+        e.deadline = self
+        return e
+
+    def check(self):
+        if self.expired:
+            raise self.exceeded()
+
+    def limit(self, timeout):
+        """
+        Returns 'timeout' (see split_timeout) as a (connect, read) pair, with
+        neither longer than the time remaining. Raises DeadlineExceeded if
+        there is none left.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise self.exceeded()
+        connect, read = split_timeout(timeout)
+        return (remaining if connect is None else min(connect, remaining),
+                remaining if read is None else min(read, remaining))
+
+    def __repr__(self):
+        return "Deadline(%gs, %.3fs remaining)" % (self.seconds,
+                                                   self.remaining())
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of endpoints to NDJSON or CSV files, with the signupto-export
+command, or Exporter from Python:
+
+    signupto-export --company-id 1234 --user-id 4567 --api-key ... \\
+        'subscription?list_id=1&list_id=2&list_id=3' list --gzip -d exports/
+
+Each endpoint is written to a file named after it in the output directory, a
+page at a time, so nothing is held in memory. A parameter given several
+times splits the endpoint into partitions, one per value, which are fetched
+in parallel.
+
+Progress is checkpointed to a file as the export goes. If it fails or is
+interrupted, running the same command again carries on from the checkpoint,
+truncating the output files to the point it was saved at. The checkpoint is
+removed once the export has finished.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from urllib import parse as urllib_parse
+
+from .cli import (ProgressDisplay, add_client_arguments, check_auth,
+                  make_client, print_error)
+from .client import ENDPOINTS, Partition
+from .codec import get_codec
+from .sync import to_column_value
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT_NAME = '.signupto-export.json'
+
+
+def parse_endpoint(spec):
+    """
+    Parses an endpoint given as 'name?param=value&...' into the resource name
+    and a list of parameter dictionaries, one per partition. A parameter given
+    more than once is partitioned on, e.g. 'subscription?list_id=1&list_id=2'
+    gives two partitions (several such parameters give every combination).
+    """
+    resource_name, _, query = spec.partition('?')
+    names = []
+    values = {}
+    for name, value in urllib_parse.parse_qsl(query, keep_blank_values=True):
+        if name not in values:
+            names.append(name)
+            values[name] = []
+        values[name].append(value)
+    combinations = itertools.product(*[values[name] for name in names])
+    partitions = [dict(zip(names, combination))
+                  for combination in combinations]
+    return resource_name, partitions
+
+
+class NDJSONFormat(object):
+    """
+    One JSON object per line.
+    """
+    extension = 'ndjson'
+
+    def __init__(self, codec=None):
+        if codec is None:
+            codec = get_codec()
+        self.codec = codec
+
+    def encode(self, items):
+        dumps = self.codec.dumps
+        return b''.join(dumps(item) + b'\n' for item in items)
+
+
+class CSVFormat(object):
+    """
+    CSV with a header row. The columns are 'fields', or if not given, the
+    fields of the first item - other fields are left out. Lists and
+    dictionaries are written as JSON.
+    """
+    extension = 'csv'
+
+    def __init__(self, fields=None, header_written=False):
+        self.fields = fields
+        self.header_written = header_written
+
+    def encode(self, items):
+        if not items:
+            return b''
+        if self.fields is None:
+            self.fields = list(items[0])
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        if not self.header_written:
+            writer.writerow(self.fields)
+            self.header_written = True
+        fields = self.fields
+        for item in items:
+            writer.writerow([to_column_value(item.get(field))
+                             for field in fields])
+        return out.getvalue().encode('utf-8')
+
+
+FORMATS = {
+    'ndjson': NDJSONFormat,
+    'csv': CSVFormat,
+}
+
+
+class OutputFile(object):
+    """
+    A file being exported to, starting at 'offset' - anything after that,
+    written after the last checkpoint, is truncated. With compress=True, the
+    file is gzipped, as one gzip member per checkpoint, which gzip tools read
+    as a single file.
+    """
+    def __init__(self, path, offset=0, compress=False):
+        if offset:
+            if not os.path.exists(path) or os.path.getsize(path) < offset:
+                raise ValueError("%s is shorter than when the export was "
+                                 "checkpointed" % path)
+            self._file = open(path, 'r+b')
+            self._file.seek(offset)
+            self._file.truncate()
+        else:
+            self._file = open(path, 'wb')
+        self.path = path
+        self.compress = compress
+        self._gzip = None
+
+    def write(self, data):
+        if not data:
+            return
+        if self.compress:
+            if self._gzip is None:
+                self._gzip = gzip.GzipFile(filename='', mode='wb',
+                                           fileobj=self._file, mtime=0)
+            self._gzip.write(data)
+        else:
+            self._file.write(data)
+
+    def checkpoint(self):
+        """
+        Flushes everything written so far, returning the offset to carry on
+        from.
+        """
+        if self._gzip is not None:
+            # Closing a GzipFile ends the member, but leaves fileobj open.
+            self._gzip.close()
+            self._gzip = None
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        self.checkpoint()
+        self._file.close()
+
+
+def save_json(path, obj):
+    # Written to a temporary file and renamed, so that the checkpoint is never
+    # left half written.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=1, sort_keys=True)
+    getattr(os, 'replace', os.rename)(tmp_path, path)
+
+
+class Exporter(object):
+    """
+    Exports endpoints to files in 'directory', in 'format' ('ndjson' or
+    'csv', with 'fields' as the CSV columns), gzipped if 'compress'. The
+    partitions of each endpoint are fetched by up to 'max_workers' threads.
+
+    Progress is saved to 'checkpoint_path', if given, at most every
+    'checkpoint_interval' seconds, and an existing checkpoint is carried on
+    from. 'progress', if given, is called from time to time with a
+    dictionary of statistics about the endpoint being exported.
+    """
+    def __init__(self, client, directory='.', format='ndjson', compress=False,
+                 max_workers=4, checkpoint_path=None, checkpoint_interval=1.0,
+                 fields=None, progress=None):
+        if format not in FORMATS:
+            raise ValueError("Unknown format %r, expected one of %s" %
+                             (format, ', '.join(sorted(FORMATS))))
+        self.client = client
+        self.directory = directory
+        self.format = format
+        self.compress = compress
+        self.max_workers = max_workers
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.fields = fields
+        self.progress = progress
+        self.state = None
+
+    def path(self, resource_name):
+        filename = '%s.%s%s' % (resource_name, FORMATS[self.format].extension,
+                                '.gz' if self.compress else '')
+        return os.path.join(self.directory, filename)
+
+    def new_state(self, endpoints):
+        return {'version': CHECKPOINT_VERSION,
+                'format': self.format,
+                'compress': self.compress,
+                'endpoints': [{'resource_name': resource_name,
+                               'path': self.path(resource_name),
+                               'offset': 0,
+                               'items': 0,
+                               'fields': self.fields,
+                               'header_written': False,
+                               'partitions': [{'params': params,
+                                               'start': None,
+                                               'done': False}
+                                              for params in partitions],
+                               }
+                              for resource_name, partitions in endpoints],
+                }
+
+    def load_state(self, endpoints):
+        state = self.new_state(endpoints)
+        path = self.checkpoint_path
+        if path is None or not os.path.exists(path):
+            return state
+        with open(self.checkpoint_path) as f:
+            saved = json.load(f)
+
+        def key(s):
+            return (s['version'], s['format'], s['compress'],
+                    [(e['resource_name'], e['path'],
+                      [p['params'] for p in e['partitions']])
+                     for e in s['endpoints']])
+        if key(saved) != key(state):
+            raise ValueError("Checkpoint %s is for a different export - "
+                             "remove it to start again" % self.checkpoint_path)
+        return saved
+
+    def save_state(self):
+        if self.checkpoint_path is not None:
+            save_json(self.checkpoint_path, self.state)
+
+    def export(self, endpoints):
+        """
+        Exports 'endpoints', a list of (resource_name, partitions) pairs,
+        where partitions is a list of parameter dictionaries (see
+        parse_endpoint). Returns the number of items exported for each
+        resource name.
+
+        If an endpoint fails, the checkpoint is saved and the error is
+        raised.
+        """
+        names = [resource_name for resource_name, partitions in endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError("Each endpoint can only be exported once")
+        self.state = self.load_state(endpoints)
+        for entry in self.state['endpoints']:
+            self.export_endpoint(entry)
+        path = self.checkpoint_path
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        return dict((entry['resource_name'], entry['items'])
+                    for entry in self.state['endpoints'])
+
+    def export_endpoint(self, entry):
+        partitions = entry['partitions']
+        pending = []
+        for index, partition in enumerate(partitions):
+            if not partition['done']:
+                params = dict(partition['params'])
+                if partition['start'] is not None:
+                    params['start'] = partition['start']
+                pending.append(Partition(index, params))
+        if not pending:
+            return
+
+        if self.format == 'csv':
+            output_format = CSVFormat(entry['fields'], entry['header_written'])
+        else:
+            output_format = NDJSONFormat()
+        output = OutputFile(entry['path'], entry['offset'], self.compress)
+        endpoint = getattr(self.client, entry['resource_name'])
+        stats = {'resource_name': entry['resource_name'],
+                 'path': entry['path'],
+                 'items': entry['items'],
+                 'partitions': len(partitions),
+                 'partitions_done': len(partitions) - len(pending),
+                 'items_per_sec': 0.0,
+                 'finished': False,
+                 }
+        start = last_saved = time.time()
+        session_items = 0
+
+        def checkpoint():
+            entry['offset'] = output.checkpoint()
+            entry['fields'] = getattr(output_format, 'fields', None)
+            entry['header_written'] = getattr(output_format, 'header_written',
+                                              False)
+            self.save_state()
+
+        try:
+            pages = endpoint.iter_pages_partitioned(
+                pending, max_workers=self.max_workers)
+            for partition, response in pages:
+                # Pages are written here, in one thread, so the file and the
+                # cursors in the checkpoint always match.
+                output.write(output_format.encode(response.data))
+                partition_state = partitions[partition.index]
+                partition_state['start'] = response.next
+                if response.next is None:
+                    partition_state['done'] = True
+                    stats['partitions_done'] += 1
+                entry['items'] += len(response.data)
+                session_items += len(response.data)
+
+                now = time.time()
+                if now - last_saved >= self.checkpoint_interval:
+                    checkpoint()
+                    last_saved = now
+                if self.progress is not None:
+                    stats['items'] = entry['items']
+                    elapsed = max(now - start, 1e-6)
+                    stats['items_per_sec'] = session_items / elapsed
+                    self.progress(dict(stats))
+            # Partitions that ended with a 404 are done too.
+            for partition_state in partitions:
+                partition_state['done'] = True
+        except Exception as e:
+            if hasattr(e, 'resume_partitions'):
+                # Some partitions failed, after the others had finished and
+                # all their pages had been written.
+                for partition in pending:
+                    if partition.done:
+                        partitions[partition.index]['done'] = True
+            raise
+        finally:
+            checkpoint()
+            output.close()
+
+        if self.progress is not None:
+            elapsed = max(time.time() - start, 1e-6)
+            stats.update(items=entry['items'], partitions_done=len(partitions),
+                         finished=True, items_per_sec=session_items / elapsed)
+            self.progress(stats)
+
+
+def format_progress(stats):
+    return "%s: %d items, %d/%d partitions, %.0f items/sec" % (
+        stats['resource_name'], stats['items'], stats['partitions_done'],
+        stats['partitions'], stats['items_per_sec'])
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='signupto-export',
+        description="Export sign-up.to endpoints to NDJSON or CSV files. If "
+                    "an export fails, run the same command again to carry on "
+                    "from where it got to.")
+    parser.add_argument('endpoints', nargs='+', metavar='ENDPOINT',
+                        help="An endpoint to export, with any filters as a "
+                             "query string, e.g. 'subscription?list_id=1&"
+                             "list_id=2'. A parameter given more than once "
+                             "splits the export into partitions, fetched in "
+                             "parallel.")
+    add_client_arguments(parser)
+    parser.add_argument('-d', '--output-dir', default='.',
+                        help="Directory to write files to (default: the "
+                             "current directory)")
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS),
+                        default='ndjson')
+    parser.add_argument('--fields',
+                        help="Comma separated CSV columns (default: the "
+                             "fields of the first item)")
+    parser.add_argument('--gzip', action='store_true',
+                        help="gzip the output files")
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help="Partitions to fetch at once (default: 4)")
+    parser.add_argument('--checkpoint',
+                        help="Checkpoint file (default: %s in the output "
+                             "directory)" % DEFAULT_CHECKPOINT_NAME)
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore any checkpoint, and start from the "
+                             "beginning")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="Don't show progress")
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    auth = check_auth(parser, args)
+    endpoints = [parse_endpoint(spec) for spec in args.endpoints]
+    for resource_name, partitions in endpoints:
+        if resource_name not in ENDPOINTS:
+            parser.error("unknown endpoint %r" % resource_name)
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    checkpoint_path = (args.checkpoint or
+                       os.path.join(args.output_dir, DEFAULT_CHECKPOINT_NAME))
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    fields = args.fields.split(',') if args.fields else None
+    progress = None if args.quiet else ProgressDisplay(format_progress)
+
+    try:
+        with make_client(args, auth) as client:
+            exporter = Exporter(client, directory=args.output_dir,
+                                format=args.format, compress=args.gzip,
+                                max_workers=args.workers,
+                                checkpoint_path=checkpoint_path,
+                                fields=fields, progress=progress)
+            counts = exporter.export(endpoints)
+    except (Exception, KeyboardInterrupt) as e:
+        print_error('signupto-export', e, checkpoint_path)
+        return 1
+    if not args.quiet:
+        for resource_name, partitions in endpoints:
+            print("Exported %d items to %s" %
+                  (counts[resource_name], exporter.path(resource_name)),
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Hedged GET requests, which cut tail latency:
+
+>>> c = Client(auth=..., hedge=HedgePolicy())
+
+If a GET request is taking longer than most recent requests to the same
+endpoint did (the 95th percentile, by default), a second copy is sent, and
+whichever answers first is used. Only the slowest requests are sent twice,
+so the extra load is small, and 'budget' puts a limit on it.
+"""
+
+from collections import deque
+import math
+import threading
+import time
+
+from .client import ServerError
+
+perf_counter = time.perf_counter
+
+
+class HedgePolicy(object):
+    """
+    Sends a second copy of a GET request that hasn't finished after the
+    'percentile'th percentile of the latest 'window' latencies for its
+    endpoint (but at least 'min_delay' seconds). Nothing is hedged for an
+    endpoint until 'min_samples' requests to it have finished.
+
+    No more than 'budget' (a fraction) of requests are hedged overall, and no
+    more than 'max_hedges' second copies are in flight at once. Once a
+    request has a delay, each copy runs in a thread of its own, so that the
+    caller can take whichever answers first - this doesn't limit how many
+    requests can be made at once.
+
+    Failures of one copy with one of 'exceptions' (by default, 5XX responses
+    and network errors) wait for the other copy. Any other result, including
+    a ClientError, is the answer.
+
+    Counts are kept of the requests made ('requests'), those that were
+    hedged ('hedged'), and those where the second copy answered first
+    ('wins').
+    """
+    methods = frozenset(['GET'])
+
+    def __init__(self, percentile=95, min_samples=20, window=500,
+                 min_delay=0.005, budget=0.1, max_hedges=32,
+                 exceptions=(ServerError, IOError)):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.budget = budget
+        self.max_hedges = max_hedges
+        self.exceptions = exceptions
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self._latencies = {}  # resource_name -> deque of recent latencies
+        # resource_name -> (delay, samples since it was worked out)
+        self._delays = {}
+        self._hedges_in_flight = 0
+        self._lock = threading.Lock()
+
+    def record(self, resource_name, latency):
+        with self._lock:
+            latencies = self._latencies.get(resource_name)
+            if latencies is None:
+                latencies = deque(maxlen=self.window)
+                self._latencies[resource_name] = latencies
+            latencies.append(latency)
+            delay, stale = self._delays.get(resource_name, (None, 0))
+            self._delays[resource_name] = (delay, stale + 1)
+
+    def delay(self, resource_name):
+        """
+        Returns how long to wait before hedging a request to 'resource_name',
+        or None if not enough is known about it yet.
+        """
+        with self._lock:
+            delay, stale = self._delays.get(resource_name, (None, 0))
+            if delay is not None and stale < max(1, self.window // 50):
+                return delay
+            latencies = self._latencies.get(resource_name)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+            index = int(math.ceil(self.percentile / 100.0 * len(ordered))) - 1
+            delay = max(self.min_delay,
+                        ordered[min(max(index, 0), len(ordered) - 1)])
+            self._delays[resource_name] = (delay, 0)
+            return delay
+
+    def _timed(self, resource_name, func):
+        start = perf_counter()
+        try:
+            result = func()
+        except self.exceptions:
+            # Failures don't say how long an answer takes.
+            raise
+        except Exception:
+            self.record(resource_name, perf_counter() - start)
+            raise
+        self.record(resource_name, perf_counter() - start)
+        return result
+
+    def _start(self, resource_name, func):
+        # Calls func() in a new thread, returning a Future for the result.
+        from concurrent.futures import Future
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._timed(resource_name, func))
+            except BaseException as e:
+                future.set_exception(e)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def _hedge_done(self, future):
+        with self._lock:
+            self._hedges_in_flight -= 1
+
+    def call(self, resource_name, func):
+        """
+        Returns the result of func(), calling it a second time if the first
+        call is slow.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        delay = self.delay(resource_name)
+        with self._lock:
+            self.requests += 1
+        if delay is None:
+            return self._timed(resource_name, func)
+
+        first = self._start(resource_name, func)
+        if wait([first], timeout=delay).done:
+            return first.result()
+        with self._lock:
+            if (self.hedged >= self.budget * self.requests or
+                    self._hedges_in_flight >= self.max_hedges):
+                hedge = False
+            else:
+                self.hedged += 1
+                self._hedges_in_flight += 1
+                hedge = True
+        if not hedge:
+            return first.result()
+
+        second = self._start(resource_name, func)
+        second.add_done_callback(self._hedge_done)
+        pending = set([first, second])
+        failed = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in [f for f in (first, second) if f in done]:
+                if isinstance(future.exception(), self.exceptions):
+                    if failed is None:
+                        failed = future
+                    continue
+                if future is second:
+                    with self._lock:
+                        self.wins += 1
+                # The other copy is left to finish in the background.
+                return future.result()
+        return failed.result()
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests,
+                    'hedged': self.hedged,
+                    'wins': self.wins,
+                    }
+
+    def close(self):
+        # Nothing to release - copies left running finish by themselves.
+        pass
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk import of rows from CSV or NDJSON files, with the signupto-import
+command, or Importer from Python:
+
+    signupto-import subscribers.csv --endpoint subscriber --required email
+
+Rows are read and validated as the file is read, and sent in batches to the
+``import`` endpoint. If the server doesn't support bulk imports, or rejects
+a batch, the rows are posted to the endpoint one at a time instead. Batches
+are sent by several threads at once.
+
+The outcome of every row is appended to a log file as it finishes. Running
+the same import again skips the rows that were imported, so a failed or
+interrupted import carries on where it got to, and rows that failed are
+tried again.
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from .cli import (ProgressDisplay, add_client_arguments, check_auth,
+                  describe_error, make_client, print_error)
+from .client import ENDPOINTS, ClientError, RateLimited
+
+# Status codes meaning the server has no bulk import, rather than that the
+# batch was wrong.
+BULK_UNSUPPORTED = frozenset([404, 405, 501])
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+OK = 'ok'
+INVALID = 'invalid'
+REJECTED = 'rejected'
+FAILED = 'failed'
+STATUSES = [OK, INVALID, REJECTED, FAILED]
+
+
+def open_text(path, mode='r'):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return io.open(path, mode, encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension in ('.ndjson', '.jsonl', '.json'):
+        return 'ndjson'
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    raise ValueError("Can't tell the format of %s from its name" % path)
+
+
+def read_rows(path, format=None):
+    """
+    Yields the rows of a CSV file with a header line, or of an NDJSON file,
+    as dictionaries. The format is guessed from the name if not given, and
+    files ending in .gz are decompressed.
+    """
+    if format is None:
+        format = guess_format(path)
+    with open_text(path) as f:
+        if format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        elif format == 'ndjson':
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise ValueError("%s line %d: %s" % (path, number, e))
+        else:
+            raise ValueError("Unknown format %r, expected 'csv' or 'ndjson'" %
+                             format)
+
+
+def clean_row(row):
+    """
+    Strips whitespace from string values, and leaves out empty ones.
+    """
+    cleaned = {}
+    for name, value in row.items():
+        if name is None:
+            # Extra CSV columns, without a header
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        cleaned[name.strip()] = value
+    return cleaned
+
+
+def row_key(row, scope=None):
+    """
+    Identifies a row in the outcome log, by a hash of its contents and of
+    'scope', which says where it is imported to.
+    """
+    encoded = json.dumps([scope, row], sort_keys=True, separators=(',', ':'),
+                         ensure_ascii=True)
+    return hashlib.sha1(encoded.encode('ascii')).hexdigest()
+
+
+def validate_row(row, required=()):
+    """
+    Raises ValueError if any of the 'required' fields is missing, or if the
+    row has an email address that doesn't look like one.
+    """
+    missing = [name for name in required if name not in row]
+    if missing:
+        raise ValueError("missing %s" % ', '.join(missing))
+    email = row.get('email')
+    if email is not None and not EMAIL_RE.match(str(email)):
+        raise ValueError("invalid email address %r" % email)
+
+
+class OutcomeLog(object):
+    """
+    An append-only NDJSON file recording the outcome of each row, as
+    {"row": number, "key": key, "status": status, "error": message}.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def load(self):
+        """
+        Returns the keys of the rows that were imported.
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with io.open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if entry.get('status') == OK:
+                    done.add(entry['key'])
+        return done
+
+    def write(self, outcomes):
+        if self._file is None:
+            self._file = io.open(self.path, 'a+b')
+            self._file.seek(0, os.SEEK_END)
+            if self._file.tell():
+                self._file.seek(-1, os.SEEK_END)
+                if self._file.read(1) != b'\n':
+                    self._file.write(b'\n')
+        self._file.write(b''.join(
+            json.dumps(
+                {'row': number, 'key': key, 'status': status, 'error': error},
+                sort_keys=True).encode('utf-8') + b'\n'
+            for number, key, status, error in outcomes))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BulkImport(object):
+    """
+    How batches are sent to the bulk import endpoint: as a POST to
+    'resource_name' of the rows in 'data', along with 'params', or of
+    make_payload(rows) if given.
+    """
+    def __init__(self, resource_name='import', params=None, make_payload=None):
+        self.resource_name = resource_name
+        self.params = params or {}
+        self.make_payload = make_payload
+
+    def payload(self, rows):
+        if self.make_payload is not None:
+            return self.make_payload(rows)
+        payload = dict(self.params)
+        payload['data'] = rows
+        return payload
+
+    def send(self, client, rows):
+        return client.make_request('POST', self.resource_name,
+                                   data=self.payload(rows))
+
+
+class Importer(object):
+    """
+    Imports rows to the 'resource_name' endpoint, 'batch_size' at a time,
+    with up to 'max_workers' batches in flight.
+
+    'bulk' is a BulkImport, or True for the default one, or False to only
+    post rows one at a time. 'defaults' are added to every row. Rows are
+    checked with validate_row, and then 'validate', if given, which should
+    raise ValueError for a bad row.
+
+    Outcomes are logged to 'log_path', if given, and rows that it records
+    as imported - with the same defaults, to the same endpoint - are
+    skipped. 'progress', if given, is called from time to
+    time with a dictionary of statistics.
+    """
+    def __init__(self, client, resource_name, bulk=True, batch_size=500,
+                 max_workers=4, defaults=None, required=(), validate=None,
+                 log_path=None, progress=None):
+        if bulk is True:
+            bulk = BulkImport()
+        self.client = client
+        self.resource_name = resource_name
+        self.bulk = bulk or None
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.defaults = defaults or {}
+        self.required = required
+        self.validate = validate
+        self.log = OutcomeLog(log_path) if log_path is not None else None
+        self.progress = progress
+        self._use_bulk = self.bulk is not None
+        # Where rows go, for their keys in the log
+        self._scope = [resource_name]
+        if self.bulk is not None:
+            self._scope += [self.bulk.resource_name, self.bulk.params]
+
+    def fill(self, row):
+        """
+        Returns 'row' cleaned, with the defaults added.
+        """
+        filled = dict(self.defaults)
+        filled.update(clean_row(row))
+        return filled
+
+    def check(self, row):
+        validate_row(row, self.required)
+        if self.validate is not None:
+            self.validate(row)
+
+    def prepare(self, row):
+        filled = self.fill(row)
+        self.check(filled)
+        return filled
+
+    def run(self, rows):
+        """
+        Imports 'rows', an iterable of dictionaries, and returns a dictionary
+        of statistics: the number of rows read, skipped (already imported),
+        and with each outcome ('ok', 'invalid', 'rejected' by the server,
+        or 'failed' for server and network errors), and rows_per_sec.
+
+        If interrupted, the batches being sent are finished and logged
+        before the exception is raised.
+        """
+        from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
+                                        wait)
+
+        done = self.log.load() if self.log is not None else set()
+        stats = dict((status, 0) for status in STATUSES)
+        stats.update(rows=0, skipped=0, rows_per_sec=0.0, elapsed=0.0,
+                     bulk=self._use_bulk, finished=False)
+        start = time.time()
+
+        def record(outcomes):
+            if self.log is not None:
+                self.log.write(outcomes)
+            for number, key, status, error in outcomes:
+                stats[status] += 1
+            stats['elapsed'] = time.time() - start
+            sent = stats['rows'] - stats['skipped']
+            stats['rows_per_sec'] = sent / max(stats['elapsed'], 1e-6)
+            stats['bulk'] = self._use_bulk
+            if self.progress is not None:
+                self.progress(dict(stats))
+
+        def collect(futures):
+            for future in futures:
+                record(future.result())
+
+        executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+        pending = set()
+        try:
+            batch = []
+            for number, row in enumerate(rows, 1):
+                stats['rows'] += 1
+                filled = self.fill(row)
+                key = row_key(filled, self._scope)
+                if key in done:
+                    stats['skipped'] += 1
+                    continue
+                try:
+                    self.check(filled)
+                    batch.append((number, key, filled))
+                except ValueError as e:
+                    record([(number, key, INVALID, str(e))])
+                    continue
+                if len(batch) >= self.batch_size:
+                    pending.add(executor.submit(self.send_batch, batch))
+                    batch = []
+                    # Reading stays a little ahead of sending, and no further.
+                    if len(pending) >= self.max_workers * 2:
+                        finished, pending = wait(pending,
+                                                 return_when=FIRST_COMPLETED)
+                        collect(finished)
+            if batch:
+                pending.add(executor.submit(self.send_batch, batch))
+            collect(wait(pending).done)
+            pending = set()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            collect([future for future in pending if not future.cancelled()])
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            if self.log is not None:
+                self.log.close()
+
+        stats['finished'] = True
+        if self.progress is not None:
+            self.progress(dict(stats))
+        return stats
+
+    def send_batch(self, batch):
+        """
+        Sends a batch of (number, key, row) and returns their outcomes, as
+        (number, key, status, error).
+        """
+        if self._use_bulk:
+            try:
+                self.bulk.send(self.client,
+                               [row for number, key, row in batch])
+                return [(number, key, OK, None) for number, key, row in batch]
+            except RateLimited as e:
+                return self._all(batch, FAILED, e)
+            except ClientError as e:
+                if e.status_code in BULK_UNSUPPORTED:
+                    self._use_bulk = False
+                # Otherwise some rows were rejected, and posting them one at a
+                # time finds out which.
+            except Exception as e:
+                return self._all(batch, FAILED, e)
+        return [self.send_row(number, key, row) for number, key, row in batch]
+
+    def send_row(self, number, key, row):
+        try:
+            self.client.make_request('POST', self.resource_name, data=row)
+        except RateLimited as e:
+            return (number, key, FAILED, describe_error(e))
+        except ClientError as e:
+            return (number, key, REJECTED, describe_rejection(e))
+        except Exception as e:
+            return (number, key, FAILED, describe_error(e))
+        return (number, key, OK, None)
+
+    def _all(self, batch, status, e):
+        error = describe_error(e)
+        return [(number, key, status, error) for number, key, row in batch]
+
+
+def describe_rejection(e):
+    message = (e.error_info or {}).get('message')
+    if message:
+        return "HTTP %s: %s" % (e.status_code, message)
+    return "HTTP %s" % e.status_code
+
+
+def parse_assignment(value):
+    name, sep, value = value.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError("expected NAME=VALUE, not %r" % value)
+    return name, value
+
+
+def format_progress(stats):
+    return ("%d rows: %d ok, %d skipped, %d invalid, %d rejected, "
+            "%d failed, %.0f rows/sec" % (
+                stats['rows'], stats['ok'], stats['skipped'],
+                stats['invalid'], stats['rejected'], stats['failed'],
+                stats['rows_per_sec']))
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='signupto-import',
+        description="Import rows from a CSV or NDJSON file to a sign-up.to "
+                    "endpoint. Running the same command again skips the rows "
+                    "that were imported.")
+    parser.add_argument('file', metavar='FILE',
+                        help="CSV file with a header line, or NDJSON file, "
+                             "optionally gzipped")
+    parser.add_argument('-e', '--endpoint', required=True,
+                        help="Endpoint to import to, e.g. subscriber")
+    add_client_arguments(parser)
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        help="Format of the file (default: from its name)")
+    parser.add_argument('--set', metavar='NAME=VALUE', type=parse_assignment,
+                        action='append', default=[],
+                        help="A field to add to every row, e.g. list_id=7890")
+    parser.add_argument('--required',
+                        help="Comma separated fields every row must have")
+    parser.add_argument('--no-bulk', action='store_true',
+                        help="Post rows one at a time, rather than using the "
+                             "import endpoint")
+    parser.add_argument('--import-param', metavar='NAME=VALUE',
+                        type=parse_assignment, action='append', default=[],
+                        help="A parameter to send to the import endpoint with "
+                             "each batch")
+    parser.add_argument('-b', '--batch-size', type=int, default=500,
+                        help="Rows per batch (default: 500)")
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help="Batches to send at once (default: 4)")
+    parser.add_argument('--log',
+                        help="Outcome log file (default: FILE.import-log)")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore any outcome log, and import every row")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="Don't show progress")
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    auth = check_auth(parser, args)
+    if args.endpoint not in ENDPOINTS:
+        parser.error("unknown endpoint %r" % args.endpoint)
+    if not os.path.exists(args.file):
+        parser.error("%s does not exist" % args.file)
+    log_path = args.log or args.file + '.import-log'
+    if args.restart and os.path.exists(log_path):
+        os.remove(log_path)
+    bulk = False
+    if not args.no_bulk:
+        bulk = BulkImport(params=dict(args.import_param))
+    progress = None if args.quiet else ProgressDisplay(format_progress)
+
+    try:
+        with make_client(args, auth) as client:
+            importer = Importer(
+                client, args.endpoint,
+                bulk=bulk,
+                batch_size=args.batch_size, max_workers=args.workers,
+                defaults=dict(args.set),
+                required=args.required.split(',') if args.required else (),
+                log_path=log_path,
+                progress=progress)
+            stats = importer.run(read_rows(args.file, args.format))
+    except (Exception, KeyboardInterrupt) as e:
+        print_error('signupto-import', e, log_path)
+        return 1
+    not_ok = stats['invalid'] + stats['rejected'] + stats['failed']
+    if not args.quiet or not_ok:
+        print("Imported %d rows (%d already imported), %d invalid, "
+              "%d rejected, %d failed, %.0f rows/sec" % (
+                  stats['ok'], stats['skipped'], stats['invalid'],
+                  stats['rejected'], stats['failed'], stats['rows_per_sec']),
+              file=sys.stderr)
+    if not_ok:
+        print("The outcome of each row is in %s - run the same command "
+              "again to retry the rows that weren't imported." % log_path,
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Hooks for observing the requests a Client makes, and a metrics collector that
+exports them in Prometheus text format.
+
+>>> metrics = MetricsCollector()
+>>> c = Client(auth=..., hooks=[metrics])
+>>> print(metrics.export_prometheus())
+"""
+
+import bisect
+import threading
+import time
+
+perf_counter = time.perf_counter
+
+PHASES = ('sign', 'connect', 'ttfb', 'body', 'decode')
+
+
+class RequestEvent(object):
+    """
+    Information about a single HTTP request made by a Client.
+
+    'timings' is a dictionary of times in seconds, with keys:
+
+    - 'sign' - building and signing the request.
+    - 'connect' - opening a new connection (0 if one was re-used).
+    - 'ttfb' - sending the request and waiting for the response headers.
+    - 'body' - reading the response body.
+    - 'decode' - parsing the JSON response.
+    - 'total' - the whole request.
+
+    Phases that didn't happen (e.g. because of an error), or that the
+    transport can't measure, are missing.
+    """
+    def __init__(self, resource_name, method):
+        self.resource_name = resource_name
+        self.method = method
+        self.url = None
+        self.status_code = None
+        self.request_size = 0
+        self.response_size = 0
+        self.timings = {}
+        self.start = perf_counter()
+
+    def finish(self):
+        self.timings['total'] = perf_counter() - self.start
+
+    def __repr__(self):
+        return "RequestEvent(%r, %r, status_code=%r)" % (
+            self.resource_name, self.method, self.status_code)
+
+
+class Hooks(object):
+    """
+    Base class for objects passed to Client(hooks=[...]). Subclasses override
+    the methods they need.
+    """
+    def before_request(self, event):
+        """
+        Called before each request is signed and sent.
+        """
+
+    def after_response(self, event):
+        """
+        Called after a response has been received and decoded successfully
+        (including 404 responses, which raise ObjectNotFound).
+        """
+
+    def on_error(self, event, exception):
+        """
+        Called when a request fails with an exception - network errors,
+        ServerError, and ClientError other than ObjectNotFound.
+        """
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+def _escape(value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return value.replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v))
+                             for k, v in sorted(labels.items()))
+
+
+class MetricsCollector(Hooks):
+    """
+    Collects per-endpoint request counts, error counts, bytes transferred, a
+    histogram of request latency, and the total time spent in each phase of
+    the request.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='signupto'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self.requests = {}        # (endpoint, method, status) -> count
+        self.errors = {}          # (endpoint, method, error type) -> count
+        self.latency = {}         # (endpoint, method) -> Histogram
+        self.phase_seconds = {}   # (endpoint, method, phase) -> seconds
+        self.request_bytes = {}   # (endpoint, method) -> bytes
+        self.response_bytes = {}  # (endpoint, method) -> bytes
+        self._lock = threading.Lock()
+
+    def _record(self, event, exception=None):
+        key = (event.resource_name, event.method)
+        status = event.status_code if event.status_code is not None else 'none'
+        with self._lock:
+            rkey = key + (str(status),)
+            self.requests[rkey] = self.requests.get(rkey, 0) + 1
+            if exception is not None:
+                ekey = key + (type(exception).__name__,)
+                self.errors[ekey] = self.errors.get(ekey, 0) + 1
+            if 'total' in event.timings:
+                histogram = self.latency.get(key)
+                if histogram is None:
+                    histogram = self.latency[key] = Histogram(self.buckets)
+                histogram.observe(event.timings['total'])
+            for phase in PHASES:
+                if phase in event.timings:
+                    pkey = key + (phase,)
+                    self.phase_seconds[pkey] = (
+                        self.phase_seconds.get(pkey, 0.0) +
+                        event.timings[phase])
+            self.request_bytes[key] = (self.request_bytes.get(key, 0) +
+                                       event.request_size)
+            self.response_bytes[key] = (self.response_bytes.get(key, 0) +
+                                        event.response_size)
+
+    def after_response(self, event):
+        self._record(event)
+
+    def on_error(self, event, exception):
+        self._record(event, exception)
+
+    def export_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        p = self.prefix
+        lines = []
+
+        def header(name, type_, help_):
+            lines.append('# HELP %s_%s %s' % (p, name, help_))
+            lines.append('# TYPE %s_%s %s' % (p, name, type_))
+
+        with self._lock:
+            header('requests_total', 'counter',
+                   'Requests made, by endpoint, method and status code.')
+            for key, count in sorted(self.requests.items()):
+                endpoint, method, status = key
+                lines.append('%s_requests_total%s %d' % (
+                    p, _labels(endpoint=endpoint, method=method,
+                               status=status), count))
+
+            header('errors_total', 'counter',
+                   'Requests that raised an exception, by exception type.')
+            for key, count in sorted(self.errors.items()):
+                endpoint, method, error = key
+                lines.append('%s_errors_total%s %d' % (
+                    p, _labels(endpoint=endpoint, method=method, error=error),
+                    count))
+
+            header('request_duration_seconds', 'histogram',
+                   'Total time taken by requests.')
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                for le, count in zip(list(histogram.buckets) + ['+Inf'],
+                                     histogram.cumulative_counts()):
+                    lines.append('%s_request_duration_seconds_bucket%s %d' % (
+                        p, _labels(endpoint=endpoint, method=method, le=le),
+                        count))
+                labels = _labels(endpoint=endpoint, method=method)
+                lines.append('%s_request_duration_seconds_sum%s %r' %
+                             (p, labels, histogram.sum))
+                lines.append('%s_request_duration_seconds_count%s %d' %
+                             (p, labels, histogram.count))
+
+            header('request_phase_seconds_total', 'counter',
+                   'Time spent in each phase of requests (sign, connect, '
+                   'ttfb, body, decode).')
+            for key, seconds in sorted(self.phase_seconds.items()):
+                endpoint, method, phase = key
+                lines.append('%s_request_phase_seconds_total%s %r' % (
+                    p, _labels(endpoint=endpoint, method=method, phase=phase),
+                    seconds))
+
+            for name, values, help_ in [
+                    ('request_bytes_total', self.request_bytes,
+                     'Request body bytes sent.'),
+                    ('response_bytes_total', self.response_bytes,
+                     'Response body bytes received.')]:
+                header(name, 'counter', help_)
+                for (endpoint, method), count in sorted(values.items()):
+                    labels = _labels(endpoint=endpoint, method=method)
+                    lines.append('%s_%s%s %d' % (p, name, labels, count))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Clients for many sign-up.to accounts ("tenants") at once:
+
+>>> pool = ClientPool(max_concurrency=20)
+>>> pool.add('acme', HashAuthorization(...), weight=2)
+>>> pool['acme'].list.get(id=123)
+
+Every tenant's Client shares one transport, and so one pool of connections,
+and one limit on the number of requests in flight. When requests are waiting
+for a slot, tenants take turns in proportion to their weights (weighted fair
+queuing), so one tenant's bulk job can't hold up another's interactive calls.
+"""
+
+from collections import deque
+import functools
+import heapq
+import itertools
+import threading
+import time
+
+from .client import Client
+from .transport import RequestsTransport, get_transport
+
+monotonic = time.monotonic
+
+
+class _TenantState(object):
+    def __init__(self, weight):
+        self.weight = float(weight)
+        self.finish = 0.0  # Virtual finish time of the tenant's latest request
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.wait_time = 0.0
+        self.busy_time = 0.0
+        self.completions = deque()
+
+
+class _Ticket(object):
+    __slots__ = ('state', 'event', 'granted', 'cancelled')
+
+    def __init__(self, state):
+        self.state = state
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairScheduler(object):
+    """
+    Lets up to 'max_concurrency' calls run at once, shared between tenants by
+    start-time fair queuing: each call is tagged with a virtual start time,
+    which advances by 1 / weight for each of a tenant's calls, and waiting
+    calls are let through in order of their tags. So while there is a queue,
+    a tenant with weight 2 gets twice as many turns as one with weight 1,
+    and a tenant that has been idle gets no more than its share when it
+    comes back.
+
+    Statistics are kept for each tenant; 'requests_per_sec' is over the last
+    'window' seconds.
+    """
+    def __init__(self, max_concurrency=10, window=60.0):
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self._tenants = {}
+        self._queue = []  # Heap of (start tag, sequence, ticket)
+        self._sequence = itertools.count()
+        self._running = 0
+        self._vtime = 0.0
+        self._lock = threading.Lock()
+
+    def add_tenant(self, tenant, weight=1):
+        """
+        Adds a tenant, or changes its weight.
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive, not %r" % weight)
+        with self._lock:
+            state = self._tenants.get(tenant)
+            if state is None:
+                self._tenants[tenant] = _TenantState(weight)
+            else:
+                state.weight = float(weight)
+
+    def remove_tenant(self, tenant):
+        with self._lock:
+            self._tenants.pop(tenant, None)
+
+    def _grant(self, state, start):
+        # Called with self._lock held
+        self._running += 1
+        self._vtime = max(self._vtime, start)
+        state.in_flight += 1
+
+    def acquire(self, tenant, deadline=None):
+        """
+        Waits for a slot for 'tenant', returning the seconds waited. Raises
+        DeadlineExceeded if 'deadline' runs out first.
+        """
+        with self._lock:
+            state = self._tenants[tenant]
+            start = max(self._vtime, state.finish)
+            state.finish = start + 1.0 / state.weight
+            if self._running < self.max_concurrency and not self._queue:
+                self._grant(state, start)
+                return 0.0
+            ticket = _Ticket(state)
+            heapq.heappush(self._queue, (start, next(self._sequence), ticket))
+            state.queued += 1
+        queued_at = monotonic()
+        try:
+            if deadline is None:
+                ticket.event.wait()
+            elif not ticket.event.wait(deadline.remaining()):
+                raise deadline.exceeded()
+        except BaseException:
+            with self._lock:
+                if not ticket.granted:
+                    ticket.cancelled = True
+                    state.queued -= 1
+                    raise
+            self.release(tenant, 0.0)
+            raise
+        waited = monotonic() - queued_at
+        with self._lock:
+            state.wait_time += waited
+        return waited
+
+    def release(self, tenant, elapsed, error=False, throttled=False):
+        """
+        Gives back the slot of a call by 'tenant' that took 'elapsed'
+        seconds, and lets the next waiting call through.
+        """
+        now = monotonic()
+        with self._lock:
+            self._running -= 1
+            state = self._tenants.get(tenant)
+            if state is not None:
+                state.in_flight -= 1
+                state.requests += 1
+                state.errors += bool(error)
+                state.throttled += bool(throttled)
+                state.busy_time += elapsed
+                state.completions.append(now)
+                self._prune(state, now)
+            while self._queue and self._running < self.max_concurrency:
+                start, sequence, ticket = heapq.heappop(self._queue)
+                if ticket.cancelled:
+                    continue
+                ticket.granted = True
+                ticket.state.queued -= 1
+                self._grant(ticket.state, start)
+                ticket.event.set()
+
+    def _prune(self, state, now):
+        completions = state.completions
+        while completions and completions[0] < now - self.window:
+            completions.popleft()
+
+    def call(self, tenant, func, deadline=None):
+        """
+        Returns func(), called once 'tenant' has a slot. A response with a 5XX
+        status, or an exception, counts as an error.
+        """
+        self.acquire(tenant, deadline)
+        start = monotonic()
+        error = True
+        throttled = False
+        try:
+            response = func()
+            status_code = getattr(response, 'status_code', None) or 0
+            error = status_code >= 500
+            throttled = status_code == 429
+            return response
+        finally:
+            self.release(tenant, monotonic() - start, error=error,
+                         throttled=throttled)
+
+    def stats(self):
+        """
+        Returns a dictionary of statistics for each tenant.
+        """
+        now = monotonic()
+        with self._lock:
+            result = {}
+            for tenant, state in self._tenants.items():
+                self._prune(state, now)
+                result[tenant] = {'weight': state.weight,
+                                  'requests': state.requests,
+                                  'errors': state.errors,
+                                  'throttled': state.throttled,
+                                  'in_flight': state.in_flight,
+                                  'queued': state.queued,
+                                  'wait_time': state.wait_time,
+                                  'busy_time': state.busy_time,
+                                  'requests_per_sec':
+                                      len(state.completions) / self.window,
+                                  }
+            return result
+
+
+class _TenantLimiter(object):
+    # Plugs the scheduler into a tenant's Client as its rate limiter, inside
+    # the tenant's own rate limiter if it has one, so that a tenant waiting
+    # on its own limits doesn't hold a shared slot.
+    def __init__(self, scheduler, tenant, rate_limiter=None):
+        self.scheduler = scheduler
+        self.tenant = tenant
+        self.rate_limiter = rate_limiter
+
+    def call(self, resource_name, send, deadline=None):
+        scheduled = functools.partial(self.scheduler.call, self.tenant, send,
+                                      deadline)
+        if self.rate_limiter is None:
+            return scheduled()
+        if deadline is None:
+            return self.rate_limiter.call(resource_name, scheduled)
+        return self.rate_limiter.call(resource_name, scheduled,
+                                      deadline=deadline)
+
+
+class SharedTransport(object):
+    """
+    Wraps a transport shared by several clients, so that closing one of the
+    clients doesn't close it.
+    """
+    def __init__(self, transport):
+        self.transport = transport
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    def close(self):
+        pass
+
+
+class ClientPool(object):
+    """
+    A Client for each of many tenants, added with add(), and fetched with
+    pool[tenant]. The clients share 'transport' (by default a
+    RequestsTransport with a connection for each slot), and at most
+    'max_concurrency' of their requests are in flight at once, shared out
+    by a FairScheduler. The slot is held until the response headers arrive,
+    so streamed bodies are read outside it.
+
+    Any other keyword arguments are passed to every tenant's Client, e.g.
+    'retry' or 'hooks'. Caches, single-flight and rate limiters hold state
+    for an account, so can only be given to add(), for one tenant.
+
+    stats() returns statistics for each tenant. The pool should be closed
+    with close() when finished with, or used as a context manager.
+    """
+    def __init__(self, max_concurrency=10, transport=None, window=60.0,
+                 **client_kwargs):
+        for name in ('auth', 'cache', 'single_flight', 'rate_limiter'):
+            if name in client_kwargs:
+                raise ValueError(
+                    "%s can't be shared between tenants - pass it to add()" %
+                    name)
+        if transport is None:
+            transport = RequestsTransport(pool_maxsize=max_concurrency)
+        elif isinstance(transport, str):
+            transport = get_transport(transport)
+        self.transport = transport
+        self.scheduler = FairScheduler(max_concurrency=max_concurrency,
+                                       window=window)
+        self.client_kwargs = client_kwargs
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def add(self, tenant, auth, weight=1, rate_limiter=None, **kwargs):
+        """
+        Adds a tenant, with its authorization and weight, and returns its
+        Client. Keyword arguments are passed to the Client, overriding the
+        pool's.
+        """
+        client_kwargs = dict(self.client_kwargs)
+        client_kwargs.update(kwargs)
+        with self._lock:
+            if tenant in self._clients:
+                raise ValueError("Tenant %r has already been added" %
+                                 (tenant,))
+            client = Client(auth=auth,
+                            transport=SharedTransport(self.transport),
+                            rate_limiter=_TenantLimiter(
+                                self.scheduler, tenant, rate_limiter),
+                            **client_kwargs)
+            self.scheduler.add_tenant(tenant, weight)
+            self._clients[tenant] = client
+        return client
+
+    def remove(self, tenant):
+        with self._lock:
+            del self._clients[tenant]
+        self.scheduler.remove_tenant(tenant)
+
+    def set_weight(self, tenant, weight):
+        if tenant not in self._clients:
+            raise KeyError(tenant)
+        self.scheduler.add_tenant(tenant, weight)
+
+    def __getitem__(self, tenant):
+        return self._clients[tenant]
+
+    def __contains__(self, tenant):
+        return tenant in self._clients
+
+    def __len__(self):
+        return len(self._clients)
+
+    @property
+    def tenants(self):
+        return list(self._clients)
+
+    def stats(self):
+        """
+        Returns a dictionary of statistics for each tenant: the requests
+        made, how many had errors or were throttled (429), the requests in
+        flight and queued now, the total seconds spent waiting for a slot
+        and with one, and the requests per second over the last 'window'
+        seconds.
+        """
+        return self.scheduler.stats()
+
+    def close(self):
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Client side rate limiting, to avoid (and recover from) tripping the API's rate
+limits during bulk jobs.
+"""
+
+from email.utils import mktime_tz, parsedate_tz
+import threading
+import time
+
+from .deadline import DeadlineExceeded
+
+monotonic = time.monotonic
+
+
+def parse_retry_after(value):
+    """
+    Returns the number of seconds indicated by a Retry-After header value,
+    which can be a number of seconds or an HTTP date, or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """
+    Allows 'rate' calls per second on average, with bursts of up to 'burst'
+    calls.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token, returning the number of seconds the caller must wait
+        before using it.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def cancel(self):
+        """
+        Gives back a token taken by reserve() that won't be used.
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def acquire(self, deadline=None):
+        """
+        Waits for a token. Raises DeadlineExceeded straight away if the wait
+        would take it past 'deadline'.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            if deadline is not None and wait > deadline.remaining():
+                self.cancel()
+                raise deadline.exceeded()
+            time.sleep(wait)
+
+
+class AdaptiveLimit(object):
+    """
+    Limits the number of calls in progress at once. The limit is adjusted with
+    additive increase / multiplicative decrease - it grows by roughly one for
+    each 'limit' successful calls, and is multiplied by 'decrease' when the
+    server says we are going too fast. Calls that fail with an exception
+    leave it as it is.
+
+    acquire() returns a window number, to pass to release(). Calls started
+    before the last decrease don't decrease it again, so a burst of
+    throttled calls that were in flight together only halves it once.
+    """
+    def __init__(self, initial=4, minimum=1, maximum=32, decrease=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.window = 0  # Incremented by each decrease
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline=None):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    raise deadline.exceeded()
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return self.window
+
+    def release(self, throttled=False, failed=False, window=None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                if window is None or window == self.window:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.window += 1
+            elif not failed:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class RateLimiter(object):
+    """
+    Schedules requests made by a Client.
+
+    - 'rate' and 'burst' configure a token bucket for all requests made by the
+      client, and 'endpoint_rates' is a dictionary of {resource_name: rate} for
+      additional per-endpoint token buckets.
+
+    - The number of concurrent requests adapts between 'min_concurrency' and
+      'max_concurrency'.
+
+    - When the server responds with 429 Too Many Requests, all requests are
+      paused for the time given by the Retry-After header (or
+      'default_retry_after' seconds), and the request is retried, up to
+      'max_retries' times.
+
+    If a call has a deadline, DeadlineExceeded is raised as soon as it is
+    clear that waiting for any of these would take it past the deadline.
+    """
+    def __init__(self, rate=None, burst=None, endpoint_rates=None,
+                 initial_concurrency=4, min_concurrency=1, max_concurrency=32,
+                 max_retries=5, default_retry_after=1.0):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        endpoint_rates = endpoint_rates or {}
+        self.endpoint_buckets = dict((name, TokenBucket(r))
+                                     for name, r in endpoint_rates.items())
+        self.concurrency = AdaptiveLimit(initial=initial_concurrency,
+                                         minimum=min_concurrency,
+                                         maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.default_retry_after = default_retry_after
+        self.throttled_count = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    def wait(self, resource_name, deadline=None):
+        while True:
+            remaining = self._paused_until - monotonic()
+            if remaining <= 0:
+                break
+            if deadline is not None and remaining > deadline.remaining():
+                raise deadline.exceeded()
+            time.sleep(remaining)
+        if self.bucket is not None:
+            self.bucket.acquire(deadline)
+        endpoint_bucket = self.endpoint_buckets.get(resource_name)
+        if endpoint_bucket is not None:
+            try:
+                endpoint_bucket.acquire(deadline)
+            except DeadlineExceeded:
+                if self.bucket is not None:
+                    self.bucket.cancel()
+                raise
+
+    def call(self, resource_name, send, deadline=None):
+        """
+        Calls 'send', which should make the request and return the response,
+        when the limits allow, retrying on 429 responses. 'deadline' is a
+        signupto.deadline.Deadline, or None.
+        """
+        attempt = 0
+        while True:
+            self.wait(resource_name, deadline)
+            window = self.concurrency.acquire(deadline)
+            throttled = False
+            failed = True
+            try:
+                response = send()
+                throttled = response.status_code == 429
+                failed = False
+            finally:
+                self.concurrency.release(throttled=throttled, failed=failed,
+                                         window=window)
+            if not throttled or attempt >= self.max_retries:
+                return response
+            attempt += 1
+            with self._lock:
+                self.throttled_count += 1
+            retry_after = parse_retry_after(
+                response.headers.get('Retry-After'))
+            if retry_after is None:
+                retry_after = self.default_retry_after
+            self.pause(retry_after)
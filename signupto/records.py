@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Compact representations of the items returned by list endpoints, for large
+results where a dictionary per item uses too much memory.
+
+>>> c = Client(auth=..., record_decoder=RecordDecoder(mode='columnar'))
+>>> subs = c.subscription.get_all(list_id=1234)
+>>> subs.column('subscriber_id')
+array('q', [9180894, 9186895, ...])
+>>> subs.to_dicts()
+[{'id': 36154421, 'list_id': 1234, ...}, ...]
+"""
+
+from array import array
+from sys import intern
+
+INT = 'int'
+BOOL = 'bool'
+STR = 'str'
+OBJECT = 'object'
+
+_ARRAY_TYPECODES = {INT: 'q', BOOL: 'b'}
+
+
+def _is_type(type_, value):
+    # True and False are ints too, but would come back as 1 and 0.
+    if type_ == BOOL:
+        return type(value) is bool
+    return isinstance(value, int) and type(value) is not bool
+
+
+class Schema(object):
+    """
+    The expected fields of an endpoint's items, as a list of (name, type)
+    pairs, where type is one of 'int', 'bool', 'str' (stored interned, good
+    for fields with few distinct values) or 'object'.
+
+    Fields that items have which aren't in the schema are still kept.
+    """
+    def __init__(self, resource_name, fields):
+        self.resource_name = resource_name
+        self.fields = list(fields)
+        self.field_names = [name for name, type_ in self.fields]
+        interned = [name for name, type_ in self.fields if type_ == STR]
+        self.record_class = make_record_class(resource_name, self.field_names,
+                                              interned)
+
+
+class BaseRecord(object):
+    __slots__ = ('_extra',)
+    _fields = ()
+    _field_set = frozenset()
+    _interned = ()
+
+    def __init__(self, item):
+        for name in self._fields:
+            setattr(self, name, item.get(name))
+        for name in self._interned:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, intern(value))
+        extra = None
+        for key in item:
+            if key not in self._field_set:
+                if extra is None:
+                    extra = {}
+                extra[key] = item[key]
+        self._extra = extra
+
+    def keys(self):
+        keys = list(self._fields)
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        d = dict((name, getattr(self, name)) for name in self._fields)
+        if self._extra:
+            d.update(self._extra)
+        return d
+
+    def __eq__(self, other):
+        if isinstance(other, BaseRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.to_dict())
+
+
+def make_record_class(resource_name, field_names, interned=()):
+    """
+    Creates a class with __slots__ for the given fields, whose instances behave
+    like read-only dictionaries. String values of the 'interned' fields are
+    interned.
+    """
+    name = str(resource_name[0].upper() + resource_name[1:] + 'Record')
+    return type(name, (BaseRecord,), {'__slots__': tuple(field_names),
+                                      '_fields': tuple(field_names),
+                                      '_field_set': frozenset(field_names),
+                                      '_interned': tuple(interned)})
+
+
+class ColumnarResult(object):
+    """
+    Items stored as one column per field: 'int' and 'bool' fields in typed
+    arrays, 'str' fields as lists of interned strings, others as lists. A
+    typed column becomes a list if a value doesn't fit it (such as None, or
+    an int in a 'bool' column), so that values are never converted.
+
+    Iterating yields a record object for each item. Use to_dicts() to get
+    dictionaries, or column(name) to get a single column.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.types = dict(schema.fields)
+        self.columns = dict((name, self._new_column(type_))
+                            for name, type_ in schema.fields)
+        self._length = 0
+
+    def _new_column(self, type_):
+        typecode = _ARRAY_TYPECODES.get(type_)
+        return array(typecode) if typecode else []
+
+    def append(self, item):
+        columns = self.columns
+        for key in item:
+            if key not in columns:
+                # Not in the schema - add a column, None for the items so far.
+                columns[key] = [None] * self._length
+                self.types[key] = OBJECT
+        for name, column in columns.items():
+            value = item.get(name)
+            type_ = self.types[name]
+            if type_ == STR:
+                # Anything else is stored as it is.
+                if type(value) is str:
+                    value = intern(value)
+            elif type_ in _ARRAY_TYPECODES and not _is_type(type_, value):
+                # A missing or unexpected value in a typed column - fall back
+                # to a list for this column, rather than converting it.
+                column = self._to_list(name)
+            try:
+                column.append(value)
+            except OverflowError:
+                # Too big for the array
+                column = self._to_list(name)
+                column.append(value)
+        self._length += 1
+
+    def _to_list(self, name):
+        column = self.columns[name] = list(self.columns[name])
+        if self.types[name] == BOOL:
+            column[:] = [bool(value) for value in column]
+        self.types[name] = OBJECT
+        return column
+
+    def extend(self, items):
+        if isinstance(items, ColumnarResult):
+            for name in set(items.columns) - set(self.columns):
+                self.columns[name] = [None] * self._length
+                self.types[name] = OBJECT
+            for name, column in self.columns.items():
+                other = items.columns.get(name)
+                if other is None:
+                    other = [None] * len(items)
+                same_array = (isinstance(other, array) and
+                              isinstance(column, array) and
+                              other.typecode == column.typecode)
+                if isinstance(column, array) and not same_array:
+                    column = self._to_list(name)
+                if (isinstance(other, array) and
+                        not isinstance(column, array) and
+                        items.types[name] == BOOL):
+                    other = [bool(value) for value in other]
+                column.extend(other)
+            self._length += len(items)
+        else:
+            for item in items:
+                self.append(item)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self._length
+
+    def _item(self, i):
+        d = {}
+        for name, column in self.columns.items():
+            value = column[i]
+            if self.types[name] == BOOL:
+                value = bool(value)
+            d[name] = value
+        return d
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            result = ColumnarResult(self.schema)
+            for index in range(*i.indices(self._length)):
+                result.append(self._item(index))
+            return result
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return self.schema.record_class(self._item(i))
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self.schema.record_class(self._item(i))
+
+    def to_dicts(self):
+        return [self._item(i) for i in range(self._length)]
+
+    def __repr__(self):
+        return "<ColumnarResult %s, %d items>" % (self.schema.resource_name,
+                                                  self._length)
+
+
+DEFAULT_SCHEMAS = [
+    Schema('subscription', [('id', INT),
+                            ('list_id', INT),
+                            ('subscriber_id', INT),
+                            ('cdate', INT),
+                            ('mdate', INT),
+                            ('confirmed', BOOL),
+                            ('confirmationredirect', STR),
+                            ('source', STR)]),
+]
+
+
+class RecordDecoder(object):
+    """
+    Converts lists of items returned by endpoints that have a Schema, either
+    into lists of record objects with __slots__ (mode='records'), or into a
+    ColumnarResult (mode='columnar'). Endpoints without a schema are left as
+    lists of dictionaries.
+
+    Records take about half the memory of dictionaries, and a ColumnarResult
+    about a tenth.
+    """
+    def __init__(self, schemas=DEFAULT_SCHEMAS, mode='records'):
+        if mode not in ('records', 'columnar'):
+            raise ValueError("mode must be 'records' or 'columnar'")
+        self.schemas = dict((schema.resource_name, schema)
+                            for schema in schemas)
+        self.mode = mode
+
+    def decode(self, resource_name, data):
+        schema = self.schemas.get(resource_name)
+        if schema is None or not isinstance(data, list):
+            return data
+        if self.mode == 'columnar':
+            result = ColumnarResult(schema)
+            result.extend(data)
+            return result
+        record_class = schema.record_class
+        return [record_class(item) for item in data]
+
+    def decode_item(self, resource_name, item):
+        """
+        Converts a single item, for streamed responses (see
+        Client.stream_request). Items become records in either mode.
+        """
+        schema = self.schemas.get(resource_name)
+        if schema is None or not isinstance(item, dict):
+            return item
+        return schema.record_class(item)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Retrying failed requests, and failing fast while the API is down.
+"""
+
+import random
+import threading
+import time
+
+from .client import CircuitOpen, ServerError
+from .deadline import DeadlineExceeded
+from .transport import IDEMPOTENT_METHODS
+
+monotonic = time.monotonic
+
+
+class RetryPolicy(object):
+    """
+    Retries requests that fail with one of 'exceptions' (by default, 5XX
+    responses and network errors), up to 'max_retries' times.
+
+    Before retry number N, waits a random time between 0 and
+    min(max_backoff, backoff * 2 ** N) seconds ("full jitter").
+
+    Only requests using one of 'methods' are retried - by default, just the
+    idempotent ones. If a call has a deadline, there are no retries once the
+    wait would take it past the deadline.
+    """
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30.0,
+                 methods=IDEMPOTENT_METHODS,
+                 exceptions=(ServerError, IOError)):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.methods = frozenset(m.upper() for m in methods)
+        self.exceptions = exceptions
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * (2 ** attempt)))
+
+    def should_retry(self, method, exception, attempt):
+        return (attempt < self.max_retries and
+                method in self.methods and
+                isinstance(exception, self.exceptions) and
+                not isinstance(exception, (CircuitOpen, DeadlineExceeded)))
+
+    def call(self, method, func, deadline=None):
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if not self.should_retry(method, e, attempt):
+                    raise
+                delay = self.delay(attempt)
+                if deadline is not None and delay >= deadline.remaining():
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+
+class CircuitBreaker(object):
+    """
+    Tracks failures for each endpoint. After 'failure_threshold' consecutive
+    failures, calls to that endpoint fail immediately with CircuitOpen for
+    'reset_timeout' seconds. After that a single trial call is let through - if
+    it succeeds, the endpoint is back to normal, otherwise it stays open for
+    another 'reset_timeout' seconds.
+
+    DeadlineExceeded isn't counted either way, since it says nothing about
+    the endpoint.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0,
+                 exceptions=(ServerError, IOError)):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.exceptions = exceptions
+        self._failures = {}
+        self._opened_at = {}
+        self._trial_in_progress = set()
+        self._lock = threading.Lock()
+
+    def is_open(self, resource_name):
+        return resource_name in self._opened_at
+
+    def before_call(self, resource_name):
+        """
+        Raises CircuitOpen if the call shouldn't be made. Returns True if it
+        is the trial call.
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(resource_name)
+            if opened_at is None:
+                return False
+            if (monotonic() - opened_at >= self.reset_timeout and
+                    resource_name not in self._trial_in_progress):
+                self._trial_in_progress.add(resource_name)
+                return True
+        raise CircuitOpen(
+            "Circuit open for endpoint %s after repeated failures" %
+            resource_name)
+
+    def record_success(self, resource_name):
+        with self._lock:
+            self._failures.pop(resource_name, None)
+            self._opened_at.pop(resource_name, None)
+            self._trial_in_progress.discard(resource_name)
+
+    def record_failure(self, resource_name):
+        with self._lock:
+            failures = self._failures.get(resource_name, 0) + 1
+            self._failures[resource_name] = failures
+            if (failures >= self.failure_threshold or
+                    resource_name in self._trial_in_progress):
+                self._opened_at[resource_name] = monotonic()
+            self._trial_in_progress.discard(resource_name)
+
+    def call(self, resource_name, func):
+        trial = self.before_call(resource_name)
+        try:
+            result = func()
+        except DeadlineExceeded:
+            raise
+        except self.exceptions:
+            self.record_failure(resource_name)
+            raise
+        except Exception:
+            # Not the server's fault e.g. ClientError
+            self.record_success(resource_name)
+            raise
+        else:
+            self.record_success(resource_name)
+        finally:
+            if trial:
+                # If the trial neither succeeded nor failed (it ran out of
+                # time, or was interrupted), let another call try.
+                with self._lock:
+                    self._trial_in_progress.discard(resource_name)
+        return result
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental JSON parsing, so that the items in a large response can be used
+as the body arrives, without holding all of it in memory (see
+Client.stream_request).
+
+Only the structure around the items is parsed here. The items that have
+arrived are decoded together, by the codec, whenever a chunk is read.
+"""
+
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JSONStream(object):
+    """
+    A pull parser over 'chunks', an iterable of byte strings containing UTF-8
+    JSON. Chunks are only read from 'chunks' when they are needed.
+
+    >>> s = JSONStream([b'{"a": [1, ', b'2]}'])
+    >>> [(key, list(s.elements())) for key in s.members()]
+    [('a', [1, 2])]
+
+    'loads' is used to decode the values of arrays several at a time,
+    defaulting to json.loads. Invalid or truncated JSON raises ValueError.
+    """
+    def __init__(self, chunks, loads=json.loads):
+        self._chunks = iter(chunks)
+        self._loads = loads
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._scan = json.JSONDecoder().raw_decode
+        self._buffer = ''
+        self._pos = 0
+        self._offset = 0  # of the buffer, in characters
+        self._eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        # Reads another chunk into the buffer, dropping what has been parsed.
+        # Returns False if there are no more.
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            text = self._decoder.decode(b'', True)
+        else:
+            self.bytes_read += len(chunk)
+            text = self._decoder.decode(chunk)
+        self._buffer = self._buffer[self._pos:] + text
+        self._offset += self._pos
+        self._pos = 0
+        return True
+
+    def _error(self, message):
+        return ValueError("%s at character %d of the response body" %
+                          (message, self._offset + self._pos))
+
+    def peek(self):
+        """
+        Returns the next character that isn't whitespace, without consuming
+        it, or '' at the end.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consumes and returns the next character, which must be one of 'chars'.
+        """
+        c = self.peek()
+        if not c or c not in chars:
+            raise self._error("Expected one of %r, found %r" % (chars, c))
+        self._pos += 1
+        return c
+
+    def value(self):
+        """
+        Consumes and returns the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._scan(self._buffer, self._pos)
+            except ValueError:
+                end = None
+            # A value must be followed by something, or the end, so that e.g.
+            # a number split between chunks isn't cut short.
+            if end is not None and (end < len(self._buffer) or self._eof):
+                self._pos = end
+                return value
+            # Read at least as much again before trying again, so that large
+            # values aren't re-scanned for every chunk.
+            wanted = 2 * (len(self._buffer) - self._pos)
+            filled = False
+            while len(self._buffer) - self._pos < wanted and self._fill():
+                filled = True
+            if not filled:
+                raise self._error("Invalid or truncated JSON value")
+
+    def members(self):
+        """
+        Iterates over the keys of the object that comes next. The caller must
+        consume each key's value (with value(), members() or elements())
+        before asking for the next key.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Expected an object key")
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        """
+        Iterates over the values in the array that comes next.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            for value in self._batch():
+                yield value
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+    def _batch(self):
+        # Decodes the values already in the buffer at once, up to the last
+        # comma that is between two values. If the slice ends anywhere else -
+        # inside a string, or a nested object - it isn't valid JSON, so we try
+        # an earlier comma, and give up after a few tries. In arrays of
+        # objects or arrays, only commas straight after a '}' or ']' are
+        # tried, since the others are mostly inside the last item.
+        buffer, pos = self._buffer, self._pos
+        start = _WHITESPACE.match(buffer, pos).end()
+        containers = buffer[start:start + 1] in ('{', '[')
+        end = len(buffer)
+        for tries in range(3):
+            if containers:
+                end = max(buffer.rfind('},', pos, end),
+                          buffer.rfind('],', pos, end)) + 1
+            else:
+                end = buffer.rfind(',', pos, end)
+            if end <= pos:
+                break
+            try:
+                values = self._loads('[%s]' % buffer[pos:end])
+            except ValueError:
+                continue
+            self._pos = end + 1
+            return values
+        return ()
+
+    def end(self):
+        """
+        Checks that nothing but whitespace is left.
+        """
+        if self.peek():
+            raise self._error("Extra data after JSON value")
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental sync of endpoints into a local SQLite database.
+
+>>> engine = SyncEngine(c, 'signupto.db',
+...                     [SyncTable('list'), SyncTable('subscription')])
+>>> engine.sync()
+{'list': 12, 'subscription': 3051}
+
+Each endpoint is stored in a table of the same name, with a column for each
+field (lists and dictionaries are stored as JSON). Progress is checkpointed
+after every page, in the '_signupto_sync' table, so that:
+
+- an interrupted sync carries on where it left off.
+- if the endpoint can be filtered on the modification date, with
+  'since_params', the next sync only fetches what has changed since the last
+  one. Otherwise there is no way to tell, so each sync fetches everything
+  again.
+"""
+
+import json
+import sqlite3
+import time
+
+CHECKPOINT_TABLE = '_signupto_sync'
+
+
+def quote_identifier(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+def to_column_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def to_dicts(data):
+    """
+    Returns the items in a response's data as a list of dictionaries, which
+    they may not be if the client has a record_decoder (see signupto.records).
+    """
+    if hasattr(data, 'to_dicts'):
+        return data.to_dicts()
+    if not isinstance(data, list):
+        data = [data]
+    return [item.to_dict() if hasattr(item, 'to_dict') else item
+            for item in data]
+
+
+class SyncTable(object):
+    """
+    Describes an endpoint to sync.
+
+    - 'params' are filter parameters to pass to the endpoint.
+    - 'table_name' defaults to the resource name.
+    - 'primary_key' is the field that identifies records.
+    - 'since_params', if given, is a function that takes the largest
+      modification date seen so far, and returns the parameters that filter
+      the endpoint to records modified since then.
+    - 'mdate_field' is the field containing the modification date.
+    """
+    def __init__(self, resource_name, params=None, table_name=None,
+                 primary_key='id', since_params=None, mdate_field='mdate'):
+        self.resource_name = resource_name
+        self.params = params or {}
+        self.table_name = table_name or resource_name
+        self.primary_key = primary_key
+        self.since_params = since_params
+        self.mdate_field = mdate_field
+
+
+class Checkpoint(object):
+    def __init__(self, cursor=None, max_mdate=None, since_mdate=None,
+                 complete=False):
+        self.cursor = cursor            # 'start' of the next page in a sync
+        self.max_mdate = max_mdate      # largest modification date seen
+        self.since_mdate = since_mdate  # max_mdate when the current sync began
+        self.complete = complete
+
+
+class SyncEngine(object):
+    def __init__(self, client, database, tables, prefetch=1):
+        self.client = client
+        if isinstance(database, sqlite3.Connection):
+            self.db = database
+        else:
+            self.db = sqlite3.connect(database)
+        self.tables = tables
+        self.prefetch = prefetch
+        self._columns = {}
+        self.db.execute("CREATE TABLE IF NOT EXISTS %s ("
+                        "name TEXT PRIMARY KEY, "
+                        "cursor TEXT, "
+                        "max_mdate INTEGER, "
+                        "since_mdate INTEGER, "
+                        "complete INTEGER, "
+                        "updated REAL)" % CHECKPOINT_TABLE)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def load_checkpoint(self, table):
+        row = self.db.execute("SELECT cursor, max_mdate, since_mdate, "
+                              "complete FROM %s WHERE name = ?" %
+                              CHECKPOINT_TABLE,
+                              (table.table_name,)).fetchone()
+        if row is None:
+            return Checkpoint()
+        cursor, max_mdate, since_mdate, complete = row
+        return Checkpoint(
+            cursor=json.loads(cursor) if cursor is not None else None,
+            max_mdate=max_mdate, since_mdate=since_mdate,
+            complete=bool(complete))
+
+    def save_checkpoint(self, table, checkpoint):
+        cursor = checkpoint.cursor
+        if cursor is not None:
+            cursor = json.dumps(cursor)
+        self.db.execute("INSERT OR REPLACE INTO %s "
+                        "(name, cursor, max_mdate, since_mdate, complete, "
+                        "updated) VALUES (?, ?, ?, ?, ?, ?)" %
+                        CHECKPOINT_TABLE,
+                        (table.table_name,
+                         cursor,
+                         checkpoint.max_mdate,
+                         checkpoint.since_mdate,
+                         int(checkpoint.complete),
+                         time.time()))
+
+    def ensure_columns(self, table, records):
+        columns = self._columns.get(table.table_name)
+        if columns is None:
+            self.db.execute("CREATE TABLE IF NOT EXISTS %s (%s PRIMARY KEY)" %
+                            (quote_identifier(table.table_name),
+                             quote_identifier(table.primary_key)))
+            columns = set(row[1] for row in
+                          self.db.execute("PRAGMA table_info(%s)" %
+                                          quote_identifier(table.table_name)))
+            self._columns[table.table_name] = columns
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    self.db.execute("ALTER TABLE %s ADD COLUMN %s" % (
+                        quote_identifier(table.table_name),
+                        quote_identifier(key)))
+                    columns.add(key)
+        return columns
+
+    def upsert(self, table, records):
+        records = [r for r in records if isinstance(r, dict) and
+                   table.primary_key in r]
+        if not records:
+            return 0
+        columns = sorted(self.ensure_columns(table, records))
+        sql = "INSERT OR REPLACE INTO %s (%s) VALUES (%s)" % (
+            quote_identifier(table.table_name),
+            ', '.join(quote_identifier(c) for c in columns),
+            ', '.join('?' for c in columns))
+        self.db.executemany(sql, [tuple(to_column_value(r.get(c))
+                                        for c in columns)
+                                  for r in records])
+        return len(records)
+
+    def sync_table(self, table):
+        """
+        Syncs one table, returning the number of records written.
+        """
+        checkpoint = self.load_checkpoint(table)
+        params = dict(table.params)
+        if checkpoint.complete:
+            # Starting a new sync, from the beginning. Without since_params
+            # that means fetching everything, since records anywhere may have
+            # changed.
+            checkpoint.since_mdate = checkpoint.max_mdate
+            start = None
+        else:
+            # Carrying on from an interrupted sync, with the same filters.
+            start = checkpoint.cursor
+        if (table.since_params is not None and
+                checkpoint.since_mdate is not None):
+            params.update(table.since_params(checkpoint.since_mdate))
+
+        checkpoint.complete = False
+        endpoint = getattr(self.client, table.resource_name)
+        written = 0
+        for response in endpoint.iter_pages(prefetch=self.prefetch,
+                                            start=start, **params):
+            records = to_dicts(response.data)
+            with self.db:
+                written += self.upsert(table, records)
+                mdates = [r.get(table.mdate_field) for r in records
+                          if isinstance(r, dict) and
+                          r.get(table.mdate_field) is not None]
+                if mdates:
+                    checkpoint.max_mdate = max(mdates +
+                                               [checkpoint.max_mdate or 0])
+                if response.next is None:
+                    checkpoint.complete = True
+                    checkpoint.cursor = None
+                else:
+                    checkpoint.cursor = response.next
+                self.save_checkpoint(table, checkpoint)
+
+        if not checkpoint.complete:
+            # Ended with a 404, i.e. nothing (more) to fetch.
+            with self.db:
+                checkpoint.complete = True
+                checkpoint.cursor = None
+                self.save_checkpoint(table, checkpoint)
+        return written
+
+    def sync(self, names=None):
+        """
+        Syncs all the tables, or just those named, returning a dictionary of
+        {table_name: number of records written}.
+        """
+        return dict((table.table_name, self.sync_table(table))
+                    for table in self.tables
+                    if names is None or table.table_name in names)
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the sign-up.to API, for use in tests and benchmarks.
+
+>>> with StubServer() as server:
+...     c = Client(base_url=server.url)
+...     c.list.get()
+"""
+
+from http import server as BaseHTTPServer
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from urllib import parse as urllib_parse
+import zlib
+
+from .client import make_hash_authorization_signature
+from .compression import gzip_compress
+
+
+def envelope(data, next=None, count=None):
+    if count is None:
+        count = len(data) if isinstance(data, list) else 1
+    return {'status': 'ok',
+            'response': {'data': data, 'next': next, 'count': count}}
+
+
+def error_envelope(code, message):
+    return {'status': 'error',
+            'response': {'code': code, 'subcode': None, 'message': message,
+                         'additional_information': None}}
+
+
+class StubRequest(object):
+    def __init__(self, method, path, resource_name, params, body, headers,
+                 raw_body=b'', query=''):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.resource_name = resource_name
+        self.params = params
+        self.body = body
+        self.headers = headers
+        self.raw_body = raw_body
+
+
+def echo_app(request):
+    """
+    Default application - returns the request parameters as the data.
+    """
+    if request.method in ('GET', 'HEAD', 'DELETE'):
+        data = request.params
+    else:
+        data = request.body
+    return 200, envelope(data)
+
+
+def make_subscription(i):
+    return {'id': 36154421 + i,
+            'list_id': 7890,
+            'subscriber_id': 9180894 + i,
+            'cdate': 1374769049,
+            'mdate': 1374769049 + i,
+            'confirmed': True,
+            'confirmationredirect': '',
+            'source': 'import'}
+
+
+class StubAPI(object):
+    """
+    An app for StubServer that behaves like the sign-up.to API.
+
+    GET requests return pages of 'page_size' items out of 'items' in total,
+    created with 'item_factory', following the 'start' parameter and returning
+    'next' until the last page. Asking for a page past the end gives a 404.
+    Other methods echo back the request body or parameters.
+
+    - 'credentials', if given, is a HashAuthorization whose signatures are
+      required, with a 401 returned for bad ones.
+    - 'latency' is the number of seconds to wait before responding.
+    - 'error_rate' is the proportion of requests that get a 503.
+    - 'rate_limit' is the number of requests per second allowed before
+      responding with 429 and a Retry-After header.
+    """
+    def __init__(self, items=100, page_size=25, item_factory=make_subscription,
+                 credentials=None, latency=0.0, error_rate=0.0,
+                 rate_limit=None, seed=None):
+        self.items = items
+        self.page_size = page_size
+        self.item_factory = item_factory
+        self.credentials = credentials
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self._window = (None, 0)
+        self._lock = threading.Lock()
+
+    def check_signature(self, request):
+        # HTTP/2 header names are lower case
+        headers = dict((k.lower(), v) for k, v in request.headers.items())
+        creds = self.credentials
+        if (headers.get('x-sut-cid') != str(creds.company_id) or
+                headers.get('x-sut-uid') != str(creds.user_id)):
+            return False
+        signature = make_hash_authorization_signature(
+            request.method, request.path, headers.get('date', ''),
+            creds.company_id, creds.user_id, headers.get('x-sut-nonce', ''),
+            creds.api_key)
+        expected = 'SuTHash signature="%s"' % signature
+        return headers.get('authorization') == expected
+
+    def over_rate_limit(self):
+        # Fixed one second windows.
+        with self._lock:
+            second = int(time.time())
+            window, count = self._window
+            if window != second:
+                window, count = second, 0
+            count += 1
+            self._window = (window, count)
+            return count > self.rate_limit
+
+    def __call__(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.credentials is not None and not self.check_signature(request):
+            return 401, error_envelope(401, 'Bad signature')
+        if self.rate_limit is not None and self.over_rate_limit():
+            return (429, error_envelope(429, 'Too many requests'),
+                    {'Retry-After': '1'})
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503, None
+        if request.method == 'GET':
+            start = int(request.params.get('start', 0))
+            if start >= self.items:
+                return 404, error_envelope(404, 'Not found')
+            end = min(start + self.page_size, self.items)
+            return 200, envelope(
+                [self.item_factory(i) for i in range(start, end)],
+                next=end if end < self.items else None)
+        return echo_app(request)
+
+
+def make_stub_request(method, path, headers, raw_body):
+    url = urllib_parse.urlparse(path)
+    params = dict(urllib_parse.parse_qsl(url.query))
+    body = json.loads(raw_body.decode('utf-8')) if raw_body.strip() else None
+    resource_name = url.path.rstrip('/').rsplit('/', 1)[-1]
+    return StubRequest(method, url.path, resource_name, params, body, headers,
+                       raw_body=raw_body, query=url.query)
+
+
+def run_app(app, request):
+    """
+    Calls the app, returning (status, headers, content).
+    """
+    result = app(request)
+    status, response = result[:2]
+    extra_headers = result[2] if len(result) > 2 else {}
+    content = b''
+    if response is not None:
+        content = json.dumps(response).encode('utf-8')
+    headers = [('Content-Type', 'application/json')]
+    headers.extend(extra_headers.items())
+    return status, headers, content
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_any(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        status, headers, content = self.server.stub.handle(
+            self.command, self.path, dict(self.headers.items()), raw_body,
+            self.client_address)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_any
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # Room for many clients connecting at once - with the default of 5, the
+    # rest have to retry after a second.
+    request_queue_size = 128
+
+
+class StubServer(object):
+    """
+    Runs a sign-up.to lookalike HTTP server on localhost, in a thread.
+
+    'app' is a callable that takes a StubRequest and returns a (status_code,
+    response_dict) tuple, or (status_code, response_dict, headers_dict).
+    Requests and the client addresses (i.e. connections) used are recorded on
+    the server, along with the bytes of request and response bodies
+    transferred, and the largest number of requests handled at once.
+
+    With compression=True, responses are gzipped for clients that accept it.
+    gzipped request bodies are always accepted.
+    """
+    def __init__(self, app=echo_app, host='127.0.0.1', port=0,
+                 compression=False):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.compression = compression
+        self.requests = []
+        self.connections = set()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % (self.host, self.port)
+
+    def record(self, request, client_address):
+        with self._lock:
+            self.requests.append(request)
+            self.connections.add(client_address)
+
+    def handle(self, method, path, headers, raw_body, client_address):
+        """
+        Handles a request, returning (status, headers, content).
+        """
+        lower_headers = dict((k.lower(), v) for k, v in headers.items())
+        body_size = len(raw_body)
+        if lower_headers.get('content-encoding') == 'gzip':
+            raw_body = zlib.decompress(raw_body, 16 + zlib.MAX_WBITS)
+        request = make_stub_request(method, path, headers, raw_body)
+        self.record(request, client_address)
+        with self._lock:
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            status, response_headers, content = run_app(self.app, request)
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+        if (self.compression and content and
+                'gzip' in lower_headers.get('accept-encoding', '')):
+            content = gzip_compress(content)
+            response_headers.append(('Content-Encoding', 'gzip'))
+        response_headers.append(('Content-Length', str(len(content))))
+        with self._lock:
+            self.bytes_received += body_size
+            if method != 'HEAD':
+                self.bytes_sent += len(content)
+        return status, response_headers, content
+
+    def start(self):
+        self._httpd = _ThreadingHTTPServer((self.host, self.port), StubHandler)
+        self._httpd.stub = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class H2StubHandler(socketserver.BaseRequestHandler):
+    """
+    Serves HTTP/2 without TLS ('prior knowledge'), using the h2 library. Each
+    stream is handled in its own thread, so requests on one connection run
+    concurrently.
+    """
+    def setup(self):
+        import h2.config
+        import h2.connection
+        import h2.settings
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        config = h2.config.H2Configuration(client_side=False,
+                                           header_encoding='utf-8')
+        self.conn = h2.connection.H2Connection(config=config)
+        self.lock = threading.Condition()
+        self.streams = {}
+
+    def send_pending(self):
+        # Called with self.lock held
+        data = self.conn.data_to_send()
+        if data:
+            self.request.sendall(data)
+
+    def handle(self):
+        import h2.events
+        import h2.settings
+        stub = self.server.stub
+        with self.lock:
+            self.conn.update_settings(
+                {h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS:
+                 stub.max_concurrent_streams})
+            self.conn.initiate_connection()
+            self.send_pending()
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except (IOError, OSError):
+                data = b''
+            with self.lock:
+                if not data:
+                    self.lock.notify_all()
+                    return
+                events = self.conn.receive_data(data)
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        self.streams[event.stream_id] = (dict(event.headers),
+                                                         [])
+                    elif isinstance(event, h2.events.DataReceived):
+                        self.streams[event.stream_id][1].append(event.data)
+                        self.conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        headers, body = self.streams.pop(event.stream_id)
+                        thread = threading.Thread(
+                            target=self.handle_stream,
+                            args=(event.stream_id, headers, b''.join(body)))
+                        thread.daemon = True
+                        thread.start()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        self.send_pending()
+                        self.lock.notify_all()
+                        return
+                self.lock.notify_all()  # Flow control windows may have changed
+                self.send_pending()
+
+    def handle_stream(self, stream_id, headers, raw_body):
+        stub = self.server.stub
+        method = headers.pop(':method')
+        path = headers.pop(':path')
+        for name in [':scheme', ':authority']:
+            headers.pop(name, None)
+        status, response_headers, content = stub.handle(
+            method, path, headers, raw_body, self.client_address)
+        if method == 'HEAD':
+            content = b''
+        with self.lock:
+            h2_headers = [(':status', str(status))]
+            h2_headers += [(k.lower(), v) for k, v in response_headers]
+            self.conn.send_headers(stream_id, h2_headers,
+                                   end_stream=not content)
+            self.send_pending()
+            while content:
+                window = min(self.conn.local_flow_control_window(stream_id),
+                             self.conn.max_outbound_frame_size)
+                if window <= 0:
+                    self.lock.wait(1.0)
+                    continue
+                chunk, content = content[:window], content[window:]
+                self.conn.send_data(stream_id, chunk, end_stream=not content)
+                self.send_pending()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class H2StubServer(StubServer):
+    """
+    Like StubServer, but speaks HTTP/2 (without TLS, so clients must use
+    'prior knowledge'). Requires the 'h2' library.
+    """
+    def __init__(self, app=echo_app, host='127.0.0.1', port=0,
+                 compression=False, max_concurrent_streams=100):
+        super(H2StubServer, self).__init__(app=app, host=host, port=port,
+                                           compression=compression)
+        self.max_concurrent_streams = max_concurrent_streams
+
+    def start(self):
+        self._httpd = _ThreadingTCPServer((self.host, self.port),
+                                          H2StubHandler)
+        self._httpd.stub = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Token management for long running processes: tokens are refreshed before they
+expire, and can be shared between processes through a file, so that starting
+many workers costs one login rather than one each.
+
+>>> cache = FileTokenCache('/var/tmp/signupto-token.json')
+>>> auth = ManagedTokenAuthorization(username='joe', password='my_secret',
+...                                  cache=cache)
+>>> c = Client(auth=auth)
+"""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .client import DEFAULT_BASE_URL, TokenAuthorization
+
+
+class FileTokenCache(object):
+    """
+    Stores tokens in a JSON file. A lock file next to it is used so that only
+    one process at a time can check for and refresh a token. (On platforms
+    without fcntl, there is no cross-process locking.)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def load(self, key):
+        entry = self._read().get(key)
+        if entry is None:
+            return None
+        return entry['token'], entry['expiry']
+
+    def save(self, key, token, expiry):
+        entries = self._read()
+        entries[key] = {'token': token, 'expiry': expiry}
+        # Write atomically, so readers never see a partial file.
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.signupto-token')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.chmod(tmp_path, 0o600)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class TokenManager(object):
+    """
+    Keeps a valid token for a TokenAuthorization.
+
+    The token is refreshed when it is within 'refresh_margin' seconds of
+    expiring - in a background thread, if 'background' is True, so that
+    requests never have to wait for it. If 'cache' is given (e.g. a
+    FileTokenCache), tokens are shared with other processes using the same
+    cache.
+    """
+    def __init__(self, login, key, cache=None, refresh_margin=300,
+                 background=True):
+        self.login = login
+        self.key = key
+        self.cache = cache
+        self.refresh_margin = refresh_margin
+        self.background = background
+        self.token = None
+        self.expiry = None
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def needs_refresh(self, expiry=None):
+        if expiry is None:
+            expiry = self.expiry
+        return (expiry is None or
+                float(expiry) - self.refresh_margin <= time.time())
+
+    def get_token(self):
+        if self.needs_refresh():
+            self.refresh()
+        if self.background and self._thread is None:
+            self.start()
+        return self.token
+
+    def refresh(self, force=False):
+        """
+        Gets a new token, unless another thread or process already has.
+        """
+        with self._lock:
+            if not force and not self.needs_refresh():
+                return
+            if self.cache is None:
+                self._login()
+                return
+            with self.cache.lock():
+                cached = self.cache.load(self.key)
+                if (cached is not None and
+                        not self.needs_refresh(cached[1]) and
+                        not (force and cached[0] == self.token)):
+                    self.token, self.expiry = cached
+                    return
+                self._login()
+                self.cache.save(self.key, self.token, self.expiry)
+
+    def _login(self):
+        self.token, self.expiry = self.login()
+        self.logins += 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.expiry is None:
+                wait = 1.0
+            else:
+                wait = float(self.expiry) - self.refresh_margin - time.time()
+            if wait > 0:
+                self._stop.wait(min(wait, 60))
+                continue
+            try:
+                self.refresh()
+            except Exception:
+                # Try again shortly; get_token will refresh synchronously if
+                # the token actually runs out.
+                self._stop.wait(5)
+                continue
+            if self.needs_refresh():
+                # Tokens don't last longer than refresh_margin, so refresh
+                # half way through instead.
+                self._stop.wait(max(1.0,
+                                    (float(self.expiry) - time.time()) / 2))
+
+
+class ManagedTokenAuthorization(TokenAuthorization):
+    """
+    TokenAuthorization whose token is kept fresh by a TokenManager. Takes the
+    same 'cache', 'refresh_margin' and 'background' arguments as TokenManager.
+
+    If the server rejects the token with a 401, a new token is fetched and the
+    request is tried again.
+    """
+    def __init__(self, username=None, password=None, cache=None,
+                 refresh_margin=300, background=True):
+        super(ManagedTokenAuthorization, self).__init__(username=username,
+                                                        password=password)
+        self.cache = cache
+        self.refresh_margin = refresh_margin
+        self.background = background
+        self.manager = None
+
+    def initialize(self, version=None, base_url=DEFAULT_BASE_URL, client=None):
+        key = "%s|%s|%s" % (base_url, version, self.username)
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        def login():
+            return self.login(version=version, base_url=base_url,
+                              client=client)
+
+        self.manager = TokenManager(login, key, cache=self.cache,
+                                    refresh_margin=self.refresh_margin,
+                                    background=self.background)
+        self.manager.get_token()
+        self.initialized = True
+
+    @property
+    def token(self):
+        return self.manager.get_token()
+
+    @property
+    def expiry(self):
+        return self.manager.expiry
+
+    def make_authorized_request(self, handler, method, url, data=None,
+                                params=None, headers=None):
+        if headers is None:
+            headers = {}
+        token = self.token
+        headers['Authorization'] = "SuTToken %s" % token
+        response = handler(method, url, data=data, params=params,
+                           headers=headers)
+        if getattr(response, 'status_code', None) == 401:
+            if self.manager.token == token:
+                self.manager.refresh(force=True)
+            headers['Authorization'] = "SuTToken %s" % self.token
+            response = handler(method, url, data=data, params=params,
+                               headers=headers)
+        return response
+
+    def close(self):
+        """
+        Stops the background refresh. Client.close() calls this. If the
+        authorization is used again, refreshing starts again.
+        """
+        if self.manager is not None:
+            self.manager.stop()
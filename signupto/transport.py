@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP transports used by Client to actually send requests.
+
+A transport has a request(method, url, data=None, params=None, headers=None)
+method, returning a response with 'status_code', 'headers', 'content',
+'request' (with 'method' and 'url') and 'timings' attributes, and a close()
+method. It may also have a stream() method, taking the same arguments and
+returning a StreamedResponse, whose body is read as it is iterated over, and
+a content_encodings() method, returning the Content-Encodings whose bodies it
+decodes.
+Transports that accept a 'timeout' keyword argument to these methods, like
+those here, support per-call timeouts and deadlines.
+These are provided, and import the library they use only when first needed:
+
+- 'requests' - RequestsTransport, the default.
+- 'urllib3' - Urllib3Transport, which skips the overhead of requests.
+- 'stdlib' - HTTPClientTransport, which uses http.client and needs no
+  third-party libraries.
+- 'http2' - HTTP2Transport, which uses httpx to multiplex requests over
+  HTTP/2.
+
+Client(transport=...) accepts an instance, or one of these names.
+"""
+
+import select
+import socket
+import threading
+import time
+from urllib import parse as urllib_parse
+import zlib
+
+from .compression import (available_encodings, get_decompressor,
+                          httpx_encodings, urllib3_encodings)
+from .deadline import split_timeout
+
+perf_counter = time.perf_counter
+
+# (connect, read) timeouts in seconds. The read timeout is for each read from
+# the socket, not for the whole response.
+DEFAULT_TIMEOUT = (10.0, 60.0)
+
+# Methods whose requests can safely be sent more than once.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE'])
+
+# Time spent connecting during the current request, per thread.
+_connect_timer = threading.local()
+
+
+class TransportError(IOError):
+    """
+    A network or protocol error from a transport other than
+    RequestsTransport (which raises requests' own exceptions, also IOError
+    subclasses).
+    """
+
+
+class Request(object):
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+
+
+class Response(object):
+    """
+    The response returned by Urllib3Transport and HTTPClientTransport, with
+    the attributes of requests.Response that Client uses.
+    """
+    def __init__(self, status_code, headers, content, request, timings):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.request = request
+        self.url = request.url
+        self.timings = timings
+
+    def __repr__(self):
+        return "<Response [%s]>" % self.status_code
+
+
+class StreamedResponse(object):
+    """
+    A response whose body hasn't been read yet, returned by the stream()
+    method of transports. iter_content() yields the body, decompressed, a
+    chunk at a time. The connection is released once all of it has been
+    read, or when close() is called.
+    """
+    def __init__(self, status_code, headers, request, timings, chunks, close):
+        self.status_code = status_code
+        self.headers = headers
+        self.request = request
+        self.url = request.url
+        self.timings = timings
+        self._chunks = chunks
+        self._close = close
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self.iter_content())
+        return self._content
+
+    def iter_content(self):
+        try:
+            for chunk in self._chunks:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        close, self._close = self._close, None
+        if close is not None:
+            close()
+
+    def __repr__(self):
+        return "<StreamedResponse [%s]>" % self.status_code
+
+
+def encode_params(params):
+    """
+    Encodes query parameters as requests does - list values are repeated,
+    None values are left out.
+    """
+    if not params:
+        return ''
+    pairs = []
+    for key, values in params.items():
+        if isinstance(values, (list, tuple)):
+            pairs.extend((key, v) for v in values if v is not None)
+        elif values is not None:
+            pairs.append((key, values))
+    return urllib_parse.urlencode(pairs)
+
+
+def add_params(url, params):
+    query = encode_params(params)
+    if not query:
+        return url
+    return url + ('&' if '?' in url else '?') + query
+
+
+_timed_pool_classes = None
+
+
+def timed_pool_classes():
+    """
+    Returns urllib3 connection pool classes, by scheme, that record the time
+    spent making new connections.
+    """
+    global _timed_pool_classes
+    if _timed_pool_classes is not None:
+        return _timed_pool_classes
+
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TimedHTTPConnection(HTTPConnection):
+        def connect(self):
+            start = perf_counter()
+            try:
+                super(TimedHTTPConnection, self).connect()
+            finally:
+                elapsed = getattr(_connect_timer, 'elapsed', 0.0)
+                _connect_timer.elapsed = elapsed + perf_counter() - start
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            start = perf_counter()
+            try:
+                super(TimedHTTPSConnection, self).connect()
+            finally:
+                elapsed = getattr(_connect_timer, 'elapsed', 0.0)
+                _connect_timer.elapsed = elapsed + perf_counter() - start
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    _timed_pool_classes = {'http': TimedHTTPConnectionPool,
+                           'https': TimedHTTPSConnectionPool}
+    return _timed_pool_classes
+
+
+class RequestsTransport(object):
+    """
+    Sends requests using a persistent ``requests.Session``, so that TCP/TLS
+    connections are kept alive and re-used between API calls.
+
+    ``pool_connections`` is the number of per-host connection pools to cache,
+    ``pool_maxsize`` is the maximum number of connections kept open to a single
+    host, and if ``pool_block`` is True, no more than ``pool_maxsize``
+    connections will be opened to a host at once - callers will wait for a free
+    connection instead.
+
+    'timeout' is the default timeout for each request, in seconds, or a
+    (connect, read) pair (see DEFAULT_TIMEOUT), or None to wait forever.
+
+    A single instance can be shared between threads.
+
+    Responses have a 'timings' attribute, a dictionary containing the time in
+    seconds spent on:
+
+    - 'connect' - opening a new connection (TCP and TLS), or 0 if an existing
+      connection was re-used.
+    - 'ttfb' - sending the request and waiting for the response headers.
+    - 'body' - reading the response body.
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=DEFAULT_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    def make_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from http import cookiejar as http_cookiejar
+
+        class TimedHTTPAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+                self.poolmanager.pool_classes_by_scheme = timed_pool_classes()
+
+        session = requests.Session()
+        # The API doesn't use cookies, and a shared cookie jar is the only part
+        # of Session that isn't safe to use from several threads.
+        session.cookies.set_policy(
+            http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = TimedHTTPAdapter(pool_connections=self.pool_connections,
+                                   pool_maxsize=self.pool_maxsize,
+                                   pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self):
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self.make_session()
+                session = self._session
+        return session
+
+    def request(self, method, url, data=None, params=None, headers=None,
+                timeout=None):
+        _connect_timer.elapsed = 0.0
+        start = perf_counter()
+        response = self.session.request(method, url, data=data, params=params,
+                                        headers=headers, stream=True,
+                                        timeout=self._timeout(timeout))
+        headers_received = perf_counter()
+        response.content  # Reads the body, and releases the connection
+        connect = _connect_timer.elapsed
+        response.timings = {'connect': connect,
+                            'ttfb': headers_received - start - connect,
+                            'body': perf_counter() - headers_received,
+                            }
+        return response
+
+    def stream(self, method, url, data=None, params=None, headers=None,
+               chunk_size=65536, timeout=None):
+        _connect_timer.elapsed = 0.0
+        start = perf_counter()
+        response = self.session.request(method, url, data=data, params=params,
+                                        headers=headers, stream=True,
+                                        timeout=self._timeout(timeout))
+        connect = _connect_timer.elapsed
+        return StreamedResponse(response.status_code, response.headers,
+                                response.request,
+                                {'connect': connect,
+                                 'ttfb': perf_counter() - start - connect,
+                                 },
+                                response.iter_content(chunk_size),
+                                response.close)
+
+    def _timeout(self, timeout):
+        return split_timeout(self.timeout if timeout is None else timeout)
+
+    def content_encodings(self):
+        # requests leaves decoding to urllib3
+        return urllib3_encodings()
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+class Urllib3Transport(object):
+    """
+    Sends requests using a ``urllib3.PoolManager`` directly. Takes the same
+    arguments as RequestsTransport, and keeps connections alive in the same
+    way, but avoids the per-request work that requests does on top of urllib3.
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=DEFAULT_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._pool_manager = None
+        self._lock = threading.Lock()
+
+    def make_pool_manager(self):
+        import urllib3
+        pool_manager = urllib3.PoolManager(num_pools=self.pool_connections,
+                                           maxsize=self.pool_maxsize,
+                                           block=self.pool_block,
+                                           retries=False)
+        pool_manager.pool_classes_by_scheme = timed_pool_classes()
+        return pool_manager
+
+    @property
+    def pool_manager(self):
+        pool_manager = self._pool_manager
+        if pool_manager is None:
+            with self._lock:
+                if self._pool_manager is None:
+                    self._pool_manager = self.make_pool_manager()
+                pool_manager = self._pool_manager
+        return pool_manager
+
+    def _timeout(self, timeout):
+        import urllib3
+        connect, read = split_timeout(
+            self.timeout if timeout is None else timeout)
+        return urllib3.Timeout(connect=connect, read=read)
+
+    def content_encodings(self):
+        return urllib3_encodings()
+
+    def request(self, method, url, data=None, params=None, headers=None,
+                timeout=None):
+        import urllib3
+        url = add_params(url, params)
+        headers = dict(headers or {})
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+        _connect_timer.elapsed = 0.0
+        start = perf_counter()
+        try:
+            r = self.pool_manager.urlopen(method, url, body=data,
+                                          headers=headers, redirect=False,
+                                          preload_content=False,
+                                          timeout=self._timeout(timeout))
+            headers_received = perf_counter()
+            content = r.read()
+        except urllib3.exceptions.HTTPError as e:
+            raise TransportError("%s: %s" % (e.__class__.__name__, e))
+        r.release_conn()
+        connect = _connect_timer.elapsed
+        return Response(r.status, r.headers, content, Request(method, url),
+                        {'connect': connect,
+                         'ttfb': headers_received - start - connect,
+                         'body': perf_counter() - headers_received,
+                         })
+
+    def stream(self, method, url, data=None, params=None, headers=None,
+               chunk_size=65536, timeout=None):
+        import urllib3
+        url = add_params(url, params)
+        headers = dict(headers or {})
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+        _connect_timer.elapsed = 0.0
+        start = perf_counter()
+        try:
+            r = self.pool_manager.urlopen(method, url, body=data,
+                                          headers=headers, redirect=False,
+                                          preload_content=False,
+                                          timeout=self._timeout(timeout))
+        except urllib3.exceptions.HTTPError as e:
+            raise TransportError("%s: %s" % (e.__class__.__name__, e))
+        connect = _connect_timer.elapsed
+        finished = []
+
+        def chunks():
+            try:
+                for chunk in r.stream(chunk_size):
+                    yield chunk
+            except urllib3.exceptions.HTTPError as e:
+                raise TransportError("%s: %s" % (e.__class__.__name__, e))
+            finished.append(True)
+
+        def close():
+            if not finished:
+                # Part of the body is still unread, so the connection can't
+                # be re-used.
+                r.close()
+            r.release_conn()
+
+        return StreamedResponse(r.status, r.headers, Request(method, url),
+                                {'connect': connect,
+                                 'ttfb': perf_counter() - start - connect,
+                                 },
+                                chunks(), close)
+
+    def close(self):
+        with self._lock:
+            pool_manager, self._pool_manager = self._pool_manager, None
+        if pool_manager is not None:
+            pool_manager.clear()
+
+
+def _is_connection_dropped(conn):
+    # An idle keep-alive connection that is readable has been closed by the
+    # server (or has unexpected data on it), so can't be used.
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError, select.error):
+        return True
+
+
+def iter_body(response, chunk_size=65536):
+    """
+    Yields the body of an http.client response a chunk at a time,
+    decompressing it as it arrives if it has a Content-Encoding.
+    """
+    decompressor = get_decompressor(response.getheader('Content-Encoding'))
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        yield chunk
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+def read_body(response):
+    """
+    Reads the body of an http.client response, decompressing it if it has a
+    Content-Encoding.
+    """
+    if get_decompressor(response.getheader('Content-Encoding')) is None:
+        return response.read()
+    return b''.join(iter_body(response))
+
+
+class HTTPClientTransport(object):
+    """
+    Sends requests using the standard library's ``http.client``, so needs no
+    third-party libraries, and is the quickest to import.
+
+    Up to ``pool_maxsize`` idle connections per host are kept alive for re-use.
+    'timeout' is as for RequestsTransport. Compressed responses are
+    decompressed as they are read.
+    """
+    def __init__(self, pool_maxsize=10, keep_alive=True,
+                 timeout=DEFAULT_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._pools = {}  # (scheme, netloc) -> idle connections
+        self._lock = threading.Lock()
+
+    def _get_connection(self, scheme, netloc, connect_timeout):
+        with self._lock:
+            pool = self._pools.get((scheme, netloc))
+            while pool:
+                conn = pool.pop()
+                if not _is_connection_dropped(conn):
+                    return conn, True
+                conn.close()
+        from http import client as http_client
+        if scheme == 'https':
+            cls = http_client.HTTPSConnection
+        else:
+            cls = http_client.HTTPConnection
+        if connect_timeout is None:
+            return cls(netloc), False
+        return cls(netloc, timeout=connect_timeout), False
+
+    def _release_connection(self, scheme, netloc, conn):
+        with self._lock:
+            pool = self._pools.setdefault((scheme, netloc), [])
+            if len(pool) < self.pool_maxsize:
+                pool.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method, url, data, params, headers, timeout):
+        # Sends the request and reads the response headers. Returns the URL,
+        # the connection, the http.client response and the timings so far.
+        from http import client as http_client
+        url = add_params(url, params)
+        parts = urllib_parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = dict(headers or {})
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+        connect_timeout, read_timeout = split_timeout(
+            self.timeout if timeout is None else timeout)
+
+        while True:
+            conn, reused = self._get_connection(parts.scheme, parts.netloc,
+                                                connect_timeout)
+            start = perf_counter()
+            connect = 0.0
+            sent = False
+            try:
+                if conn.sock is None:
+                    conn.timeout = connect_timeout
+                    conn.connect()
+                    conn.sock.setsockopt(socket.IPPROTO_TCP,
+                                         socket.TCP_NODELAY, 1)
+                    connect = perf_counter() - start
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, body=data, headers=headers)
+                sent = True
+                r = conn.getresponse()
+            except (http_client.HTTPException, socket.error) as e:
+                conn.close()
+                if (reused and
+                        isinstance(e, (http_client.BadStatusLine,
+                                       socket.error)) and
+                        not isinstance(e, socket.timeout) and
+                        (not sent or method in IDEMPOTENT_METHODS)):
+                    # The server closed a kept-alive connection just as we
+                    # used it - try again with a new one. Once the whole
+                    # request has gone, the server may have acted on it, so
+                    # only requests that are safe to repeat are sent again.
+                    continue
+                raise TransportError("%s: %s" % (e.__class__.__name__, e))
+            return url, conn, r, {'connect': connect,
+                                  'ttfb': perf_counter() - start - connect,
+                                  }
+
+    def _finish(self, url, conn, r):
+        # Called once the body has been read.
+        if r.will_close or not self.keep_alive:
+            conn.close()
+        else:
+            parts = urllib_parse.urlsplit(url)
+            self._release_connection(parts.scheme, parts.netloc, conn)
+
+    def request(self, method, url, data=None, params=None, headers=None,
+                timeout=None):
+        from http import client as http_client
+        url, conn, r, timings = self._send(method, url, data, params, headers,
+                                           timeout)
+        headers_received = perf_counter()
+        try:
+            content = read_body(r)
+        except (http_client.HTTPException, socket.error, zlib.error) as e:
+            conn.close()
+            raise TransportError("%s: %s" % (e.__class__.__name__, e))
+        timings['body'] = perf_counter() - headers_received
+        self._finish(url, conn, r)
+        return Response(r.status, r.msg, content, Request(method, url),
+                        timings)
+
+    def stream(self, method, url, data=None, params=None, headers=None,
+               chunk_size=65536, timeout=None):
+        from http import client as http_client
+        url, conn, r, timings = self._send(method, url, data, params, headers,
+                                           timeout)
+        finished = []
+
+        def chunks():
+            try:
+                for chunk in iter_body(r, chunk_size):
+                    yield chunk
+            except (http_client.HTTPException, socket.error, zlib.error) as e:
+                raise TransportError("%s: %s" % (e.__class__.__name__, e))
+            finished.append(True)
+
+        def close():
+            if finished:
+                self._finish(url, conn, r)
+            else:
+                conn.close()
+
+        return StreamedResponse(r.status, r.msg, Request(method, url), timings,
+                                chunks(), close)
+
+    def content_encodings(self):
+        return available_encodings()
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+
+def httpx_timeout(timeout):
+    import httpx
+    connect, read = split_timeout(timeout)
+    return httpx.Timeout(read, connect=connect)
+
+
+class HTTP2Transport(object):
+    """
+    Sends requests over HTTP/2 using ``httpx`` (``pip install
+    signupto[http2]``), so that concurrent requests, e.g. from get_many or
+    several threads, are multiplexed as streams over a single connection,
+    rather than each needing its own connection.
+
+    At most ``max_streams`` requests are sent at once; others wait for a free
+    stream. If the server doesn't support HTTP/2, HTTP/1.1 is used, with up to
+    ``max_connections`` connections. ``prior_knowledge=True`` uses HTTP/2
+    without negotiation, which is needed for unencrypted 'http://' URLs.
+    'timeout' is as for RequestsTransport.
+
+    Responses have 'ttfb' and 'body' timings, but not 'connect'.
+    """
+    def __init__(self, max_streams=100, max_connections=10,
+                 prior_knowledge=False, timeout=DEFAULT_TIMEOUT):
+        self.max_streams = max_streams
+        self.max_connections = max_connections
+        self.prior_knowledge = prior_knowledge
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+        self._streams = threading.BoundedSemaphore(max_streams)
+
+    def make_client(self):
+        import httpx
+        return httpx.Client(http1=not self.prior_knowledge, http2=True,
+                            timeout=httpx_timeout(self.timeout),
+                            limits=httpx.Limits(
+                                max_connections=self.max_connections))
+
+    @property
+    def client(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.make_client()
+                client = self._client
+        return client
+
+    def request(self, method, url, data=None, params=None, headers=None,
+                timeout=None):
+        import httpx
+        url = add_params(url, params)
+        extra = {} if timeout is None else {'timeout': httpx_timeout(timeout)}
+        with self._streams:
+            start = perf_counter()
+            try:
+                with self.client.stream(method, url, content=data,
+                                        headers=headers, **extra) as r:
+                    headers_received = perf_counter()
+                    content = r.read()
+            except httpx.TransportError as e:
+                raise TransportError("%s: %s" % (e.__class__.__name__, e))
+        response = Response(r.status_code, r.headers, content,
+                            Request(method, url),
+                            {'ttfb': headers_received - start,
+                             'body': perf_counter() - headers_received,
+                             })
+        response.http_version = r.http_version
+        return response
+
+    def stream(self, method, url, data=None, params=None, headers=None,
+               chunk_size=65536, timeout=None):
+        import httpx
+        url = add_params(url, params)
+        extra = {} if timeout is None else {'timeout': httpx_timeout(timeout)}
+        client = self.client
+        self._streams.acquire()
+        start = perf_counter()
+        try:
+            r = client.send(
+                client.build_request(
+                    method, url, content=data, headers=headers, **extra),
+                stream=True)
+        except httpx.TransportError as e:
+            self._streams.release()
+            raise TransportError("%s: %s" % (e.__class__.__name__, e))
+        except Exception:
+            self._streams.release()
+            raise
+
+        def chunks():
+            try:
+                for chunk in r.iter_bytes(chunk_size):
+                    yield chunk
+            except httpx.TransportError as e:
+                raise TransportError("%s: %s" % (e.__class__.__name__, e))
+
+        def close():
+            try:
+                r.close()
+            finally:
+                self._streams.release()
+
+        response = StreamedResponse(r.status_code, r.headers,
+                                    Request(method, url),
+                                    {'ttfb': perf_counter() - start}, chunks(),
+                                    close)
+        response.http_version = r.http_version
+        return response
+
+    def content_encodings(self):
+        return httpx_encodings()
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'urllib3': Urllib3Transport,
+    'stdlib': HTTPClientTransport,
+    'http2': HTTP2Transport,
+}
+
+
+def get_transport(name, **kwargs):
+    """
+    Returns a new transport of the given name ('requests', 'urllib3',
+    'stdlib' or 'http2'), passing it any keyword arguments.
+    """
+    try:
+        transport_class = TRANSPORTS[name]
+    except KeyError:
+        raise ValueError("Unknown transport %r, expected one of %s" %
+                         (name, ', '.join(sorted(TRANSPORTS))))
+    return transport_class(**kwargs)
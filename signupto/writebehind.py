@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+A write-behind queue, for making updates without waiting for the API.
+
+>>> writes = WriteBehindQueue(c, spill_path='/var/tmp/signupto-writes.jsonl')
+>>> writes.write('PUT', 'subscriberProfileData',
+...              {'subscriber_id': 123, 'profile_field_id': 45,
+...               'value': 'blue'})
+>>> writes.close()
+"""
+
+import atexit
+from collections import OrderedDict, deque
+import itertools
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+monotonic = time.monotonic
+
+# Fields that identify what a write updates, by endpoint. Writes to the same
+# endpoint with the same values for these fields are sent in order, and
+# queued ones with the same method are merged.
+DEFAULT_MERGE_KEYS = {
+    'subscriberProfileData': ('subscriber_id', 'profile_field_id'),
+    'subscription': ('list_id', 'subscriber_id'),
+    'subscriber': ('id',),
+}
+
+
+def encode_write(method, resource_name, data):
+    return json.dumps({'method': method, 'resource_name': resource_name,
+                       'data': data}) + '\n'
+
+
+class Write(object):
+    """
+    A queued write. 'data' has the changes of all the writes merged into it,
+    and 'callbacks' the on_error callbacks passed for them. 'key' says what it
+    updates - writes with the same key are sent in order.
+    """
+    def __init__(self, method, resource_name, data, key, created=None):
+        self.method = method
+        self.resource_name = resource_name
+        self.data = dict(data)
+        self.key = key
+        self.created = monotonic() if created is None else created
+        self.callbacks = []
+        self.merged = 0
+
+    def merge(self, data):
+        self.data.update(data)
+        self.merged += 1
+
+    def __repr__(self):
+        return "Write(%r, %r, %r)" % (self.method, self.resource_name,
+                                      self.data)
+
+
+class WriteBehindQueue(object):
+    """
+    Queues POST, PUT and DELETE requests, and sends them from background
+    threads.
+
+    - Up to 'max_workers' requests are sent at once.
+    - Writes are held for at least 'delay' seconds, and a write to the same
+      thing as one that is still queued (see DEFAULT_MERGE_KEYS, and
+      'merge_keys') with the same method is merged into it, so only the
+      latest values are sent. Writes to the same thing, whatever their
+      method, are sent in order, one at a time.
+    - When 'max_size' writes are queued, write() blocks, or raises queue.Full
+      if block=False or the timeout runs out.
+    - If a write fails, its on_error callbacks, or else the queue's
+      'on_error', are called with the Write and the exception. Otherwise, the
+      last 100 failures are kept in 'failures'. Use the client's 'retry'
+      option for retries.
+    - If 'spill_path' is given, each write is appended to that file as it is
+      queued, and the file is removed once everything in it has been sent.
+      Writes still queued when the queue is closed (or the process exits)
+      are saved there, and the next WriteBehindQueue created with the same
+      path queues them again - as it does after a crash or the process
+      being killed. The file is flushed but not fsynced, so a crash of the
+      whole machine can lose the latest writes. Callbacks are not saved.
+      Writes are sent at least once - a write that was in progress, or sent
+      since the file was last rewritten, may be sent again.
+    """
+    def __init__(self, client, max_workers=4, max_size=10000, delay=0.0,
+                 merge_keys=None, spill_path=None, on_error=None):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.delay = delay
+        if merge_keys is None:
+            merge_keys = DEFAULT_MERGE_KEYS
+        self.merge_keys = merge_keys
+        self.spill_path = spill_path
+        self.on_error = on_error
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.spilled = 0
+        self.failures = deque(maxlen=100)
+        self._pending = OrderedDict()  # key -> deque of Writes, in order
+        self._in_flight = {}           # key -> Write
+        self._size = 0                 # Writes in self._pending
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._threads = []
+        self._flushing = 0
+        self._closed = False
+        self._stopping = False
+        self._spill_file = None
+        self._spill_lines = 0
+        if spill_path is not None:
+            self._load_spilled()
+            atexit.register(self._spill_at_exit)
+
+    def make_key(self, method, resource_name, data):
+        fields = self.merge_keys.get(resource_name)
+        if fields and all(f in data for f in fields):
+            return (resource_name,) + tuple(str(data[f]) for f in fields)
+        return next(self._ids)
+
+    def write(self, method, resource_name, data, on_error=None, block=True,
+              timeout=None):
+        """
+        Queues a request, returning without waiting for it to be sent.
+        """
+        key = self.make_key(method, resource_name, data)
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("WriteBehindQueue is closed")
+                write = self._merge(method, key, data)
+                if write is not None:
+                    break
+                if self._size < self.max_size:
+                    write = self._enqueue(method, resource_name, data, key)
+                    break
+                if not block:
+                    raise queue.Full()
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise queue.Full()
+                    self._cond.wait(remaining)
+            if self.spill_path is not None:
+                self._append_spilled(method, resource_name, data)
+            if on_error is not None:
+                write.callbacks.append(on_error)
+        self._start()
+        return write
+
+    def _merge(self, method, key, data):
+        # Merges 'data' into the last queued write to 'key', if it has the same
+        # method, returning it. Called with self._cond held.
+        writes = self._pending.get(key)
+        if writes and writes[-1].method == method:
+            writes[-1].merge(data)
+            self.merged += 1
+            return writes[-1]
+        return None
+
+    def _enqueue(self, method, resource_name, data, key):
+        # Called with self._cond held
+        write = Write(method, resource_name, data, key)
+        writes = self._pending.get(key)
+        if writes is None:
+            writes = self._pending[key] = deque()
+        writes.append(write)
+        self._size += 1
+        self._cond.notify_all()
+        return write
+
+    def _start(self):
+        with self._cond:
+            if self._threads or self._stopping:
+                return
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_write(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                now = monotonic()
+                wait = None
+                for key, writes in self._pending.items():
+                    if key in self._in_flight:
+                        # Wait for the earlier write to the same thing.
+                        continue
+                    write = writes[0]
+                    ready = write.created + self.delay
+                    if self._flushing or ready <= now:
+                        writes.popleft()
+                        # The rest were queued later, so go to the back.
+                        del self._pending[key]
+                        if writes:
+                            self._pending[key] = writes
+                        self._size -= 1
+                        self._in_flight[key] = write
+                        self._cond.notify_all()
+                        return write
+                    # Later writes were queued later, so aren't ready either.
+                    wait = ready - now
+                    break
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            write = self._next_write()
+            if write is None:
+                return
+            try:
+                if write.method == 'DELETE':
+                    # As with Endpoint.delete, DELETE takes query parameters.
+                    self.client.make_request(write.method, write.resource_name,
+                                             params=write.data)
+                else:
+                    self.client.make_request(write.method, write.resource_name,
+                                             data=write.data)
+            except Exception as e:
+                with self._cond:
+                    self.failed += 1
+                self._report_failure(write, e)
+            else:
+                with self._cond:
+                    self.sent += 1
+            finally:
+                with self._cond:
+                    del self._in_flight[write.key]
+                    if (self.spill_path is not None and not self._stopping and
+                            not len(self)):
+                        self._remove_spilled()
+                    self._cond.notify_all()
+
+    def _report_failure(self, write, exception):
+        callbacks = write.callbacks or (
+            [self.on_error] if self.on_error is not None else [])
+        if not callbacks:
+            self.failures.append((write, exception))
+        for callback in callbacks:
+            try:
+                callback(write, exception)
+            except Exception as e:
+                # Don't let a broken callback stop the worker.
+                self.failures.append((write, e))
+
+    def flush(self, timeout=None):
+        """
+        Sends all queued writes now, ignoring 'delay', and waits until they
+        have been sent. Returns False if 'timeout' ran out first.
+        """
+        self._start()
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    if deadline is None:
+                        self._cond.wait()
+                    else:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._cond.wait(remaining)
+                return True
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=None):
+        """
+        Stops accepting writes and flushes the queue. Writes that haven't
+        been sent when 'timeout' runs out are saved to 'spill_path', if
+        given, or otherwise lost. Returns True if everything was sent.
+        """
+        with self._cond:
+            if self._closed and self._stopping:
+                return not (self._pending or self._in_flight)
+            self._closed = True
+        drained = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+            if self.spill_path is not None:
+                if drained:
+                    self._remove_spilled()
+                else:
+                    remaining = self._queued_writes()
+                    self._rewrite_spilled(remaining)
+                    self.spilled += len(remaining)
+        if drained:
+            for thread in threads:
+                thread.join()
+        return drained
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _queued_writes(self):
+        # In the order they should be sent. Called with self._cond held.
+        pending = [write for writes in self._pending.values()
+                   for write in writes]
+        return list(self._in_flight.values()) + pending
+
+    def _spill_at_exit(self):
+        if not self._closed:
+            self.close(timeout=0)
+
+    # The spill file holds a line for each write queued since it was last
+    # rewritten. These are called with self._cond held.
+
+    def _append_spilled(self, method, resource_name, data):
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, 'a')
+        self._spill_file.write(encode_write(method, resource_name, data))
+        self._spill_file.flush()
+        self._spill_lines += 1
+        if self._spill_lines > 1000 and self._spill_lines > 4 * len(self):
+            # Mostly writes that have been sent or merged
+            self._rewrite_spilled(self._queued_writes())
+
+    def _rewrite_spilled(self, writes):
+        self._close_spilled()
+        dirname = os.path.dirname(os.path.abspath(self.spill_path))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.signupto-writes')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for write in writes:
+                    f.write(encode_write(write.method, write.resource_name,
+                                         write.data))
+            os.rename(tmp_path, self.spill_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._spill_lines = len(writes)
+
+    def _remove_spilled(self):
+        self._close_spilled()
+        if self._spill_lines:
+            try:
+                os.unlink(self.spill_path)
+            except OSError:
+                pass
+            self._spill_lines = 0
+
+    def _close_spilled(self):
+        spill_file, self._spill_file = self._spill_file, None
+        if spill_file is not None:
+            spill_file.close()
+
+    def _load_spilled(self):
+        try:
+            with open(self.spill_path) as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return
+        with self._cond:
+            for line in lines:
+                try:
+                    w = json.loads(line)
+                except ValueError:
+                    # Empty, or cut short by a crash
+                    continue
+                key = self.make_key(w['method'], w['resource_name'], w['data'])
+                if self._merge(w['method'], key, w['data']) is None:
+                    self._enqueue(w['method'], w['resource_name'], w['data'],
+                                  key)
+            if not len(self):
+                os.unlink(self.spill_path)
+                return
+            # The file stays until these have been sent.
+            self._spill_lines = len(lines)
+        self._start()
+
+    def stats(self):
+        with self._cond:
+            return {'queued': self._size,
+                    'in_flight': len(self._in_flight),
+                    'sent': self.sent,
+                    'merged': self.merged,
+                    'failed': self.failed,
+                    'spilled': self.spilled,
+                    }
+
+    def __len__(self):
+        return self._size + len(self._in_flight)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.aio` module.
+"""
+
+import asyncio
+import time
+import unittest
+
+from signupto import DeadlineExceeded, ObjectNotFound, ServerError
+from signupto.testing import StubServer, envelope, error_envelope
+
+try:
+    from signupto.aio import AsyncClient
+    import httpx
+except ImportError:
+    AsyncClient = None
+
+
+def paged_app(request):
+    start = int(request.params.get('start', 0))
+    if start >= 6:
+        return 404, error_envelope(404, 'Not found')
+    next = start + 2 if start + 2 < 6 else None
+    return 200, envelope([{'id': i} for i in range(start, start + 2)],
+                         next=next)
+
+
+@unittest.skipIf(AsyncClient is None, "httpx not installed")
+class TestAsyncClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(app=paged_app).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_with_client(self, func, **kwargs):
+        async def main():
+            async with AsyncClient(base_url=self.server.url, **kwargs) as c:
+                return await func(c)
+        return asyncio.run(main())
+
+    def test_get(self):
+        r = self.run_with_client(lambda c: c.subscription.get())
+        self.assertEqual(r.data, [{'id': 0}, {'id': 1}])
+        self.assertEqual(r.next, 2)
+
+    def test_get_all(self):
+        data = self.run_with_client(lambda c: c.subscription.get_all())
+        self.assertEqual([d['id'] for d in data], list(range(6)))
+
+    def test_get_all_errors(self):
+        def failing_app(request):
+            if request.params.get('start') == '4':
+                return 500, error_envelope(500, 'Server error')
+            return paged_app(request)
+        self.server.app = failing_app
+        with self.assertRaises(ServerError) as cm:
+            self.run_with_client(lambda c: c.subscription.get_all())
+        self.assertEqual(cm.exception.partial_results,
+                         [{'id': i} for i in range(4)])
+        self.assertEqual(cm.exception.resume_start, 4)
+
+    def test_iter(self):
+        async def pages(c, **kwargs):
+            return [r.data async for r in c.subscription.iter_pages(**kwargs)]
+        self.assertEqual(self.run_with_client(pages),
+                         [[{'id': i}, {'id': i + 1}] for i in (0, 2, 4)])
+        self.assertEqual(
+            len(self.run_with_client(lambda c: pages(c, prefetch=0))), 3)
+
+        async def items(c):
+            return [
+                item['id'] async for item in c.subscription.iter_all(start=2)]
+        self.assertEqual(self.run_with_client(items), [2, 3, 4, 5])
+
+        async def first(c):
+            async for item in c.subscription.iter_all():
+                return item
+        self.assertEqual(self.run_with_client(first), {'id': 0})
+
+    def test_many(self):
+        results = self.run_with_client(
+            lambda c: c.subscription.get_many([0, 2, 10], param='start'))
+        self.assertEqual([r.data[0]['id'] for r in results[:2]], [0, 2])
+        self.assertTrue(isinstance(results[2], ObjectNotFound))
+        results = self.run_with_client(
+            lambda c: c.subscription.head_many([0, 2], param='start'))
+        self.assertEqual(results, [None, None])
+
+    def test_unsupported(self):
+        endpoint = AsyncClient(base_url=self.server.url).subscription
+        for name in ['stream', 'iter_pages_partitioned',
+                     'iter_all_partitioned', 'get_all_partitioned']:
+            self.assertRaises(NotImplementedError, getattr(endpoint, name),
+                              [{}])
+        self.assertRaises(TypeError, endpoint.iter_pages, stream=True)
+        for kwargs in [{'stream': True}, {'partitions': [{}]}]:
+            self.assertRaises(TypeError, self.run_with_client,
+                              lambda c: c.subscription.get_all(**kwargs))
+        self.assertEqual(self.server.requests, [])
+
+    def test_errors(self):
+        self.assertRaises(ObjectNotFound,
+                          self.run_with_client,
+                          lambda c: c.subscription.get(start=10))
+        self.assertEqual(
+            self.run_with_client(lambda c: c.subscription.get_list(start=10)),
+            [])
+
+    def test_concurrency(self):
+        async def many(c):
+            return await asyncio.gather(
+                *[c.subscription.get() for i in range(20)])
+        results = self.run_with_client(many, max_concurrency=3)
+        self.assertEqual(len(results), 20)
+        self.assertTrue(len(self.server.connections) <= 3)
+
+    def test_timeouts(self):
+        def slow_app(request):
+            time.sleep(0.1)
+            return paged_app(request)
+        self.server.app = slow_app
+        self.assertRaises(httpx.TimeoutException, self.run_with_client,
+                          lambda c: c.subscription.get(), timeout=0.02)
+        self.assertRaises(DeadlineExceeded, self.run_with_client,
+                          lambda c: c.subscription.get_all(deadline=0.25))
+        data = self.run_with_client(
+            lambda c: c.subscription.get_all(timeout=1, deadline=5))
+        self.assertEqual(len(data), 6)
+
+    def test_default_timeout(self):
+        # The same as Client's, rather than httpx's.
+        async def timeout(c):
+            return c._transport.client.timeout
+        timeout = self.run_with_client(timeout)
+        self.assertEqual((timeout.connect, timeout.read), (10.0, 60.0))
+        # Client features that aren't supported are off, rather than missing.
+        c = AsyncClient(base_url=self.server.url)
+        self.assertEqual((c._rate_limiter, c._retry, c._cache, c._hooks),
+                         (None, None, None, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
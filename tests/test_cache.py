@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.cache` module.
+"""
+
+import time
+import unittest
+
+from signupto import Client
+from signupto.cache import MISSING, ResponseCache
+from signupto.client import SignuptoResponse
+from signupto.testing import StubServer
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = ResponseCache(max_size=2)
+        keys = [cache.make_key('GET', 'list', {'id': i}) for i in range(3)]
+        cache.set(keys[0], 0)
+        cache.set(keys[1], 1)
+        cache.get(keys[0])
+        cache.set(keys[2], 2)
+        self.assertEqual(cache.get(keys[0]), 0)
+        self.assertEqual(cache.get(keys[1]), MISSING)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_key_normalization(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.make_key('GET', 'list', {'id': 1, 'b': None}),
+                         cache.make_key('GET', 'list', {'id': '1'}))
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.05, endpoint_ttls={'folder': 0})
+        key = cache.make_key('GET', 'list', {})
+        cache.set(key, 1)
+        cache.set(cache.make_key('GET', 'folder', {}), 1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get(key), 1)
+        time.sleep(0.06)
+        self.assertEqual(cache.get(key), MISSING)
+
+    def test_stale_generation(self):
+        cache = ResponseCache()
+        key = cache.make_key('GET', 'list', {})
+        generation = cache.generation('list')
+        cache.invalidate('list')
+        cache.set(key, 1, generation=generation)
+        self.assertEqual(cache.get(key), MISSING)
+
+
+class TestClientCache(unittest.TestCase):
+
+    def test_client(self):
+        cache = ResponseCache()
+        with StubServer() as server:
+            with Client(base_url=server.url, cache=cache) as c:
+                r1 = c.list.get(id=1)
+                r2 = c.list.get(id='1')
+                self.assertTrue(isinstance(r2, SignuptoResponse))
+                self.assertTrue(r1 is r2)
+                self.assertEqual(len(server.requests), 1)
+                c.folder.put(id=1)
+                # Writes to other endpoints don't invalidate
+                c.list.get(id=1)
+                self.assertEqual(len(server.requests), 2)
+                c.list.put(id=1)
+                c.list.get(id=1)
+                self.assertEqual(len(server.requests), 4)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.coalesce` module.
+"""
+
+import asyncio
+from importlib.util import find_spec
+import threading
+import time
+import unittest
+
+from signupto import Client, DeadlineExceeded, ServerError
+from signupto.aio import AsyncClient
+from signupto.coalesce import SingleFlight
+from signupto.deadline import Deadline
+from signupto.testing import StubServer, envelope, error_envelope
+
+
+def slow_app(request):
+    time.sleep(0.2)
+    if request.params.get('id') == 'broken':
+        return 503, error_envelope(503, 'Unavailable')
+    return 200, envelope({'id': request.params.get('id')})
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def call_concurrently(self, func, count=10):
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = func()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_threads(self):
+        single_flight = SingleFlight()
+        with StubServer(app=slow_app) as server:
+            with Client(base_url=server.url, single_flight=single_flight) as c:
+                results = self.call_concurrently(lambda: c.list.get(id=1))
+                self.assertEqual(len(server.requests), 1)
+                self.assertEqual(set(r.data['id'] for r in results),
+                                 set(['1']))
+                self.assertEqual(single_flight.stats(),
+                                 {'calls': 10, 'executed': 1, 'coalesced': 9,
+                                  'in_flight': 0})
+                self.assertEqual(single_flight.coalesced_by_endpoint,
+                                 {'list': 9})
+
+                # Different parameters are different requests, and later calls
+                # send a new request.
+                self.call_concurrently(lambda: c.list.get(id=2), count=2)
+                c.list.get(id=1)
+                self.assertEqual(len(server.requests), 3)
+
+    def test_errors_shared(self):
+        with StubServer(app=slow_app) as server:
+            with Client(base_url=server.url,
+                        single_flight=SingleFlight()) as c:
+                results = self.call_concurrently(
+                    lambda: c.list.get(id='broken'), count=5)
+                self.assertEqual(len(server.requests), 1)
+                for r in results:
+                    self.assertIsInstance(r, ServerError)
+
+    def test_writes_not_shared(self):
+        with StubServer(app=slow_app) as server:
+            with Client(base_url=server.url,
+                        single_flight=SingleFlight()) as c:
+                self.call_concurrently(lambda: c.list.post(id=1), count=3)
+                self.assertEqual(len(server.requests), 3)
+
+    def test_deadlines(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+        leader_deadline = Deadline(10)
+        results = {}
+
+        def leader():
+            # Runs out of time, but only once a follower is waiting.
+            started.set()
+            finish.wait(5)
+            raise leader_deadline.exceeded()
+
+        def run(name, func, deadline):
+            try:
+                results[name] = single_flight.call('list', 'key', func,
+                                                   deadline=deadline)
+            except Exception as e:
+                results[name] = e
+
+        threads = [threading.Thread(target=run,
+                                    args=('leader', leader, leader_deadline))]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(
+            target=run, args=('follower', lambda: 'new', None)))
+        threads[1].start()
+        for i in range(500):
+            if single_flight.calls == 2:
+                break
+            time.sleep(0.01)
+
+        # A follower gives up when its own deadline runs out.
+        start = time.time()
+        self.assertRaises(DeadlineExceeded, single_flight.call, 'list', 'key',
+                          lambda: 'unused', deadline=Deadline(0.05))
+        self.assertTrue(time.time() - start < 1)
+
+        # The leader's deadline doesn't apply to the follower, which sends its
+        # own request instead.
+        finish.set()
+        for t in threads:
+            t.join()
+        self.assertIsInstance(results['leader'], DeadlineExceeded)
+        self.assertEqual(results['follower'], 'new')
+        self.assertEqual(single_flight.stats(),
+                         {'calls': 3, 'executed': 2, 'coalesced': 2,
+                          'in_flight': 0})
+
+    def test_leader_interrupted(self):
+        # Followers of a leader stopped by a BaseException don't get None as
+        # the result, but send the request themselves.
+        single_flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+        results = {}
+
+        def leader():
+            started.set()
+            finish.wait(5)
+            raise KeyboardInterrupt()
+
+        def run_leader():
+            try:
+                single_flight.call('list', 'key', leader)
+            except KeyboardInterrupt as e:
+                results['leader'] = e
+
+        def run_follower():
+            results['follower'] = single_flight.call('list', 'key',
+                                                     lambda: 'new')
+
+        threads = [threading.Thread(target=run_leader)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=run_follower))
+        threads[1].start()
+        for i in range(500):
+            if single_flight.calls == 2:
+                break
+            time.sleep(0.01)
+        finish.set()
+        for t in threads:
+            t.join()
+        self.assertIsInstance(results['leader'], KeyboardInterrupt)
+        self.assertEqual(results['follower'], 'new')
+        self.assertEqual(single_flight.executed, 2)
+
+    @unittest.skipIf(find_spec('httpx') is None, "httpx not installed")
+    def test_asyncio(self):
+        single_flight = SingleFlight()
+
+        async def main(url):
+            async with AsyncClient(base_url=url,
+                                   single_flight=single_flight) as c:
+                return await asyncio.gather(
+                    *[c.list.get(id=1) for i in range(10)])
+
+        with StubServer(app=slow_app) as server:
+            results = asyncio.run(main(server.url))
+            self.assertEqual(len(server.requests), 1)
+            self.assertEqual([r.data['id'] for r in results], ['1'] * 10)
+            self.assertEqual(single_flight.coalesced, 9)
+            self.assertEqual(single_flight.stats()['in_flight'], 0)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.compression` module.
+"""
+
+import json
+import unittest
+import zlib
+
+from signupto import Client
+from signupto.compression import (Compression, available_encodings,
+                                  get_decompressor, gzip_compress,
+                                  urllib3_encodings)
+from signupto.testing import StubAPI, StubServer
+from signupto.transport import HTTPClientTransport, Urllib3Transport
+
+from .test_signupto import available_transports
+
+
+class TestDecompressors(unittest.TestCase):
+
+    def test_streaming(self):
+        data = json.dumps(list(range(10000))).encode('utf-8')
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        for encoding, compressed in [('gzip', gzip_compress(data)),
+                                     ('deflate', zlib.compress(data)),
+                                     # Raw deflate, as some servers send
+                                     ('deflate',
+                                      raw.compress(data) + raw.flush())]:
+            decompressor = get_decompressor(encoding)
+            chunks = [decompressor.decompress(compressed[i:i + 100])
+                      for i in range(0, len(compressed), 100)]
+            self.assertEqual(b''.join(chunks) + decompressor.flush(), data)
+        self.assertIs(get_decompressor(None), None)
+        self.assertIs(get_decompressor('identity'), None)
+
+    def test_short_chunks(self):
+        compressed = zlib.compress(b'abc')
+        decompressor = get_decompressor('deflate')
+        chunks = [decompressor.decompress(compressed[i:i + 1])
+                  for i in range(len(compressed))]
+        self.assertEqual(b''.join(chunks) + decompressor.flush(), b'abc')
+
+
+class TestAcceptEncoding(unittest.TestCase):
+
+    def test_transport(self):
+        # Only what the transport decodes is asked for.
+        self.assertEqual(Compression().accept_encoding(HTTPClientTransport()),
+                         ', '.join(available_encodings()))
+        self.assertEqual(Compression().accept_encoding(Urllib3Transport()),
+                         ', '.join(urllib3_encodings()))
+        self.assertEqual(Compression().accept_encoding(object()),
+                         'gzip, deflate')
+        compression = Compression(encodings=['zstd', 'gzip'])
+        self.assertEqual(compression.accept_encoding(object()), 'gzip')
+        self.assertEqual(
+            Compression(encodings=['zstd']).accept_encoding(object()),
+            'identity')
+
+
+class TestClientCompression(unittest.TestCase):
+
+    def test_responses(self):
+        with StubServer(app=StubAPI(items=500, page_size=100),
+                        compression=True) as server:
+            for name in available_transports():
+                server.bytes_sent = 0
+                with Client(base_url=server.url, transport=name) as c:
+                    items = c.subscription.get_all()
+                self.assertEqual(len(items), 500, name)
+                compressed_size = server.bytes_sent
+
+                server.bytes_sent = 0
+                with Client(base_url=server.url, transport=name,
+                            compression=Compression(encodings=[])) as c:
+                    self.assertEqual(c.subscription.get_all(), items)
+                self.assertTrue(compressed_size * 5 < server.bytes_sent, name)
+
+    def test_requests(self):
+        compression = Compression(request_threshold=1000)
+        with StubServer() as server:
+            with Client(base_url=server.url, compression=compression) as c:
+                big = {'name': 'x' * 2000}
+                self.assertEqual(c.list.post(**big).data, big)
+                self.assertEqual(
+                    server.requests[-1].headers.get('Content-Encoding'),
+                    'gzip')
+                self.assertTrue(server.bytes_received < 200)
+
+                c.list.post(name='small')
+                self.assertEqual(server.requests[-1].body, {'name': 'small'})
+                self.assertEqual(
+                    server.requests[-1].headers.get('Content-Encoding'), None)
+
+    def test_disabled(self):
+        with StubServer(compression=True) as server:
+            with Client(base_url=server.url, transport='stdlib',
+                        compression=False) as c:
+                c.list.get(id=1)
+            self.assertEqual(
+                server.requests[-1].headers.get('Accept-Encoding'), 'identity')
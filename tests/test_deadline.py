@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for timeouts, `signupto.deadline` and `signupto.hedging` modules.
+"""
+
+import threading
+import time
+import unittest
+
+from signupto import Client, DeadlineExceeded, ServerError
+from signupto.deadline import Deadline, split_timeout
+from signupto.hedging import HedgePolicy
+from signupto.retry import RetryPolicy
+from signupto.testing import StubServer, envelope
+
+from .test_signupto import available_transports
+
+
+class SlowApp(object):
+    # Pages of 2 items, taking 'delay' seconds, with 'slow' seconds instead
+    # for every request whose number is in 'slow_requests', and a 500 for all
+    # of them if 'fail'.
+    def __init__(self, delay=0.0, pages=3):
+        self.delay = delay
+        self.pages = pages
+        self.slow = 0.0
+        self.slow_requests = set()
+        self.fail = False
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        with self.lock:
+            number = self.count
+            self.count += 1
+        time.sleep(self.slow if number in self.slow_requests else self.delay)
+        if self.fail:
+            return 500, None
+        start = int(request.params.get('start', 0))
+        next = start + 2 if start + 2 < self.pages * 2 else None
+        return 200, envelope([{'id': i} for i in range(start, start + 2)],
+                             next=next)
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_limit(self):
+        self.assertEqual(split_timeout(None), (None, None))
+        self.assertEqual(split_timeout(3), (3, 3))
+        self.assertEqual(split_timeout((1, 5)), (1, 5))
+        deadline = Deadline(2)
+        connect, read = deadline.limit((1, 5))
+        self.assertEqual(connect, 1)
+        self.assertTrue(1.9 < read <= 2)
+        self.assertTrue(Deadline.coerce(deadline) is deadline)
+        self.assertEqual(Deadline.coerce(None), None)
+        deadline = Deadline(0)
+        self.assertTrue(deadline.expired)
+        self.assertRaises(DeadlineExceeded, deadline.check)
+        self.assertRaises(DeadlineExceeded, deadline.limit, None)
+
+
+class TestTimeouts(unittest.TestCase):
+
+    def setUp(self):
+        self.app = SlowApp(delay=0.15)
+        self.server = StubServer(app=self.app).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_transports(self):
+        for name in available_transports():
+            with Client(base_url=self.server.url, transport=name,
+                        timeout=(1, 0.05)) as c:
+                self.assertRaises(IOError, c.subscription.get)
+                self.assertRaises(IOError, c.subscription.stream)
+                # Per-call timeouts override the client's.
+                self.assertEqual(len(c.subscription.get(timeout=2).data), 2)
+
+    def test_deadline(self):
+        with Client(base_url=self.server.url) as c:
+            start = time.time()
+            with self.assertRaises(DeadlineExceeded):
+                c.subscription.get(deadline=0.05)
+            self.assertTrue(time.time() - start < 0.12)
+
+    def test_get_all(self):
+        # The deadline is for all the pages together.
+        self.app.delay = 0.1
+        self.app.pages = 10
+        with Client(base_url=self.server.url) as c:
+            with self.assertRaises(DeadlineExceeded) as cm:
+                c.subscription.get_all(deadline=0.35)
+            self.assertTrue(4 <= len(cm.exception.partial_results) <= 6)
+            self.assertEqual(cm.exception.resume_start,
+                             len(cm.exception.partial_results))
+            self.app.delay = 0.01
+            self.assertEqual(len(c.subscription.get_all(deadline=5)), 20)
+
+    def test_retries(self):
+        self.app.delay = 0.0
+        self.app.fail = True
+        with Client(base_url=self.server.url,
+                    retry=RetryPolicy(max_retries=1000, backoff=0.05,
+                                      max_backoff=0.05)) as c:
+            start = time.time()
+            with self.assertRaises(ServerError):
+                c.subscription.get(deadline=0.3)
+            self.assertTrue(0.2 < time.time() - start < 0.4)
+            self.assertTrue(self.app.count > 3)
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        self.app = SlowApp(delay=0.005)
+        self.app.slow = 1.0
+        self.server = StubServer(app=self.app).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_hedging(self):
+        # Every 10th request is slow, after the first 20.
+        self.app.slow_requests = set(range(25, 60, 10))
+        hedge = HedgePolicy(min_samples=10)
+        with Client(base_url=self.server.url, hedge=hedge) as c:
+            start = time.time()
+            for i in range(40):
+                self.assertEqual(len(c.subscription.get().data), 2)
+            self.assertTrue(time.time() - start < 0.8)
+            c.subscription.post(name='x')
+        stats = hedge.stats()
+        self.assertEqual(stats['requests'], 40)
+        self.assertTrue(stats['hedged'] >= 2)
+        self.assertTrue(stats['wins'] >= 2)
+        self.assertTrue(stats['hedged'] <= 4)
+        hedge.close()
+
+    def test_errors(self):
+        hedge = HedgePolicy(min_samples=5)
+        with Client(base_url=self.server.url, hedge=hedge) as c:
+            for i in range(10):
+                c.subscription.get()
+            # Both copies fail.
+            self.app.fail = True
+            self.app.delay = 0.05
+            self.assertRaises(ServerError, c.subscription.get)
+        self.assertTrue(hedge.stats()['hedged'] >= 1)
+        hedge.close()
+
+    def test_concurrency(self):
+        # Hedging doesn't limit the number of requests in flight.
+        hedge = HedgePolicy(min_samples=5, max_hedges=2)
+        with Client(base_url=self.server.url, hedge=hedge) as c:
+            for i in range(5):
+                c.subscription.get()
+            self.app.delay = 0.2
+            self.assertEqual(
+                len(c.subscription.get_many(range(16), max_workers=16)), 16)
+        self.assertTrue(self.server.max_concurrent >= 16)
+        self.assertTrue(hedge.stats()['hedged'] <= 2)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.export` module.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from signupto.export import main, parse_endpoint
+from signupto.testing import StubServer
+
+from .test_signupto import ListsApp
+
+CREDENTIALS = ['--company-id', '1234', '--user-id', '4567', '--api-key', 'key']
+
+
+class TestParseEndpoint(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_endpoint('list'), ('list', [{}]))
+        self.assertEqual(parse_endpoint('subscription?list_id=1&confirmed=1'),
+                         ('subscription',
+                          [{'list_id': '1', 'confirmed': '1'}]))
+        self.assertEqual(
+            parse_endpoint('subscription?list_id=1&list_id=2&confirmed=1'),
+            ('subscription', [{'list_id': '1', 'confirmed': '1'},
+                              {'list_id': '2', 'confirmed': '1'}]))
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ListsApp()
+        self.server = StubServer(app=self.app).start()
+        self.directory = tempfile.mkdtemp()
+        self.expected = sorted(i * 10 + j for i in [1, 2, 3] for j in range(6))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def export(self, *args):
+        return main(CREDENTIALS +
+                    ['--base-url', self.server.url, '-d', self.directory, '-q',
+                     '--retries', '0',
+                     'subscription?list_id=0&list_id=1&list_id=2&list_id=3'] +
+                    list(args))
+
+    def read_ndjson(self, name='subscription.ndjson.gz'):
+        with gzip.open(os.path.join(self.directory, name)) as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+    def test_ndjson(self):
+        self.assertEqual(self.export('--gzip', '--workers', '4'), 0)
+        self.assertEqual(sorted(item['id'] for item in self.read_ndjson()),
+                         self.expected)
+        self.assertEqual(os.listdir(self.directory),
+                         ['subscription.ndjson.gz'])
+
+    def test_csv(self):
+        self.assertEqual(self.export('--format', 'csv'), 0)
+        with io.open(os.path.join(self.directory, 'subscription.csv'),
+                     encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['id'])
+        self.assertEqual(sorted(int(row[0]) for row in rows[1:]),
+                         self.expected)
+
+    def test_resume(self):
+        # List 1 fails from its second page on.
+        self.app.failures = {(1, 2): 100}
+        self.assertEqual(self.export('--gzip'), 1)
+        with open(os.path.join(self.directory, '.signupto-export.json')) as f:
+            checkpoint = json.load(f)
+        partitions = checkpoint['endpoints'][0]['partitions']
+        self.assertEqual([(p['params']['list_id'], p['start'])
+                          for p in partitions if not p['done']], [('1', 2)])
+        self.assertEqual(len(self.read_ndjson()), 2 + 12)
+
+        # Anything written after the checkpoint is dropped when carrying on.
+        with open(os.path.join(self.directory, 'subscription.ndjson.gz'),
+                  'ab') as f:
+            f.write(b'junk')
+        self.app.failures = {}
+        self.assertEqual(self.export('--gzip'), 0)
+        self.assertEqual(sorted(item['id'] for item in self.read_ndjson()),
+                         self.expected)
+        self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                     '.signupto-export.json')))
+
+    def test_different_export(self):
+        self.app.failures = {(1, 2): 100}
+        self.assertEqual(self.export(), 1)
+        # A checkpoint for different options isn't used...
+        self.assertEqual(self.export('--format', 'csv'), 1)
+        # ...unless asked to start again.
+        self.app.failures = {}
+        self.assertEqual(self.export('--format', 'csv', '--restart'), 0)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the HTTP/2 transports.
+"""
+
+import asyncio
+from importlib.util import find_spec
+import time
+import unittest
+
+from signupto import Client, HashAuthorization
+from signupto.aio import AsyncClient, HttpxAsyncTransport
+from signupto.testing import H2StubServer, StubAPI
+from signupto.transport import HTTP2Transport
+
+HAVE_HTTP2 = find_spec('httpx') is not None and find_spec('h2') is not None
+
+
+def slow_app(request):
+    time.sleep(0.05)
+    return 200, {'status': 'ok',
+                 'response': {'data': {'id': request.params.get('id')},
+                              'next': None, 'count': 1}}
+
+
+@unittest.skipIf(not HAVE_HTTP2, "httpx[http2] not installed")
+class TestHTTP2Transport(unittest.TestCase):
+
+    def test_multiplexing(self):
+        with H2StubServer(app=slow_app) as server:
+            transport = HTTP2Transport(prior_knowledge=True, max_streams=5)
+            with Client(base_url=server.url, transport=transport) as c:
+                results = c.list.get_many([str(i) for i in range(20)],
+                                          max_workers=20)
+            self.assertEqual([r.data['id'] for r in results],
+                             [str(i) for i in range(20)])
+            self.assertEqual(len(server.connections), 1)
+            self.assertEqual(server.max_concurrent, 5)
+
+    def test_signing_and_paging(self):
+        auth = HashAuthorization(company_id=1234, user_id=4567, api_key='key')
+        with H2StubServer(app=StubAPI(items=1000, page_size=300,
+                                      credentials=auth)) as server:
+            with Client(base_url=server.url, auth=auth,
+                        transport=HTTP2Transport(prior_knowledge=True)) as c:
+                self.assertEqual(len(c.subscription.get_all()), 1000)
+                self.assertEqual(c.list.post(name='Caf\xe9').data,
+                                 {'name': 'Caf\xe9'})
+                response = c.send_request('GET', 'list')
+                self.assertEqual(response.http_version, 'HTTP/2')
+
+    def test_async(self):
+        async def main(url):
+            transport = HttpxAsyncTransport(http2=True, prior_knowledge=True,
+                                            max_streams=4)
+            async with AsyncClient(base_url=url, transport=transport) as c:
+                return await asyncio.gather(
+                    *[c.list.get(id=str(i)) for i in range(12)])
+
+        with H2StubServer(app=slow_app) as server:
+            results = asyncio.run(main(server.url))
+            self.assertEqual([r.data['id'] for r in results],
+                             [str(i) for i in range(12)])
+            self.assertEqual(len(server.connections), 1)
+            self.assertEqual(server.max_concurrent, 4)
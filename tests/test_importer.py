@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.importer` module.
+"""
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from signupto import Client
+from signupto.importer import (BulkImport, Importer, OutcomeLog, clean_row,
+                               main, read_rows)
+from signupto.testing import StubServer, envelope, error_envelope
+
+CREDENTIALS = ['--company-id', '1234', '--user-id', '4567', '--api-key', 'key']
+
+
+class ImportApp(object):
+    # Accepts rows by bulk import and to 'subscriber', rejecting any named
+    # 'reject', and failing with a 500 for emails in 'failures'.
+    def __init__(self, bulk=True):
+        self.bulk = bulk
+        self.failures = set()
+        self.imported = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        with self.lock:
+            self.requests.append(request.resource_name)
+        if request.resource_name == 'import':
+            if not self.bulk:
+                return 404, error_envelope(404, 'Not found')
+            rows = request.body['data']
+        else:
+            rows = [request.body]
+        for row in rows:
+            if row.get('name') == 'reject':
+                return 400, error_envelope(400, 'Bad name')
+            if row['email'] in self.failures:
+                return 500, None
+        with self.lock:
+            self.imported.extend(row['email'] for row in rows)
+        return 200, envelope(rows)
+
+
+def make_rows(count):
+    return [{'email': 'user%d@example.com' % i, 'name': 'User %d' % i}
+            for i in range(count)]
+
+
+class TestImporter(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ImportApp()
+        self.server = StubServer(app=self.app).start()
+        self.client = Client(base_url=self.server.url)
+        self.directory = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.directory, 'log')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def run_import(self, rows, **kwargs):
+        kwargs.setdefault('batch_size', 10)
+        importer = Importer(self.client, 'subscriber', log_path=self.log_path,
+                            **kwargs)
+        return importer.run(rows)
+
+    def test_bulk(self):
+        rows = make_rows(95)
+        stats = self.run_import(rows, defaults={'list_id': 7})
+        self.assertEqual(stats['ok'], 95)
+        self.assertTrue(stats['bulk'])
+        self.assertEqual(sorted(self.app.imported),
+                         sorted(row['email'] for row in rows))
+        self.assertEqual(set(self.app.requests), set(['import']))
+        self.assertEqual(len(self.app.requests), 10)
+
+    def test_bulk_unsupported(self):
+        self.app.bulk = False
+        stats = self.run_import(make_rows(50), max_workers=1)
+        self.assertEqual(stats['ok'], 50)
+        self.assertFalse(stats['bulk'])
+        # Only the first batch tried the import endpoint.
+        self.assertEqual(self.app.requests.count('import'), 1)
+        self.assertEqual(self.app.requests.count('subscriber'), 50)
+
+    def test_rejected_batch(self):
+        rows = make_rows(30)
+        rows[12]['name'] = 'reject'
+        stats = self.run_import(rows)
+        self.assertEqual((stats['ok'], stats['rejected']), (29, 1))
+        self.assertTrue(stats['bulk'])
+        # The batch with the bad row was posted a row at a time.
+        self.assertEqual(self.app.requests.count('subscriber'), 10)
+        with io.open(self.log_path, encoding='utf-8') as f:
+            rejected = [entry for entry in map(json.loads, f)
+                        if entry['status'] != 'ok']
+        self.assertEqual(
+            [(e['row'], e['status'], e['error']) for e in rejected],
+            [(13, 'rejected', 'HTTP 400: Bad name')])
+
+    def test_validation(self):
+        rows = make_rows(5) + [{'email': 'not an email'}, {'name': 'No email'},
+                               {'email': ' '}]
+        stats = self.run_import(rows, required=['email'])
+        self.assertEqual((stats['rows'], stats['ok'], stats['invalid']),
+                         (8, 5, 3))
+        self.assertEqual(len(self.app.imported), 5)
+
+    def test_resume(self):
+        rows = make_rows(40)
+        self.app.failures = set(['user15@example.com'])
+        stats = self.run_import(rows, max_workers=2)
+        self.assertEqual((stats['ok'], stats['failed']), (30, 10))
+
+        # A log cut short by a crash is fine.
+        with open(self.log_path, 'ab') as f:
+            f.write(b'{"key": "abc", "sta')
+        self.app.failures = set()
+        self.app.imported = []
+        stats = self.run_import(rows, max_workers=2)
+        self.assertEqual((stats['skipped'], stats['ok'], stats['failed']),
+                         (30, 10, 0))
+        self.assertEqual(sorted(self.app.imported),
+                         ['user%d@example.com' % i for i in range(10, 20)])
+        self.assertEqual(len(OutcomeLog(self.log_path).load()), 40)
+
+    def test_scope(self):
+        # Rows imported to one endpoint, or with other defaults, aren't
+        # skipped when imported elsewhere with the same log.
+        rows = make_rows(5)
+        self.assertEqual(self.run_import(rows, defaults={'list_id': 7})['ok'],
+                         5)
+        self.assertEqual(
+            self.run_import(rows, defaults={'list_id': 7})['skipped'], 5)
+        self.assertEqual(self.run_import(rows, defaults={'list_id': 8})['ok'],
+                         5)
+        importer = Importer(self.client, 'contact', log_path=self.log_path,
+                            defaults={'list_id': 7})
+        self.assertEqual(importer.run(rows)['ok'], 5)
+        stats = self.run_import(rows, bulk=BulkImport(params={'list_id': 9}),
+                                defaults={'list_id': 7})
+        self.assertEqual(stats['ok'], 5)
+
+    def test_no_bulk(self):
+        stats = self.run_import(make_rows(25), bulk=False)
+        self.assertEqual(stats['ok'], 25)
+        self.assertEqual(self.app.requests, ['subscriber'] * 25)
+
+    def test_payload(self):
+        bulk = BulkImport(params={'list_id': 7})
+        self.assertEqual(bulk.payload([{'a': 1}]),
+                         {'list_id': 7, 'data': [{'a': 1}]})
+        bulk = BulkImport(make_payload=lambda rows: {'rows': rows})
+        self.assertEqual(bulk.payload([{'a': 1}]), {'rows': [{'a': 1}]})
+
+
+class TestReadRows(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_formats(self):
+        csv_path = os.path.join(self.directory, 'rows.csv')
+        with io.open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('email,name\na@example.com, Caf\xe9 \nb@example.com,\n')
+        ndjson_path = os.path.join(self.directory, 'rows.ndjson.gz')
+        with gzip.open(ndjson_path, 'wb') as f:
+            f.write(
+                b'{"email": "a@example.com", "name": '
+                b'"Caf\\u00e9"}\n\n{"email": "b@example.com"}\n')
+        expected = [{'email': 'a@example.com', 'name': 'Caf\xe9'},
+                    {'email': 'b@example.com'}]
+        for path in [csv_path, ndjson_path]:
+            self.assertEqual([clean_row(row) for row in read_rows(path)],
+                             expected)
+        self.assertRaises(ValueError, list,
+                          read_rows(os.path.join(self.directory, 'rows.xls')))
+
+
+class TestCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ImportApp()
+        self.server = StubServer(app=self.app).start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'subscribers.ndjson')
+        with open(self.path, 'w') as f:
+            for row in make_rows(20):
+                f.write(json.dumps(row) + '\n')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def run_command(self, *args):
+        return main(CREDENTIALS +
+                    ['--base-url', self.server.url, '-q', '--retries', '0',
+                     self.path, '--endpoint', 'subscriber'] + list(args))
+
+    def test_command(self):
+        self.app.failures = set(['user3@example.com'])
+        self.assertEqual(self.run_command('--no-bulk', '--set', 'list_id=7'),
+                         1)
+        self.assertEqual(len(self.app.imported), 19)
+        self.assertTrue(os.path.exists(self.path + '.import-log'))
+        self.app.failures = set()
+        self.assertEqual(self.run_command('--no-bulk', '--set', 'list_id=7'),
+                         0)
+        self.assertEqual(len(self.app.imported), 20)
+        self.assertEqual(self.run_command('--restart', '--batch-size', '5'), 0)
+        self.assertEqual(len(self.app.imported), 40)
+        self.assertEqual(self.app.requests.count('import'), 4)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.instrumentation` module.
+"""
+
+import unittest
+
+from signupto import (Client, HashAuthorization, ObjectNotFound, RateLimited,
+                      ServerError)
+from signupto.instrumentation import Hooks, MetricsCollector
+from signupto.ratelimit import RateLimiter
+from signupto.testing import StubAPI, StubServer, envelope, error_envelope
+
+
+class RecordingHooks(Hooks):
+    def __init__(self):
+        self.calls = []
+
+    def before_request(self, event):
+        self.calls.append(('before', event))
+
+    def after_response(self, event):
+        self.calls.append(('after', event))
+
+    def on_error(self, event, exception):
+        self.calls.append(('error', event, exception))
+
+
+def failing_app(request):
+    return 500, None
+
+
+class TestHooks(unittest.TestCase):
+
+    def test_hooks(self):
+        auth = HashAuthorization(company_id=1, user_id=2, api_key='key')
+        hooks = RecordingHooks()
+        with StubServer(app=StubAPI(items=5, credentials=auth)) as server:
+            with Client(base_url=server.url, auth=auth, hooks=[hooks]) as c:
+                c.subscription.get()
+                self.assertRaises(ObjectNotFound, c.subscription.get, start=10)
+                c.subscription.post(list_id=1)
+                body_size = len(c._codec.dumps({'list_id': 1}))
+        self.assertEqual([call[0] for call in hooks.calls],
+                         ['before', 'after'] * 3)
+        event = hooks.calls[1][1]
+        self.assertEqual(
+            (event.resource_name, event.method, event.status_code),
+            ('subscription', 'GET', 200))
+        self.assertTrue(event.response_size > 0)
+        self.assertEqual(sorted(event.timings.keys()),
+                         ['body', 'connect', 'decode', 'sign', 'total',
+                          'ttfb'])
+        self.assertTrue(event.timings['connect'] > 0)
+        self.assertEqual(hooks.calls[3][1].status_code, 404)
+        self.assertEqual(hooks.calls[5][1].request_size, body_size)
+        # Connection re-used
+        self.assertEqual(hooks.calls[5][1].timings['connect'], 0)
+
+    def test_on_error(self):
+        hooks = RecordingHooks()
+        with StubServer(app=failing_app) as server:
+            with Client(base_url=server.url, hooks=[hooks]) as c:
+                self.assertRaises(ServerError, c.list.get)
+        self.assertEqual(hooks.calls[1][0], 'error')
+        self.assertTrue(isinstance(hooks.calls[1][2], ServerError))
+        self.assertFalse('decode' in hooks.calls[1][1].timings)
+
+    def test_rate_limited(self):
+        # Each attempt the rate limiter retries gets its own events.
+        responses = [(429, error_envelope(429, 'Slow down'),
+                      {'Retry-After': '0.05'})] * 2
+
+        def app(request):
+            return responses.pop() if responses else (200, envelope([]))
+        hooks = RecordingHooks()
+        with StubServer(app=app) as server:
+            with Client(base_url=server.url, hooks=[hooks],
+                        rate_limiter=RateLimiter(max_retries=1)) as c:
+                self.assertRaises(RateLimited, c.list.get)
+                c.list.get()
+        self.assertEqual([call[0] for call in hooks.calls],
+                         ['before', 'after', 'before', 'error', 'before',
+                          'after'])
+        self.assertEqual([call[1].status_code for call in hooks.calls[1::2]],
+                         [429, 429, 200])
+        # The retried response's time excludes the wait before the retry.
+        self.assertTrue(hooks.calls[1][1].timings['total'] < 0.05)
+
+
+class TestMetricsCollector(unittest.TestCase):
+
+    def test_export(self):
+        metrics = MetricsCollector()
+        with StubServer(app=StubAPI(items=5)) as server:
+            with Client(base_url=server.url, hooks=[metrics]) as c:
+                c.subscription.get()
+                c.subscription.get()
+                self.assertRaises(ObjectNotFound, c.subscription.get, start=10)
+        text = metrics.export_prometheus()
+        self.assertIn('signupto_requests_total{endpoint="subscription",'
+                      'method="GET",status="200"} 2', text)
+        self.assertIn('signupto_requests_total{endpoint="subscription",'
+                      'method="GET",status="404"} 1', text)
+        self.assertIn('signupto_request_duration_seconds_bucket'
+                      '{endpoint="subscription",le="+Inf",method="GET"} 3',
+                      text)
+        self.assertIn('signupto_request_duration_seconds_count'
+                      '{endpoint="subscription",method="GET"} 3', text)
+        self.assertIn('phase="decode"', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.pool` module.
+"""
+
+import threading
+import time
+import unittest
+
+from signupto import DeadlineExceeded, HashAuthorization
+from signupto.deadline import Deadline
+from signupto.pool import ClientPool, FairScheduler
+from signupto.ratelimit import RateLimiter
+from signupto.testing import StubServer, envelope
+
+
+def auth(user_id):
+    return HashAuthorization(company_id=1234, user_id=user_id, api_key='key')
+
+
+class TestFairScheduler(unittest.TestCase):
+
+    def wait_for_queue(self, scheduler, count):
+        for i in range(500):
+            if sum(s['queued'] for s in scheduler.stats().values()) == count:
+                return
+            time.sleep(0.01)
+        self.fail("Calls weren't queued")
+
+    def test_weights(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        scheduler.add_tenant('a', weight=2)
+        scheduler.add_tenant('b', weight=1)
+        scheduler.add_tenant('x')
+        order = []
+        scheduler.acquire('x')
+        threads = [threading.Thread(target=scheduler.call,
+                                    args=(tenant,
+                                          lambda t=tenant: order.append(t)))
+                   for tenant in ['a', 'b'] * 6]
+        for t in threads:
+            t.start()
+        self.wait_for_queue(scheduler, 12)
+        scheduler.release('x', 0.0)
+        for t in threads:
+            t.join()
+        # While both have calls waiting, 'a' gets two turns for each of 'b's.
+        self.assertEqual(order[:6].count('a'), 4)
+        self.assertEqual(sorted(order), ['a'] * 6 + ['b'] * 6)
+        stats = scheduler.stats()
+        self.assertEqual(stats['a']['requests'], 6)
+        self.assertEqual(stats['x']['requests'], 1)
+        self.assertEqual((stats['a']['in_flight'], stats['a']['queued']),
+                         (0, 0))
+        self.assertTrue(stats['b']['wait_time'] > 0)
+
+    def test_idle_tenant(self):
+        # A tenant that has been idle doesn't get to catch up.
+        scheduler = FairScheduler(max_concurrency=1)
+        scheduler.add_tenant('a')
+        scheduler.add_tenant('b')
+        for i in range(10):
+            scheduler.call('a', lambda: None)
+        order = []
+        scheduler.acquire('a')
+        threads = [threading.Thread(target=scheduler.call,
+                                    args=(tenant,
+                                          lambda t=tenant: order.append(t)))
+                   for tenant in ['b'] * 4 + ['a'] * 4]
+        for t in threads:
+            t.start()
+            self.wait_for_queue(scheduler, threads.index(t) + 1)
+        scheduler.release('a', 0.0)
+        for t in threads:
+            t.join()
+        # 'b' starts level with 'a', which has a call in flight, rather than
+        # having all its calls go first.
+        self.assertEqual(order[:4], ['b', 'b', 'a', 'b'])
+
+    def test_deadline(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        scheduler.add_tenant('a')
+        scheduler.acquire('a')
+        self.assertRaises(DeadlineExceeded, scheduler.acquire, 'a',
+                          Deadline(0.05))
+        self.assertEqual(scheduler.stats()['a']['queued'], 0)
+        # The cancelled call doesn't take the slot when it is given back.
+        scheduler.release('a', 0.0)
+        scheduler.acquire('a', Deadline(0.05))
+
+    def test_errors(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        scheduler.add_tenant('a')
+
+        def fail():
+            raise IOError("failed")
+        self.assertRaises(IOError, scheduler.call, 'a', fail)
+        # The slot was given back.
+        scheduler.call('a', lambda: None)
+        stats = scheduler.stats()['a']
+        self.assertEqual((stats['requests'], stats['errors']), (2, 1))
+        self.assertRaises(ValueError, scheduler.add_tenant, 'b', weight=0)
+
+
+class SlowApp(object):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __call__(self, request):
+        time.sleep(self.delay)
+        return 200, envelope([{'id': 1}])
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(app=SlowApp(0.02)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_shared(self):
+        with ClientPool(max_concurrency=3, base_url=self.server.url) as pool:
+            for i in range(10):
+                pool.add('tenant%d' % i, auth(i))
+            self.assertEqual(len(pool), 10)
+            self.assertTrue('tenant3' in pool)
+            # Closing a tenant's client doesn't close the shared transport.
+            with pool['tenant0'] as c:
+                c.list.get()
+            threads = [threading.Thread(target=pool[tenant].list.get)
+                       for tenant in pool.tenants * 3]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(self.server.max_concurrent, 3)
+            self.assertTrue(len(self.server.connections) <= 3)
+            # Each tenant's requests are signed with its own credentials.
+            users = set(r.headers['X-SuT-UID'] for r in self.server.requests)
+            self.assertEqual(users, set(str(i) for i in range(10)))
+            stats = pool.stats()
+            self.assertEqual(stats['tenant0']['requests'], 4)
+            self.assertEqual(stats['tenant1']['requests'], 3)
+            self.assertTrue(stats['tenant1']['requests_per_sec'] > 0)
+            self.assertRaises(ValueError, pool.add, 'tenant0', auth(0))
+
+    def test_fairness(self):
+        # One tenant's bulk job doesn't hold up another's calls.
+        with ClientPool(max_concurrency=2, base_url=self.server.url) as pool:
+            bulk = pool.add('bulk', auth(1))
+            interactive = pool.add('interactive', auth(2),
+                                   rate_limiter=RateLimiter())
+            stop = threading.Event()
+
+            def export():
+                while not stop.is_set():
+                    bulk.list.get()
+            threads = [threading.Thread(target=export) for i in range(8)]
+            for t in threads:
+                t.start()
+            time.sleep(0.05)
+            start = time.time()
+            for i in range(5):
+                interactive.list.get()
+            elapsed = time.time() - start
+            stop.set()
+            for t in threads:
+                t.join()
+            # About one bulk request ahead of each, rather than eight.
+            self.assertTrue(elapsed < 5 * 0.06, elapsed)
+            stats = pool.stats()
+            self.assertTrue(
+                stats['bulk']['wait_time'] > stats['interactive']['wait_time'])
+
+    def test_shared_state(self):
+        self.assertRaises(ValueError, ClientPool, cache=object())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.ratelimit` module.
+"""
+
+import threading
+import time
+import unittest
+
+from signupto import Client, DeadlineExceeded, RateLimited
+from signupto.deadline import Deadline
+from signupto.ratelimit import (AdaptiveLimit, RateLimiter, TokenBucket,
+                                parse_retry_after)
+from signupto.testing import StubServer, envelope, error_envelope
+
+
+class ThrottlingApp(object):
+    # Rejects the first 'reject' requests with 429.
+    def __init__(self, reject, retry_after='0.1'):
+        self.reject = reject
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        with self.lock:
+            self.reject -= 1
+            if self.reject >= 0:
+                return (429, error_envelope(429, 'Slow down'),
+                        {'Retry-After': self.retry_after})
+        return 200, envelope([])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('2'), 2.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'),
+                         0.0)
+        self.assertEqual(parse_retry_after(None), None)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_adaptive_limit(self):
+        limit = AdaptiveLimit(initial=4, minimum=1)
+        limit.acquire()
+        limit.release()
+        self.assertEqual(limit.limit, 4.25)
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 2.125)
+        # Errors don't make it grow.
+        limit.acquire()
+        limit.release(failed=True)
+        self.assertEqual(limit.limit, 2.125)
+
+    def test_adaptive_limit_window(self):
+        # Calls throttled together only decrease it once.
+        limit = AdaptiveLimit(initial=8, minimum=1)
+        windows = [limit.acquire() for i in range(4)]
+        for window in windows:
+            limit.release(throttled=True, window=window)
+        self.assertEqual(limit.limit, 4)
+        # A call started since then decreases it again.
+        limit.release(throttled=True, window=limit.acquire())
+        self.assertEqual(limit.limit, 2)
+        self.assertEqual(limit.in_flight, 0)
+
+    def test_deadline(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        self.assertRaises(DeadlineExceeded, bucket.acquire, Deadline(0.1))
+        # The token was given back, so the next caller waits no longer.
+        self.assertTrue(bucket.reserve() <= 1.0)
+        limit = AdaptiveLimit(initial=1)
+        limit.acquire()
+        start = time.time()
+        self.assertRaises(DeadlineExceeded, limit.acquire, Deadline(0.05))
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(limit.in_flight, 1)
+
+    def test_retry_after_deadline(self):
+        # A Retry-After longer than the time left fails at once.
+        with StubServer(app=ThrottlingApp(reject=1,
+                                          retry_after='3')) as server:
+            with Client(base_url=server.url, rate_limiter=RateLimiter()) as c:
+                start = time.time()
+                self.assertRaises(DeadlineExceeded, c.list.get, deadline=0.5)
+                self.assertTrue(time.time() - start < 0.5)
+
+    def test_retry_on_429(self):
+        with StubServer(app=ThrottlingApp(reject=2)) as server:
+            limiter = RateLimiter()
+            with Client(base_url=server.url, rate_limiter=limiter) as c:
+                start = time.time()
+                self.assertEqual(c.list.get().data, [])
+                self.assertTrue(time.time() - start >= 0.2)
+            self.assertEqual(len(server.requests), 3)
+            self.assertEqual(limiter.throttled_count, 2)
+
+    def test_retries_exhausted(self):
+        with StubServer(app=ThrottlingApp(reject=5)) as server:
+            limiter = RateLimiter(max_retries=1)
+            with Client(base_url=server.url, rate_limiter=limiter) as c:
+                self.assertRaises(RateLimited, c.list.get)
+
+    def test_endpoint_rate(self):
+        with StubServer() as server:
+            limiter = RateLimiter(endpoint_rates={'list': 20})
+            with Client(base_url=server.url, rate_limiter=limiter) as c:
+                start = time.time()
+                for i in range(25):
+                    c.list.get()
+                self.assertTrue(time.time() - start >= 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.records` module.
+"""
+
+from array import array
+import unittest
+
+from signupto import Client
+from signupto.records import ColumnarResult, RecordDecoder, DEFAULT_SCHEMAS
+from signupto.testing import StubAPI, StubServer, make_subscription
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [make_subscription(i) for i in range(3)]
+
+    def test_records(self):
+        records = RecordDecoder().decode('subscription', self.items)
+        self.assertEqual(records, self.items)
+        self.assertEqual(records[1]['subscriber_id'],
+                         self.items[1]['subscriber_id'])
+        self.assertEqual(records[1].subscriber_id,
+                         self.items[1]['subscriber_id'])
+        self.assertEqual(records[0].to_dict(), self.items[0])
+        self.assertFalse(hasattr(records[0], '__dict__'))
+
+    def test_extra_fields(self):
+        item = dict(self.items[0], colour='red')
+        record = RecordDecoder().decode('subscription', [item])[0]
+        self.assertEqual(record['colour'], 'red')
+        self.assertEqual(record.to_dict(), item)
+        columns = RecordDecoder(mode='columnar').decode('subscription',
+                                                        [self.items[0], item])
+        self.assertEqual(columns.column('colour'), [None, 'red'])
+        self.assertEqual(columns.to_dicts()[1], item)
+
+    def test_no_schema(self):
+        data = [{'id': 1}]
+        self.assertIs(RecordDecoder(mode='columnar').decode('list', data),
+                      data)
+
+    def test_columnar(self):
+        columns = RecordDecoder(mode='columnar').decode('subscription',
+                                                        self.items)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.column('id'),
+                         array('q', [item['id'] for item in self.items]))
+        self.assertEqual(columns.to_dicts(), self.items)
+        self.assertEqual(list(columns), self.items)
+        self.assertEqual(columns[-1], self.items[-1])
+        self.assertIs(columns.to_dicts()[0]['confirmed'], True)
+        self.assertEqual(columns[1:].to_dicts(), self.items[1:])
+
+    def test_columnar_unexpected_values(self):
+        items = self.items + [dict(self.items[0], cdate=None, confirmed='yes')]
+        columns = ColumnarResult(DEFAULT_SCHEMAS[0])
+        columns.extend(items)
+        self.assertEqual(columns.column('cdate')[-1], None)
+        self.assertEqual(columns.to_dicts(), items)
+
+        # Values are kept as they are, rather than converted to the type.
+        items = self.items + [dict(self.items[0], id=2 ** 64, mdate=True,
+                                   confirmed=1, source=7)]
+        columns = ColumnarResult(DEFAULT_SCHEMAS[0])
+        columns.extend(items)
+        for name in ['id', 'mdate', 'confirmed', 'source']:
+            self.assertEqual([type(item[name]) for item in columns.to_dicts()],
+                             [type(item[name]) for item in items])
+        self.assertEqual(columns.to_dicts(), items)
+        self.assertIs(columns.to_dicts()[0]['confirmed'], True)
+
+        # Including when results are combined
+        combined = ColumnarResult(DEFAULT_SCHEMAS[0])
+        combined.extend(columns[-1:])
+        combined.extend(columns[:1])
+        self.assertIs(combined.to_dicts()[1]['confirmed'], True)
+
+    def test_interned(self):
+        items = [dict(item, source=''.join(['imp', 'ort']))
+                 for item in self.items]
+        for mode in ['records', 'columnar']:
+            records = list(RecordDecoder(mode=mode).decode('subscription',
+                                                           items))
+            self.assertIs(records[0]['source'], records[1]['source'])
+
+    def test_get_all(self):
+        with StubServer(app=StubAPI(items=10, page_size=3)) as server:
+            for mode in ['records', 'columnar']:
+                with Client(base_url=server.url,
+                            record_decoder=RecordDecoder(mode=mode)) as c:
+                    results = c.subscription.get_all()
+                    self.assertEqual(len(results), 10)
+                    self.assertEqual(list(results),
+                                     [make_subscription(i) for i in range(10)])
+                    if mode == 'columnar':
+                        self.assertIsInstance(results, ColumnarResult)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.retry` module.
+"""
+
+import threading
+import time
+import unittest
+
+from signupto import CircuitOpen, Client, DeadlineExceeded, ServerError
+from signupto.retry import CircuitBreaker, RetryPolicy
+from signupto.testing import StubServer, envelope
+
+
+class FlakyApp(object):
+    # Fails the first 'failures' requests for each page of each endpoint with
+    # 502, optionally only for the pages in 'starts'.
+    def __init__(self, failures, starts=None):
+        self.failures = failures
+        self.starts = starts
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        start = int(request.params.get('start', 0))
+        key = (request.resource_name, start)
+        with self.lock:
+            self.seen[key] = self.seen.get(key, 0) + 1
+            if (self.seen[key] <= self.failures and
+                    (self.starts is None or start in self.starts)):
+                return 502, None
+        next = start + 2 if start + 2 < 6 else None
+        return 200, envelope([{'id': i} for i in range(start, start + 2)],
+                             next=next)
+
+
+class TestRetry(unittest.TestCase):
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        for attempt in range(6):
+            delay = policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(5, 2 ** attempt))
+
+    def test_get_all_retries_failed_page(self):
+        with StubServer(app=FlakyApp(failures=2)) as server:
+            retry = RetryPolicy(max_retries=2, backoff=0.01)
+            with Client(base_url=server.url, retry=retry) as c:
+                self.assertEqual([d['id'] for d in c.subscription.get_all()],
+                                 list(range(6)))
+            self.assertEqual(len(server.requests), 9)
+
+    def test_post_not_retried(self):
+        with StubServer(app=FlakyApp(failures=1)) as server:
+            retry = RetryPolicy(backoff=0.01)
+            with Client(base_url=server.url, retry=retry) as c:
+                self.assertRaises(ServerError, c.subscription.post)
+            self.assertEqual(len(server.requests), 1)
+
+    def test_get_all_resume(self):
+        with StubServer(app=FlakyApp(failures=1, starts=[0, 2])) as server:
+            with Client(base_url=server.url) as c:
+                with self.assertRaises(ServerError) as cm:
+                    c.subscription.get_all()
+                self.assertEqual(cm.exception.partial_results, [])
+                self.assertEqual(cm.exception.resume_start, None)
+
+                with self.assertRaises(ServerError) as cm:
+                    c.subscription.get_all()
+                self.assertEqual(cm.exception.partial_results,
+                                 [{'id': 0}, {'id': 1}])
+                self.assertEqual(cm.exception.resume_start, 2)
+                rest = c.subscription.get_all(start=cm.exception.resume_start)
+                self.assertEqual(cm.exception.partial_results + rest,
+                                 [{'id': i} for i in range(6)])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_circuit_breaker(self):
+        with StubServer(app=FlakyApp(failures=3)) as server:
+            breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+            with Client(base_url=server.url, circuit_breaker=breaker) as c:
+                self.assertRaises(ServerError, c.list.get)
+                self.assertRaises(ServerError, c.list.get)
+                self.assertRaises(CircuitOpen, c.list.get)
+                self.assertEqual(len(server.requests), 2)
+                # Other endpoints are unaffected
+                self.assertRaises(ServerError, c.folder.get)
+
+                time.sleep(0.2)
+                # Trial request fails, so opens again.
+                self.assertRaises(ServerError, c.list.get)
+                self.assertRaises(CircuitOpen, c.list.get)
+
+                time.sleep(0.2)
+                c.list.get()
+                self.assertFalse(breaker.is_open('list'))
+
+    def test_deadline_not_counted(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+
+        def fail(exception):
+            def func():
+                raise exception
+            return func
+        for i in range(3):
+            self.assertRaises(DeadlineExceeded, breaker.call, 'list',
+                              fail(DeadlineExceeded()))
+        self.assertFalse(breaker.is_open('list'))
+
+        # A trial that runs out of time, or is interrupted, lets the next call
+        # try again.
+        self.assertRaises(ServerError, breaker.call, 'list',
+                          fail(ServerError('Bad gateway', 502)))
+        self.assertTrue(breaker.is_open('list'))
+        self.assertRaises(DeadlineExceeded, breaker.call, 'list',
+                          fail(DeadlineExceeded()))
+        self.assertRaises(KeyboardInterrupt, breaker.call, 'list',
+                          fail(KeyboardInterrupt()))
+        self.assertEqual(breaker.call('list', lambda: 'ok'), 'ok')
+        self.assertFalse(breaker.is_open('list'))
+
+    def test_open_circuit_not_retried(self):
+        with StubServer(app=FlakyApp(failures=10)) as server:
+            breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+            retry = RetryPolicy(max_retries=5, backoff=0.01)
+            with Client(base_url=server.url, retry=retry,
+                        circuit_breaker=breaker) as c:
+                self.assertRaises(CircuitOpen, c.list.get)
+            self.assertEqual(len(server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
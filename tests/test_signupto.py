@@ -8,21 +8,454 @@ test_signupto
 Tests for `signupto` module.
 """
 
+import hashlib
+from importlib.util import find_spec
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from urllib import parse as urllib_parse
 
-from signupto import signupto
+from signupto import Client, ClientError, HashAuthorization, ObjectNotFound
+from signupto.client import ServerError, make_hash_authorization_signature
+from signupto.codec import available_codecs, get_codec
+from signupto.testing import StubAPI, StubServer, envelope, error_envelope
+from signupto.transport import (TRANSPORTS, HTTPClientTransport,
+                                RequestsTransport, TransportError)
 
 
-class TestSignupto(unittest.TestCase):
+def original_signature(method, url, date_string, company_id, user_id, nonce,
+                       api_key):
+    # The original implementation of make_hash_authorization_signature
+    s = ("%(method)s %(path)s\r\n"
+         "Date: %(date_string)s\r\n"
+         "X-SuT-CID: %(company_id)s\r\n"
+         "X-SuT-UID: %(user_id)s\r\n"
+         "X-SuT-Nonce: %(nonce)s\r\n"
+         "%(api_key)s"
+
+         % dict(method=method,
+                path=urllib_parse.urlparse(url).path.rstrip('/'),
+                date_string=date_string,
+                company_id=company_id,
+                user_id=user_id,
+                nonce=nonce,
+                api_key=api_key)
+         )
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+def available_transports():
+    names = sorted(TRANSPORTS)
+    if find_spec('httpx') is None or find_spec('h2') is None:
+        names.remove('http2')
+    return names
+
+
+def paged_app(request):
+    # 3 pages of 2 items, with a 404 beyond the end, and a 500 if asked.
+    if ('fail_at' in request.params and
+            request.params.get('start') == request.params['fail_at']):
+        return 500, None
+    start = int(request.params.get('start', 0))
+    if start >= 6:
+        return 404, error_envelope(404, 'Not found')
+    next = start + 2 if start + 2 < 6 else None
+    return 200, envelope([{'id': i} for i in range(start, start + 2)],
+                         next=next)
+
+
+class DroppingServer(object):
+    # Answers the first request on each connection, then reads the second
+    # and closes the connection without answering, as a server closing an
+    # idle keep-alive connection might. Records (connection, request line).
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.url = 'http://127.0.0.1:%d' % self.listener.getsockname()[1]
+        self.requests = []
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        for index in range(10):
+            try:
+                conn = self.listener.accept()[0]
+            except OSError:
+                return
+            f = conn.makefile('rb')
+            for answer in [True, False]:
+                lines = iter(f.readline, b'\r\n')
+                request_line = next(lines, b'').strip()
+                if not request_line:
+                    break
+                length = sum(int(line.split(b':')[1]) for line in lines
+                             if line.lower().startswith(b'content-length:'))
+                f.read(length)
+                self.requests.append((index,
+                                      request_line.split()[0].decode('ascii')))
+                if answer:
+                    conn.sendall(
+                        b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+            f.close()
+            conn.close()
+
+    def close(self):
+        self.listener.close()
+
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_connections_reused(self):
+        with Client(base_url=self.server.url) as c:
+            for i in range(5):
+                self.assertEqual(c.list.get(id=str(i)).data, {'id': str(i)})
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_resend(self):
+        # A request that fails on a re-used connection after being sent is
+        # only sent again on a new one if it is safe to repeat.
+        for method, resent in [('GET', True), ('POST', False)]:
+            server = DroppingServer()
+            self.addCleanup(server.close)
+            transport = HTTPClientTransport()
+            self.addCleanup(transport.close)
+            self.assertEqual(transport.request('GET', server.url).content,
+                             b'{}')
+            if resent:
+                self.assertEqual(
+                    transport.request(method, server.url, data=b'x').content,
+                    b'{}')
+            else:
+                self.assertRaises(TransportError, transport.request, method,
+                                  server.url, data=b'x')
+            expected = [(0, 'GET'), (0, method)]
+            if resent:
+                expected.append((1, method))
+            self.assertEqual(server.requests, expected)
+
+    def test_shared_between_threads(self):
+        transport = RequestsTransport(pool_maxsize=4, pool_block=True)
+        errors = []
+
+        def worker():
+            try:
+                for i in range(10):
+                    c.list.get(id=str(i))
+            except Exception as e:
+                errors.append(e)
+
+        with Client(base_url=self.server.url, transport=transport) as c:
+            threads = [threading.Thread(target=worker) for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.server.requests), 80)
+        self.assertTrue(len(self.server.connections) <= 4)
+
+    def test_bodies(self):
+        with Client(base_url=self.server.url) as c:
+            c.list.get(id='1')
+            c.list.post(name='Caf\xe9')
+        self.assertEqual(self.server.requests[0].raw_body, b'')
+        self.assertEqual(self.server.requests[1].body, {'name': 'Caf\xe9'})
+
+    def test_codecs(self):
+        for codec in available_codecs():
+            with Client(base_url=self.server.url, codec=codec) as c:
+                self.assertEqual(c.list.post(name='Caf\xe9').data,
+                                 {'name': 'Caf\xe9'})
+        self.assertEqual(get_codec('json').name, 'json')
+        self.assertEqual(get_codec().name, available_codecs()[0].name)
+        self.assertRaises(ValueError, get_codec, 'xml')
+
+    def test_close(self):
+        transport = RequestsTransport()
+        c = Client(base_url=self.server.url, transport=transport)
+        c.list.get()
+        c.close()
+        self.assertTrue(transport._session is None)
+
+    def test_backends(self):
+        for name in available_transports():
+            del self.server.requests[:]
+            self.server.connections.clear()
+            with Client(base_url=self.server.url, transport=name) as c:
+                self.assertEqual(
+                    c.list.get(id='1', tag=['a', 'b'], skip=None).data,
+                    {'id': '1', 'tag': 'b'})
+                self.assertEqual(c.list.post(name='Caf\xe9').data,
+                                 {'name': 'Caf\xe9'})
+                c.list.delete(id='2')
+            self.assertEqual(self.server.requests[0].query, 'id=1&tag=a&tag=b',
+                             name)
+            self.assertEqual([r.method for r in self.server.requests],
+                             ['GET', 'POST', 'DELETE'])
+            self.assertEqual(len(self.server.connections), 1, name)
+
+    def test_backends_with_auth(self):
+        auth = HashAuthorization(company_id=1234, user_id=4567, api_key='key')
+        with StubServer(app=StubAPI(items=10, page_size=3,
+                                    credentials=auth)) as server:
+            for name in available_transports():
+                with Client(base_url=server.url, auth=auth,
+                            transport=name) as c:
+                    self.assertEqual(len(c.subscription.get_all()), 10)
+                    response = c.make_request_raw(
+                        'GET', server.url + '/v0/subscription')
+                    self.assertEqual(response.status_code, 401)
+                    self.assertEqual(response.headers.get('content-type'),
+                                     'application/json')
+
+    def test_lazy_import(self):
+        code = ("import sys, signupto; "
+                "print([m for m in ('requests', 'urllib3', 'orjson', 'ujson', "
+                "'six') if m in sys.modules])")
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'[]')
+
+
+class TestHashAuthorization(unittest.TestCase):
+
+    def test_signature(self):
+        auth = HashAuthorization(company_id=1234, user_id=4567,
+                                 api_key='e4cf7fe3b764a18c04f6792c09e3325d')
+        date_string = 'Tue, 12 Nov 2013 14:24:58 GMT'
+        for method, url in [
+                ('GET', 'https://api.sign-up.to/v0/list'),
+                ('POST', 'https://api.sign-up.to/v0/subscription/'),
+                ('GET', 'https://api.sign-up.to/v0/list')]:
+            nonce = auth.make_nonce()
+            expected = original_signature(method, url, date_string, 1234, 4567,
+                                          nonce, auth.api_key)
+            self.assertEqual(
+                make_hash_authorization_signature(
+                    method, url, date_string, 1234, 4567, nonce, auth.api_key),
+                expected)
+            self.assertEqual(auth.sign(method, url, date_string, nonce),
+                             expected)
+        auth.api_key = 'changed'
+        url = 'https://api.sign-up.to/v0/list'
+        self.assertEqual(auth.sign('GET', url, date_string, 'x'),
+                         original_signature('GET', url, date_string, 1234,
+                                            4567, 'x', 'changed'))
+
+    def test_nonce(self):
+        nonces = set(HashAuthorization().make_nonce() for i in range(100))
+        self.assertEqual(len(nonces), 100)
+        for nonce in nonces:
+            self.assertTrue(re.match(r'^[a-z0-9]{40}$', nonce))
+
+    def test_headers(self):
+        auth = HashAuthorization(company_id=1234, user_id=4567, api_key='key')
+        with StubServer() as server:
+            with Client(base_url=server.url, auth=auth) as c:
+                self.assertTrue(c.list is c.list)
+                c.list.get()
+            headers = server.requests[0].headers
+        self.assertEqual(headers['Authorization'],
+                         'SuTHash signature="%s"' % original_signature(
+                             'GET', server.url + '/v0/list', headers['Date'],
+                             1234, 4567, headers['X-SuT-Nonce'], 'key'))
+
+
+class TestPaging(unittest.TestCase):
 
     def setUp(self):
-        pass
+        self.server = StubServer(app=paged_app).start()
+        self.client = Client(base_url=self.server.url)
 
-    def test_something(self):
-        pass
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_get_all(self):
+        self.assertEqual([d['id'] for d in self.client.subscription.get_all()],
+                         list(range(6)))
+        self.assertEqual(self.client.subscription.get_all(start=6), [])
+
+    def test_iter_pages(self):
+        pages = list(self.client.subscription.iter_pages())
+        self.assertEqual([p.next for p in pages], [2, 4, None])
+
+    def test_iter_all(self):
+        for prefetch in [0, 1, 3]:
+            items = self.client.subscription.iter_all(prefetch=prefetch)
+            self.assertEqual([d['id'] for d in items], list(range(6)))
+
+    def test_prefetch(self):
+        items = self.client.subscription.iter_all(prefetch=1)
+        next(items)
+        time.sleep(0.2)
+        # Second page has been requested while we work on the first.
+        self.assertEqual(len(self.server.requests), 2)
+        items.close()
+
+    def test_iter_all_error(self):
+        items = self.client.subscription.iter_all(fail_at='4')
+        self.assertEqual([next(items) for i in range(4)],
+                         [{'id': i} for i in range(4)])
+        self.assertRaises(ServerError, next, items)
+
+
+class ListsApp(object):
+    # 3 pages of 2 items for each list_id, with 'failures' 500 errors for each
+    # (list_id, start) in it. Requests for list 3 wait for 'gate', if set.
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.lock = threading.Lock()
+        self.gate = None
+
+    def __call__(self, request):
+        list_id = int(request.params['list_id'])
+        start = int(request.params.get('start', 0))
+        with self.lock:
+            if self.failures.get((list_id, start)):
+                self.failures[(list_id, start)] -= 1
+                return 500, None
+        if list_id == 0:
+            # An empty list
+            return 404, error_envelope(404, 'Not found')
+        if list_id == 3 and self.gate is not None:
+            self.gate.wait(5)
+        # So that pages come back out of order
+        time.sleep(0.01 * list_id)
+        next = start + 2 if start + 2 < 6 else None
+        return 200, envelope(
+            [{'id': list_id * 10 + i} for i in range(start, start + 2)],
+            next=next)
+
+
+class TestPartitioned(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ListsApp()
+        self.server = StubServer(app=self.app).start()
+        self.client = Client(base_url=self.server.url)
+        self.partitions = [{'list_id': i} for i in [3, 0, 1, 2]]
+        self.expected = [i * 10 + j for i in [3, 1, 2] for j in range(6)]
 
     def tearDown(self):
-        pass
+        self.client.close()
+        self.server.stop()
+
+    def test_ordered(self):
+        items = self.client.subscription.get_all_partitioned(self.partitions,
+                                                             max_workers=4)
+        self.assertEqual([d['id'] for d in items], self.expected)
+
+    def test_as_completed(self):
+        # List 3 is held up until lists 1 and 2 have been yielded, which
+        # would never happen if the partitions were yielded in order.
+        self.app.gate = threading.Event()
+        items = []
+        for item in self.client.subscription.iter_all_partitioned(
+                self.partitions, max_workers=4):
+            items.append(item['id'])
+            if 15 in items and 25 in items:
+                self.app.gate.set()
+        self.assertTrue(self.app.gate.is_set())
+        self.assertEqual(sorted(items), sorted(self.expected))
+        self.assertEqual(items[-6:], [30, 31, 32, 33, 34, 35])
+
+    def test_progress(self):
+        seen = []
+        pages = list(self.client.subscription.iter_pages_partitioned(
+            self.partitions,
+            progress=lambda p: seen.append((p.params['list_id'], p.pages,
+                                            p.done))))
+        self.assertEqual(len(pages), 9)
+        self.assertEqual(sorted(seen),
+                         sorted([(0, 0, True)] +
+                                [(i, j, False) for i in [1, 2, 3]
+                                 for j in [1, 2, 3]] +
+                                [(i, 3, True) for i in [1, 2, 3]]))
+        self.assertEqual(pages[0][0].items, 6)
+
+    def test_resume(self):
+        # Failing pages are fetched again, from where the partition got to.
+        self.app.failures = {(1, 2): 2}
+        items = self.client.subscription.get_all_partitioned(self.partitions)
+        self.assertEqual([d['id'] for d in items], self.expected)
+
+        self.app.failures = {(1, 2): 10}
+        with self.assertRaises(ServerError) as cm:
+            self.client.subscription.get_all_partitioned(self.partitions,
+                                                         resumes=1)
+        e = cm.exception
+        self.assertEqual(e.resume_partitions, [{'list_id': 1, 'start': 2}])
+        self.assertEqual(sorted(d['id'] for d in e.partial_results),
+                         sorted([10, 11] + [i * 10 + j for i in [2, 3]
+                                            for j in range(6)]))
+
+
+class TestStubAPI(unittest.TestCase):
+
+    def test_stub_api(self):
+        auth = HashAuthorization(company_id=1234, user_id=4567, api_key='key')
+        with StubServer(app=StubAPI(items=10, page_size=3,
+                                    credentials=auth)) as server:
+            with Client(base_url=server.url, auth=auth) as c:
+                items = c.subscription.get_all()
+                self.assertEqual(len(items), 10)
+                self.assertEqual(len(server.requests), 4)
+            bad_auth = HashAuthorization(company_id=1234, user_id=4567,
+                                         api_key='wrong')
+            with Client(base_url=server.url, auth=bad_auth) as c:
+                with self.assertRaises(ClientError) as cm:
+                    c.subscription.get()
+                self.assertEqual(cm.exception.status_code, 401)
+
+
+def lookup_app(request):
+    if request.params.get('id') == 'missing':
+        return 404, error_envelope(404, 'Not found')
+    if request.params.get('id') == 'broken':
+        return 500, None
+    return 200, envelope({'id': request.params['id'],
+                          'folder': request.params.get('folder')})
+
+
+class TestMany(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(app=lookup_app).start()
+        self.client = Client(base_url=self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_get_many(self):
+        keys = [str(i) for i in range(20)] + ['missing']
+        results = self.client.list.get_many(keys, max_workers=4, folder='x')
+        self.assertEqual([r.data for r in results[:-1]],
+                         [{'id': k, 'folder': 'x'} for k in keys[:-1]])
+        self.assertTrue(isinstance(results[-1], ObjectNotFound))
+
+    def test_head_many(self):
+        results = self.client.list.head_many(['1', 'missing'])
+        self.assertEqual(results[0], None)
+        self.assertTrue(isinstance(results[1], ObjectNotFound))
+
+    def test_server_error(self):
+        self.assertRaises(ServerError, self.client.list.delete_many,
+                          ['1', 'broken', '2'])
+
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
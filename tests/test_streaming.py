@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.streaming` module, and streamed responses.
+"""
+
+import json
+import unittest
+
+from signupto import Client, ObjectNotFound
+from signupto.codec import available_codecs
+from signupto.instrumentation import Hooks
+from signupto.records import RecordDecoder
+from signupto.retry import RetryPolicy
+from signupto.streaming import JSONStream
+from signupto.testing import StubAPI, StubServer, envelope
+from signupto.transport import Request, Response
+
+from .test_signupto import available_transports
+
+
+def parse(stream):
+    # Parses a whole envelope with JSONStream.
+    result = {}
+    for key in stream.members():
+        if key == 'response':
+            response = result[key] = {}
+            for name in stream.members():
+                if name == 'data':
+                    response[name] = list(stream.elements())
+                else:
+                    response[name] = stream.value()
+        else:
+            result[key] = stream.value()
+    stream.end()
+    return result
+
+
+def split(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class TestJSONStream(unittest.TestCase):
+
+    def test_chunk_boundaries(self):
+        items = [
+            {'id': 12345, 'name': 'Caf\xe9 ☃', 'scores': [1.5, None, True]},
+            # Things that look like the end of an item
+            {'id': 1, 'nested': {'a': [1, {'b': 2}], 'c': '},{"x": 1},'},
+             'd': [[], {}]},
+            [{'e': 1}, 2],
+            '},',
+            3]
+        body = envelope(items * 3, next='abc')
+        for indent in [None, 1]:
+            content = json.dumps(body, ensure_ascii=False,
+                                 indent=indent).encode('utf-8')
+            for codec in available_codecs():
+                for size in list(range(1, 40)) + [len(content)]:
+                    self.assertEqual(
+                        parse(JSONStream(split(content, size), codec.loads)),
+                        body)
+
+    def test_large_arrays(self):
+        # Values are decoded a chunk at a time, whatever they are, rather than
+        # the buffer being searched and decoded again for each value.
+        for items in [list(range(30000)), [{'id': i} for i in range(30000)],
+                      ['a, b'] * 30000]:
+            chunks = split(json.dumps({'data': items}).encode('utf-8'), 4096)
+            calls = []
+
+            def loads(s):
+                calls.append(len(s))
+                return json.loads(s)
+            stream = JSONStream(chunks, loads)
+            self.assertEqual(next(stream.members()), 'data')
+            self.assertEqual(list(stream.elements()), items)
+            size = sum(len(c) for c in chunks)
+            self.assertTrue(len(calls) <= 3 * len(chunks), len(calls))
+            self.assertTrue(size / 2 < sum(calls) < 3 * size, sum(calls))
+
+    def test_lazy(self):
+        read = []
+
+        def chunks():
+            for chunk in split(b'{"data": [1, 2, 3, 4]}', 4):
+                read.append(chunk)
+                yield chunk
+
+        stream = JSONStream(chunks())
+        keys = stream.members()
+        self.assertEqual(next(keys), 'data')
+        items = stream.elements()
+        self.assertEqual(next(items), 1)
+        self.assertEqual(len(read), 3)  # Of 6
+        self.assertEqual(list(items), [2, 3, 4])
+
+    def test_errors(self):
+        for content in [b'{"data": [1, 2', b'{"data" 1}', b'{"data": 12',
+                        b'{"data": tru}']:
+            with self.assertRaises(ValueError):
+                parse(JSONStream(split(content, 3)))
+        stream = JSONStream([b'{} x'])
+        list(stream.members())
+        with self.assertRaises(ValueError) as cm:
+            stream.end()
+        self.assertTrue('at character 3 ' in str(cm.exception))
+
+
+class TruncatingTransport(object):
+    # A transport without stream(), whose second page is cut short.
+    def request(self, method, url, data=None, params=None, headers=None):
+        start = int(params.get('start', 0))
+        content = json.dumps(
+            envelope([{'id': i} for i in range(start, start + 3)],
+                     next=start + 3)).encode('utf-8')
+        if start == 3:
+            content = content[:30]
+        return Response(200, {}, content, Request(method, url), {})
+
+    def close(self):
+        pass
+
+
+class RecordingHooks(Hooks):
+    def __init__(self):
+        self.events = []
+        self.errors = []
+
+    def after_response(self, event):
+        self.events.append(event)
+
+    def on_error(self, event, exception):
+        self.errors.append(exception)
+
+
+class TestStreamingResponses(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(app=StubAPI(items=500, page_size=100)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_transports(self):
+        for compression in [True, False]:
+            self.server.compression = compression
+            for name in available_transports():
+                with Client(base_url=self.server.url, transport=name) as c:
+                    expected = c.subscription.get_all()
+                    self.assertEqual(
+                        list(c.subscription.iter_all(stream=True)), expected,
+                        name)
+                    self.assertEqual(c.subscription.get_all(stream=True),
+                                     expected, name)
+
+    def test_fields(self):
+        with Client(base_url=self.server.url) as c:
+            response = c.subscription.stream()
+            self.assertEqual(response.next, 100)  # Buffers the items
+            self.assertEqual(response.count, 100)
+            self.assertEqual(len(list(response.data)), 100)
+
+    def test_connection_reused(self):
+        # A page larger than a chunk
+        self.server.app = StubAPI(items=5000, page_size=5000)
+        for name in available_transports():
+            with Client(base_url=self.server.url, transport=name) as c:
+                connections = len(self.server.connections)
+                with c.subscription.stream() as response:
+                    next(response.data)
+                # The abandoned connection isn't re-used, the finished one is.
+                self.assertEqual(len(c.subscription.get_all(stream=True)),
+                                 5000)
+                c.subscription.get()
+                self.assertEqual(len(self.server.connections), connections + 2,
+                                 name)
+
+    def test_errors(self):
+        self.server.app = StubAPI(items=500, page_size=100, error_rate=0.2,
+                                  seed=0)
+        with Client(base_url=self.server.url,
+                    retry=RetryPolicy(max_retries=10, backoff=0.001)) as c:
+            self.assertEqual(len(c.subscription.get_all(stream=True)), 500)
+            self.assertRaises(ObjectNotFound, c.subscription.stream,
+                              start=1000)
+
+    def test_partial_page(self):
+        c = Client(transport=TruncatingTransport())
+        with self.assertRaises(ValueError) as cm:
+            c.subscription.get_all(stream=True)
+        self.assertEqual(cm.exception.partial_results,
+                         [{'id': 0}, {'id': 1}, {'id': 2}])
+        self.assertEqual(cm.exception.resume_start, 3)
+
+    def test_hooks(self):
+        hooks = RecordingHooks()
+        with Client(base_url=self.server.url, hooks=[hooks]) as c:
+            self.assertEqual(len(c.subscription.get_all(stream=True)), 500)
+        self.assertEqual(len(hooks.events), 5)
+        self.assertTrue(hooks.events[0].response_size > 10000)
+        self.assertTrue('body' in hooks.events[0].timings)
+        self.assertEqual(hooks.errors, [])
+
+    def test_records(self):
+        with Client(base_url=self.server.url,
+                    record_decoder=RecordDecoder()) as c:
+            items = list(c.subscription.iter_all(stream=True))
+            self.assertEqual(items, c.subscription.get_all())
+            self.assertEqual(items[0].to_dict(), c.subscription.get().data[0])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.sync` module.
+"""
+
+import sqlite3
+import unittest
+
+from signupto import Client, ServerError
+from signupto.records import RecordDecoder
+from signupto.sync import SyncEngine, SyncTable
+from signupto.testing import StubAPI, StubServer, envelope, error_envelope
+
+
+class MdateApp(object):
+    # Records with an 'mdate', filterable with 'mdate_min'.
+    def __init__(self, records):
+        self.records = records
+
+    def __call__(self, request):
+        mdate_min = int(request.params.get('mdate_min', 0))
+        matching = [r for r in self.records if r['mdate'] >= mdate_min]
+        start = int(request.params.get('start', 0))
+        page = matching[start:start + 2]
+        if not page:
+            return 404, error_envelope(404, 'Not found')
+        next = start + 2 if start + 2 < len(matching) else None
+        return 200, envelope(page, next=next)
+
+
+class TestSyncEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.db = sqlite3.connect(':memory:')
+
+    def starts(self, server):
+        return [r.params.get('start') for r in server.requests]
+
+    def test_cursor_sync(self):
+        app = StubAPI(items=10, page_size=3)
+        with StubServer(app=app) as server:
+            with Client(base_url=server.url) as c:
+                engine = SyncEngine(c, self.db, [SyncTable('subscription')])
+                self.assertEqual(engine.sync(), {'subscription': 10})
+                row = self.db.execute("SELECT COUNT(*), MAX(source) "
+                                      "FROM subscription").fetchone()
+                self.assertEqual(row, (10, 'import'))
+
+                # Without since_params, there's no telling which records have
+                # changed, so everything is fetched again.
+                app.items = 14
+                del server.requests[:]
+                self.assertEqual(engine.sync(), {'subscription': 14})
+                self.assertEqual(self.starts(server),
+                                 [None, '3', '6', '9', '12'])
+                self.assertEqual(
+                    self.db.execute(
+                        "SELECT COUNT(*) FROM subscription").fetchone(), (14,))
+
+    def test_record_decoder(self):
+        # Records and columns are stored like dictionaries.
+        for mode in ['records', 'columnar']:
+            db = sqlite3.connect(':memory:')
+            with StubServer(app=StubAPI(items=10, page_size=3)) as server:
+                with Client(base_url=server.url,
+                            record_decoder=RecordDecoder(mode=mode)) as c:
+                    engine = SyncEngine(c, db, [SyncTable('subscription')])
+                    self.assertEqual(engine.sync(), {'subscription': 10})
+            row = db.execute("SELECT COUNT(*), MAX(source) "
+                             "FROM subscription").fetchone()
+            self.assertEqual(row, (10, 'import'))
+            self.assertEqual(
+                engine.load_checkpoint(SyncTable('subscription')).max_mdate,
+                db.execute(
+                    "SELECT MAX(mdate) FROM subscription").fetchone()[0])
+
+    def test_since_params(self):
+        records = [{'id': i, 'mdate': 100 + i, 'tags': ['a']}
+                   for i in range(5)]
+        app = MdateApp(records)
+        table = SyncTable('list',
+                          since_params=lambda mdate: {'mdate_min': mdate})
+        with StubServer(app=app) as server:
+            with Client(base_url=server.url) as c:
+                engine = SyncEngine(c, self.db, [table])
+                self.assertEqual(engine.sync(), {'list': 5})
+                records[1]['mdate'] = 200
+                records[1]['name'] = 'changed'
+                del server.requests[:]
+                self.assertEqual(engine.sync(), {'list': 2})
+                self.assertEqual(server.requests[0].params['mdate_min'], '104')
+        self.assertEqual(
+            self.db.execute(
+                "SELECT name, tags FROM list WHERE id = 1").fetchone(),
+            ('changed', '["a"]'))
+
+    def test_resume(self):
+        def app(request):
+            if request.params.get('start') == '6' and not failed:
+                failed.append(True)
+                return 500, None
+            return stub(request)
+        failed = []
+        stub = StubAPI(items=10, page_size=3)
+        with StubServer(app=app) as server:
+            with Client(base_url=server.url) as c:
+                engine = SyncEngine(c, self.db, [SyncTable('subscription')],
+                                    prefetch=0)
+                self.assertRaises(ServerError, engine.sync)
+                self.assertEqual(
+                    self.db.execute(
+                        "SELECT COUNT(*) FROM subscription").fetchone(), (6,))
+                del server.requests[:]
+                self.assertEqual(engine.sync(), {'subscription': 4})
+                self.assertEqual(self.starts(server), ['6', '9'])
+
+
+if __name__ == '__main__':
+    unittest.main()
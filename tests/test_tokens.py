@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.tokens` module.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from signupto import Client
+from signupto.instrumentation import Hooks
+from signupto.testing import StubServer, envelope, error_envelope
+from signupto.tokens import FileTokenCache, ManagedTokenAuthorization
+
+
+class TokenApp(object):
+    # Issues tokens 'token-1', 'token-2' etc, valid for 'lifetime' seconds.
+    def __init__(self, lifetime=3600):
+        self.lifetime = lifetime
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def revoke_all(self):
+        self.tokens.clear()
+
+    def __call__(self, request):
+        if request.resource_name == 'token':
+            with self.lock:
+                token = 'token-%d' % (len(self.tokens) + 1)
+                expiry = int(time.time() + self.lifetime)
+                self.tokens[token] = expiry
+            return 200, envelope({'token': token, 'expiry': expiry})
+        token = request.headers.get('Authorization', '')
+        token = token.replace('SuTToken ', '')
+        if self.tokens.get(token, 0) < time.time():
+            return 401, error_envelope(401, 'Invalid token')
+        return 200, envelope({'token': token, 'body': request.body})
+
+
+class RecordingHooks(Hooks):
+    def __init__(self):
+        self.resource_names = []
+
+    def after_response(self, event):
+        self.resource_names.append(event.resource_name)
+
+
+class TestManagedTokenAuthorization(unittest.TestCase):
+
+    def setUp(self):
+        self.app = TokenApp()
+        self.server = StubServer(app=self.app).start()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def make_auth(self, **kwargs):
+        return ManagedTokenAuthorization(username='joe', password='secret',
+                                         **kwargs)
+
+    def test_post_data(self):
+        with Client(base_url=self.server.url, auth=self.make_auth()) as c:
+            self.assertEqual(c.list.post(name='x').data,
+                             {'token': 'token-1', 'body': {'name': 'x'}})
+
+    def test_close(self):
+        auth = self.make_auth()
+        with Client(base_url=self.server.url, auth=auth) as c:
+            c.list.get()
+            thread = auth.manager._thread
+            self.assertTrue(thread.is_alive())
+        self.assertFalse(thread.is_alive())
+
+    def test_login_uses_client(self):
+        hooks = RecordingHooks()
+        with Client(base_url=self.server.url, auth=self.make_auth(),
+                    hooks=[hooks]) as c:
+            c.list.get()
+        self.assertEqual(hooks.resource_names, ['token', 'list'])
+
+    def test_shared_cache(self):
+        path = os.path.join(self.tmpdir, 'token.json')
+        auths = [self.make_auth(cache=FileTokenCache(path)) for i in range(3)]
+        for auth in auths:
+            with Client(base_url=self.server.url, auth=auth) as c:
+                self.assertEqual(c.list.get().data['token'], 'token-1')
+        self.assertEqual(len(self.app.tokens), 1)
+
+    def test_background_refresh(self):
+        self.app.lifetime = 3
+        auth = self.make_auth(refresh_margin=1.5)
+        with Client(base_url=self.server.url, auth=auth) as c:
+            self.assertEqual(c.list.get().data['token'], 'token-1')
+            # Refreshed in the background within about 1.5 seconds, without
+            # waiting for a request. Expiries are whole seconds, so it may
+            # have been refreshed more than once by the time we look.
+            deadline = time.time() + 5
+            while auth.manager.logins < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(auth.manager.logins >= 2)
+            self.assertNotEqual(c.list.get().data['token'], 'token-1')
+
+    def test_rejected_token(self):
+        path = os.path.join(self.tmpdir, 'token.json')
+        auth = self.make_auth(cache=FileTokenCache(path), background=False)
+        with Client(base_url=self.server.url, auth=auth) as c:
+            c.list.get()
+            self.app.revoke_all()
+            self.assertEqual(c.list.get().data['token'], 'token-1')
+        self.assertEqual(FileTokenCache(path).load(auth.manager.key)[0],
+                         'token-1')
+        self.assertEqual(auth.manager.logins, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `signupto.writebehind` module.
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from signupto import Client, ServerError
+from signupto.testing import StubServer, envelope, error_envelope
+from signupto.writebehind import WriteBehindQueue
+
+
+class BlockingApp(object):
+    # Holds requests until released, and fails those with value 'fail'.
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, request):
+        self.release.wait()
+        if b'fail' in request.raw_body:
+            return 500, error_envelope(500, 'Oops')
+        return 200, envelope({})
+
+
+def profile(subscriber_id, value, field=1):
+    return {'subscriber_id': subscriber_id, 'profile_field_id': field,
+            'value': value}
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.app = BlockingApp()
+        self.server = StubServer(app=self.app).start()
+        self.client = Client(base_url=self.server.url)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.app.release.set()
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def wait_for(self, condition):
+        for i in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timed out waiting")
+
+    def bodies(self):
+        return [r.body for r in self.server.requests]
+
+    def test_merge(self):
+        writes = WriteBehindQueue(self.client, delay=60)
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'red'))
+        writes.write('PUT', 'subscriberProfileData', profile(2, 'red'))
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'blue'))
+        writes.write('PUT', 'subscriberProfileData',
+                     profile(1, 'green', field=2))
+        self.assertEqual(len(writes), 3)
+        self.assertEqual(self.server.requests, [])
+        self.assertTrue(writes.flush(timeout=5))
+        self.assertEqual(sorted((b['subscriber_id'], b['profile_field_id'],
+                                 b['value'])
+                                for b in self.bodies()),
+                         [(1, 1, 'blue'), (1, 2, 'green'), (2, 1, 'red')])
+        self.assertEqual(writes.stats(),
+                         {'queued': 0, 'in_flight': 0, 'sent': 3, 'merged': 1,
+                          'failed': 0, 'spilled': 0})
+        self.assertTrue(writes.close())
+
+    def test_same_key_in_order(self):
+        # A write to the same thing as one in flight waits for it.
+        self.app.release.clear()
+        writes = WriteBehindQueue(self.client, max_workers=2)
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'red'))
+        self.wait_for(lambda: writes.stats()['in_flight'])
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'blue'))
+        self.app.release.set()
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual([b['value'] for b in self.bodies()], ['red', 'blue'])
+
+    def test_methods_in_order(self):
+        # A PUT and a later DELETE of the same thing aren't merged, and are
+        # sent one after the other.
+        writes = WriteBehindQueue(self.client, max_workers=4, delay=60)
+        writes.write('PUT', 'subscription',
+                     {'list_id': 1, 'subscriber_id': 2, 'status': 'a'})
+        writes.write('DELETE', 'subscription',
+                     {'list_id': 1, 'subscriber_id': 2})
+        writes.write('PUT', 'subscription',
+                     {'list_id': 1, 'subscriber_id': 2, 'status': 'b'})
+        writes.write('PUT', 'subscription',
+                     {'list_id': 1, 'subscriber_id': 2, 'status': 'c'})
+        self.assertEqual(len(writes), 3)
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual([r.method for r in self.server.requests],
+                         ['PUT', 'DELETE', 'PUT'])
+        self.assertEqual(self.server.requests[2].body['status'], 'c')
+        self.assertEqual(self.server.max_concurrent, 1)
+
+    def test_backpressure(self):
+        self.app.release.clear()
+        writes = WriteBehindQueue(self.client, max_workers=1, max_size=2)
+        for i in range(3):
+            # One in flight, two queued
+            writes.write('POST', 'subscription',
+                         {'list_id': 1, 'subscriber_id': i})
+        with self.assertRaises(queue.Full):
+            writes.write('POST', 'subscription',
+                         {'list_id': 1, 'subscriber_id': 99}, block=False)
+        with self.assertRaises(queue.Full):
+            writes.write('POST', 'subscription',
+                         {'list_id': 1, 'subscriber_id': 99}, timeout=0.05)
+        # Merging into a queued write doesn't need space.
+        writes.write('POST', 'subscription',
+                     {'list_id': 1, 'subscriber_id': 2}, block=False)
+        self.app.release.set()
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_failure_callbacks(self):
+        errors = []
+        default_errors = []
+        writes = WriteBehindQueue(
+            self.client, on_error=lambda w, e: default_errors.append(w))
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'fail'),
+                     on_error=lambda w, e: errors.append((w.data['value'], e)))
+        writes.write('PUT', 'subscriberProfileData', profile(2, 'fail'))
+        writes.write('PUT', 'subscriberProfileData', profile(3, 'ok'))
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0][1], ServerError)
+        self.assertEqual([w.data['subscriber_id'] for w in default_errors],
+                         [2])
+        self.assertEqual(writes.stats()['failed'], 2)
+
+    def test_spill(self):
+        path = os.path.join(self.tmpdir, 'writes.jsonl')
+        writes = WriteBehindQueue(self.client, delay=60, spill_path=path)
+        writes.write('PUT', 'subscriberProfileData', profile(1, 'red'))
+        writes.write('DELETE', 'subscription', {'id': 5})
+        self.assertFalse(writes.close(timeout=0))
+        self.assertEqual(writes.stats()['spilled'], 2)
+        self.assertEqual(self.server.requests, [])
+        with self.assertRaises(RuntimeError):
+            writes.write('PUT', 'subscriberProfileData', profile(1, 'red'))
+
+        # The file is kept until the writes have been sent.
+        self.app.release.clear()
+        writes = WriteBehindQueue(self.client, spill_path=path)
+        self.assertTrue(os.path.exists(path))
+        self.app.release.set()
+        self.assertTrue(writes.close(timeout=5))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sorted((r.method, r.params.get('id'))
+                                for r in self.server.requests),
+                         [('DELETE', '5'), ('PUT', None)])
+
+    def test_spill_rewritten(self):
+        # The spill file doesn't keep growing with writes that were merged.
+        path = os.path.join(self.tmpdir, 'writes.jsonl')
+        writes = WriteBehindQueue(self.client, delay=60, spill_path=path)
+        for i in range(1500):
+            writes.write('PUT', 'subscriberProfileData', profile(1, i))
+        with open(path) as f:
+            self.assertTrue(len(f.readlines()) < 1000)
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual([b['value'] for b in self.bodies()], [1499])
+        self.assertFalse(os.path.exists(path))
+
+    def test_spill_after_crash(self):
+        # Queued writes are in the spill file as soon as they are queued.
+        path = os.path.join(self.tmpdir, 'writes.jsonl')
+        script = (
+            "import os, sys\n"
+            "from signupto import Client\n"
+            "from signupto.writebehind import WriteBehindQueue\n"
+            "writes = WriteBehindQueue(Client(base_url=sys.argv[1]),\n"
+            "                          delay=60, spill_path=sys.argv[2])\n"
+            "for i in range(3):\n"
+            "    writes.write('PUT', 'subscriberProfileData',\n"
+            "                 {'subscriber_id': i, 'value': 'x'})\n"
+            "os._exit(1)\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.call([sys.executable, '-c', script, self.server.url, path],
+                        cwd=root)
+        # A line cut short by the crash is skipped.
+        with open(path, 'a') as f:
+            f.write('{"method": "PU')
+        writes = WriteBehindQueue(self.client, spill_path=path)
+        self.assertTrue(writes.close(timeout=5))
+        self.assertEqual(
+            sorted(r.body['subscriber_id'] for r in self.server.requests),
+            [0, 1, 2])
+        self.assertFalse(os.path.exists(path))